@@ -2,54 +2,50 @@
 
 import streamlit as st
 import pandas as pd
-from database import load_data # Assumindo que database.py está disponível
+from cache_alunos import get_indice_alunos, PELOTAO_INDEFINIDO
+
+OPCAO_TODOS_VISIVEIS = "Selecionar Todos os Visíveis"
 
 def render_alunos_filter_and_selection(key_suffix: str = "", include_full_name_search: bool = True) -> pd.DataFrame:
     """
     Renderiza um componente padronizado para filtrar e selecionar alunos.
-    Retorna um DataFrame dos alunos selecionados.
+    Retorna um DataFrame (novo, pode ser modificado) dos alunos selecionados.
+
+    As opções vêm do índice compartilhado de alunos (pelotão -> ids e rótulos já ordenados),
+    e a seleção é feita pelos ids, sem reformatar ou interpretar rótulos a cada execução.
 
     Args:
         key_suffix (str): Sufixo para as chaves dos widgets Streamlit para evitar colisões.
         include_full_name_search (bool): Se True, inclui um campo de busca por nome completo.
     """
-    alunos_df = load_data("Alunos")
-    
-    if alunos_df.empty:
+    indice = get_indice_alunos()
+
+    if indice.df.empty:
         st.info("Nenhum aluno cadastrado para seleção.")
         return pd.DataFrame()
 
     st.subheader("Filtro de Alunos")
 
-    # Garante que as colunas principais não têm valores nulos para os filtros
-    alunos_df['pelotao'] = alunos_df['pelotao'].fillna('Não Definido')
-    alunos_df['nome_guerra'] = alunos_df['nome_guerra'].fillna('Nome Desconhecido')
-    alunos_df['numero_interno'] = alunos_df['numero_interno'].fillna('S/N') # Garante que numero_interno não é nulo
-
     col1, col2 = st.columns([1, 2])
 
     with col1:
-        opcoes_pelotao = ["Todos"] + sorted(alunos_df['pelotao'].unique().tolist())
         pelotao_selecionado = st.selectbox(
-            "Filtrar por Pelotão:", 
-            options=opcoes_pelotao, 
+            "Filtrar por Pelotão:",
+            options=["Todos"] + list(indice.pelotoes),
             key=f"pelotao_filter_{key_suffix}"
         )
 
-    df_alunos_filtrados = alunos_df.copy()
-    if pelotao_selecionado != "Todos":
-        df_alunos_filtrados = alunos_df[alunos_df['pelotao'] == pelotao_selecionado]
+    ids_visiveis, _ = indice.opcoes(None if pelotao_selecionado == "Todos" else pelotao_selecionado)
 
     with col2:
         busca_nome_guerra = st.text_input(
-            "Buscar por Nome de Guerra:", 
+            "Buscar por Nome de Guerra:",
             help="Digite parte do nome de guerra para filtrar.",
             key=f"nome_guerra_search_{key_suffix}"
         )
         if busca_nome_guerra:
-            df_alunos_filtrados = df_alunos_filtrados[
-                df_alunos_filtrados['nome_guerra'].str.contains(busca_nome_guerra, case=False, na=False)
-            ]
+            encontrados = set(indice.buscar(busca_nome_guerra, campos=('nome_guerra',)))
+            ids_visiveis = [i for i in ids_visiveis if i in encontrados]
 
     if include_full_name_search:
         busca_nome_completo = st.text_input(
@@ -58,45 +54,29 @@ def render_alunos_filter_and_selection(key_suffix: str = "", include_full_name_s
             key=f"nome_completo_search_{key_suffix}"
         )
         if busca_nome_completo:
-            if 'nome_completo' in df_alunos_filtrados.columns:
-                df_alunos_filtrados = df_alunos_filtrados[
-                    df_alunos_filtrados['nome_completo'].astype(str).str.contains(busca_nome_completo, case=False, na=False)
-                ]
+            encontrados = set(indice.buscar(busca_nome_completo, campos=('nome_completo',)))
+            ids_visiveis = [i for i in ids_visiveis if i in encontrados]
 
-    # --- ALTERAÇÃO AQUI: Formata as opções para incluir o número interno ---
-    # Garante que não há alunos duplicados nas opções
-    df_opcoes = df_alunos_filtrados.drop_duplicates(subset=['id'])
-    
-    # Cria os rótulos no formato "Numero Interno - Nome de Guerra"
-    opcoes_formatadas = df_opcoes.apply(
-        lambda row: f"{row.get('numero_interno', 'S/N')} - {row.get('nome_guerra', 'N/A')}",
-        axis=1
-    ).tolist()
-
-    # Ordena a lista de opções
-    opcoes_formatadas = sorted(opcoes_formatadas)
-    # --- FIM DA ALTERAÇÃO ---
-
-    if "Selecionar Todos os Visíveis" not in opcoes_formatadas and not df_alunos_filtrados.empty:
-        opcoes_formatadas.insert(0, "Selecionar Todos os Visíveis")
-
-    # O widget multiselect agora usa as opções formatadas
+    # As opções do multiselect são os ids; o rótulo "Numero Interno - Nome de Guerra" vem do índice
+    opcoes = ([OPCAO_TODOS_VISIVEIS] if ids_visiveis else []) + list(ids_visiveis)
     selected_options = st.multiselect(
         "Selecione Aluno(s):",
-        options=opcoes_formatadas,
+        options=opcoes,
+        format_func=lambda opcao: indice.rotulos.get(opcao, opcao),
         key=f"alunos_multiselect_{key_suffix}"
     )
 
-    # --- ALTERAÇÃO AQUI: Lógica para retornar os alunos selecionados com base na opção formatada ---
-    if "Selecionar Todos os Visíveis" in selected_options:
+    if OPCAO_TODOS_VISIVEIS in selected_options:
         # Retorna todos os alunos que estão visíveis após os filtros
-        return df_alunos_filtrados
+        ids_selecionados = ids_visiveis
     elif selected_options:
-        # Extrai os números internos das opções selecionadas (ex: "101 - JOÃO" -> "101")
-        numeros_internos_selecionados = [option.split(' - ')[0] for option in selected_options]
-        # Filtra o DataFrame original com base nesses números internos
-        return df_alunos_filtrados[df_alunos_filtrados['numero_interno'].isin(numeros_internos_selecionados)]
+        ids_selecionados = selected_options
     else:
         # Se nada for selecionado, retorna um DataFrame vazio
         return pd.DataFrame()
-    # --- FIM DA ALTERAÇÃO ---
+
+    # Cópia dos registros selecionados; os campos vazios recebem os mesmos padrões de antes
+    selecionados = indice.materializar(ids_selecionados)
+    return selecionados.fillna({
+        'pelotao': PELOTAO_INDEFINIDO, 'nome_guerra': 'Nome Desconhecido', 'numero_interno': 'S/N'
+    })
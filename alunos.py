@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from database import load_data, init_supabase_client
+from database import load_data, init_supabase_client, gravar_em_lotes, invalidar_tabelas
 from auth import check_permission
+from cache_alunos import ordenar_por_numero_interno, filtrar_por_busca, get_indice_alunos, normalizar_chave
+from fotos_alunos import resolver_url_foto, obter_miniaturas
 import math
 import re 
 
@@ -30,6 +32,180 @@ def create_csv_template():
     df = pd.DataFrame(template_data)
     return df.to_csv(index=False, sep=';').encode('utf-8')
 
+# ==============================================================================
+# IMPORTAÇÃO CSV: LEITURA EM BLOCOS, VALIDAÇÃO E COMPARAÇÃO
+# ==============================================================================
+COLUNAS_IMPORTACAO_ALUNOS = [
+    'numero_interno', 'nome_guerra', 'nome_completo', 'pelotao', 'especialidade', 'nip', 'url_foto',
+    'media_academica', 'data_nascimento', 'endereco', 'telefone_contato', 'contato_emergencia_nome',
+    'contato_emergencia_numero', 'numero_armario'
+]
+COLUNAS_OBRIGATORIAS_ALUNOS = ['numero_interno', 'nome_guerra', 'pelotao']
+TAMANHO_BLOCO_CSV = 1000
+
+def _validar_bloco_alunos(bloco: pd.DataFrame) -> tuple:
+    """
+    Mantém só as colunas conhecidas, apara os textos e converte média e data de nascimento.
+    Células vazias viram NaN e significam "não alterar". Retorna (válidos, inválidos com 'motivo').
+    """
+    bloco = bloco.rename(columns=lambda c: str(c).strip().lower())
+    bloco = bloco[[c for c in COLUNAS_IMPORTACAO_ALUNOS if c in bloco.columns]]
+    bloco = bloco.apply(lambda coluna: coluna.str.strip())
+    bloco = bloco.mask(bloco == '')
+    original = bloco.copy()  # inválidos são exibidos com o valor como veio no ficheiro
+    motivos = pd.Series('', index=bloco.index)
+
+    def marcar(mascara, motivo):
+        motivos[mascara] = motivos[mascara] + motivo + '; '
+
+    marcar(bloco['numero_interno'].isna(), "Nº interno vazio")
+    if 'media_academica' in bloco.columns:
+        medias = pd.to_numeric(bloco['media_academica'].str.replace(',', '.', regex=False), errors='coerce')
+        marcar(bloco['media_academica'].notna() & (medias.isna() | (medias < 0) | (medias > 10)), "média acadêmica inválida")
+        bloco['media_academica'] = medias
+    if 'data_nascimento' in bloco.columns:
+        datas = pd.to_datetime(bloco['data_nascimento'], format='%Y-%m-%d', errors='coerce')
+        datas = datas.fillna(pd.to_datetime(bloco['data_nascimento'], format='%d/%m/%Y', errors='coerce'))
+        marcar(bloco['data_nascimento'].notna() & datas.isna(), "data de nascimento inválida")
+        bloco['data_nascimento'] = datas.dt.strftime('%Y-%m-%d')
+
+    invalido = motivos != ''
+    return bloco[~invalido], original[invalido].assign(motivo=motivos[invalido].str.rstrip('; '))
+
+def ler_csv_alunos(arquivo) -> tuple:
+    """
+    Lê o CSV (separador ';') em blocos de TAMANHO_BLOCO_CSV linhas, validando cada bloco.
+    Retorna (válidos, inválidos, colunas ignoradas). Exige a coluna 'numero_interno'.
+    """
+    leitor = pd.read_csv(arquivo, sep=';', dtype=str, keep_default_na=False, na_values=[''],
+                         chunksize=TAMANHO_BLOCO_CSV, encoding='utf-8-sig')
+    validos, invalidos, ignoradas = [], [], set()
+    for bloco in leitor:
+        colunas = {str(c).strip().lower() for c in bloco.columns}
+        if 'numero_interno' not in colunas:
+            raise ValueError("O ficheiro deve conter a coluna 'numero_interno'.")
+        ignoradas |= colunas - set(COLUNAS_IMPORTACAO_ALUNOS)
+        bloco_valido, bloco_invalido = _validar_bloco_alunos(bloco)
+        validos.append(bloco_valido)
+        invalidos.append(bloco_invalido)
+    if not validos:
+        return pd.DataFrame(columns=['numero_interno']), pd.DataFrame(), ignoradas
+    return pd.concat(validos, ignore_index=True), pd.concat(invalidos, ignore_index=True), ignoradas
+
+def _valores_comparaveis(serie: pd.Series, coluna: str) -> pd.Series:
+    """Normaliza valores do ficheiro e do banco para comparação (números, datas e códigos)."""
+    if coluna == 'media_academica':
+        return pd.to_numeric(serie, errors='coerce').round(4).astype(str)
+    if coluna == 'data_nascimento':
+        return pd.to_datetime(serie, errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    if coluna in ('numero_interno', 'nip'):
+        return serie.map(normalizar_chave)
+    return serie.fillna('').astype(str).str.strip()
+
+def comparar_importacao_alunos(importacao: pd.DataFrame, alunos_atual: pd.DataFrame) -> dict:
+    """
+    Compara o ficheiro com a tabela 'Alunos' em cache numa única junção pelo número interno.
+    Só contam como alteração as células preenchidas e diferentes do valor atual.
+    Retorna 'novos', 'alterados' (apenas os campos que mudam), 'inalterados', 'invalidos',
+    'duplicados', 'campos_alterados' (contagem por coluna) e 'registros' para gravar.
+    """
+    colunas = [c for c in COLUNAS_IMPORTACAO_ALUNOS if c in importacao.columns]
+    importacao = importacao.assign(_chave=importacao['numero_interno'].map(normalizar_chave))
+    duplicados = int(importacao.duplicated('_chave', keep='last').sum())
+    importacao = importacao.drop_duplicates('_chave', keep='last')
+
+    colunas_atuais = [c for c in dict.fromkeys(colunas + COLUNAS_OBRIGATORIAS_ALUNOS) if c in alunos_atual.columns]
+    if alunos_atual.empty:
+        existentes = pd.DataFrame(columns=['_chave', 'id'])
+    else:
+        existentes = alunos_atual.assign(_chave=alunos_atual['numero_interno'].map(normalizar_chave))
+        existentes = existentes[existentes['_chave'] != ''].drop_duplicates('_chave', keep='first')
+        # Mantém o id como objeto para não virar float após a junção com linhas sem correspondência
+        existentes = existentes[['_chave', 'id'] + colunas_atuais].astype({'id': object})
+    existentes = existentes.rename(columns={c: f"{c}_atual" for c in colunas_atuais})
+    juncao = importacao.merge(existentes, on='_chave', how='left')
+
+    # Alunos novos precisam dos campos obrigatórios preenchidos
+    novos = juncao[juncao['id'].isna()]
+    faltando = novos[[c for c in COLUNAS_OBRIGATORIAS_ALUNOS if c in novos.columns]].isna().any(axis=1)
+    if not set(COLUNAS_OBRIGATORIAS_ALUNOS) <= set(novos.columns):
+        faltando[:] = True
+    invalidos = novos[faltando][colunas].assign(motivo="aluno novo sem Nº interno, nome de guerra ou pelotão")
+    novos = novos[~faltando]
+
+    encontrados = juncao[juncao['id'].notna()]
+    mudancas = pd.DataFrame(False, index=encontrados.index, columns=[c for c in colunas if c != 'numero_interno'])
+    for coluna in mudancas.columns:
+        atual = encontrados[f"{coluna}_atual"] if f"{coluna}_atual" in encontrados.columns else pd.Series(None, index=encontrados.index)
+        mudancas[coluna] = encontrados[coluna].notna() & (
+            _valores_comparaveis(encontrados[coluna], coluna) != _valores_comparaveis(atual, coluna)
+        )
+    mudou = mudancas.any(axis=1)
+    alterados = encontrados[mudou]
+
+    return {
+        'novos': novos[colunas],
+        'alterados': alterados[['id', 'numero_interno']].join(alterados[mudancas.columns].where(mudancas[mudou])),
+        'inalterados': encontrados[~mudou][['id'] + colunas],
+        'invalidos': invalidos,
+        'duplicados': duplicados,
+        'campos_alterados': mudancas.sum()[lambda contagem: contagem > 0],
+        'registros': _agrupar_registros_alunos(novos[colunas], alterados, mudancas[mudou]),
+    }
+
+def _agrupar_registros_alunos(novos: pd.DataFrame, alterados: pd.DataFrame, mudancas: pd.DataFrame) -> list:
+    """
+    Monta os registros a gravar, agrupados por conjunto de colunas (um lote do PostgREST precisa
+    das mesmas chaves em todas as linhas): [(operacao, registros), ...].
+    Alterações levam o id, os campos que mudaram e os obrigatórios (valor atual quando não mudam),
+    para o upsert nunca apagar nem exigir outros campos.
+    """
+    grupos = {}
+    for registro in novos.astype(object).where(novos.notna(), None).to_dict('records'):
+        registro = {c: v for c, v in registro.items() if v is not None}
+        grupos.setdefault(('insert', tuple(sorted(registro))), []).append(registro)
+
+    for indice, linha in alterados.iterrows():
+        registro = {'id': linha['id']}
+        for coluna in COLUNAS_OBRIGATORIAS_ALUNOS:
+            valor = linha[coluna] if coluna in linha and pd.notna(linha[coluna]) else linha.get(f"{coluna}_atual")
+            if valor is not None and pd.notna(valor):
+                registro[coluna] = valor
+        for coluna in mudancas.columns[mudancas.loc[indice].to_numpy()]:
+            registro[coluna] = linha[coluna].item() if hasattr(linha[coluna], 'item') else linha[coluna]
+        grupos.setdefault(('upsert', tuple(sorted(registro))), []).append(registro)
+
+    return [(operacao, registros) for (operacao, _), registros in grupos.items()]
+
+def gravar_importacao_alunos(supabase, grupos: list, ao_progredir=None) -> int:
+    """Grava os grupos em lotes limitados (ver database.gravar_em_lotes), com progresso acumulado."""
+    total = sum(len(registros) for _, registros in grupos)
+    gravados = 0
+    for operacao, registros in grupos:
+        progresso = (lambda feitos, _, base=gravados: ao_progredir(base + feitos, total)) if ao_progredir else None
+        opcoes = {'on_conflict': 'id'} if operacao == 'upsert' else {}
+        gravados += gravar_em_lotes(supabase, "Alunos", registros, operacao=operacao, ao_progredir=progresso, **opcoes)
+    return gravados
+
+def render_relatorio_importacao_alunos(diff: dict, ignoradas: set):
+    """Exibe a simulação da importação antes de gravar."""
+    st.markdown("##### Simulação da Importação")
+    cols = st.columns(4)
+    cols[0].metric("Novos", len(diff['novos']))
+    cols[1].metric("Alterados", len(diff['alterados']))
+    cols[2].metric("Sem alteração", len(diff['inalterados']))
+    cols[3].metric("Inválidos", len(diff['invalidos']))
+    if diff['duplicados']:
+        st.caption(f"{diff['duplicados']} linha(s) repetida(s) pelo Nº interno: vale a última ocorrência.")
+    if ignoradas:
+        st.caption(f"Colunas ignoradas: {', '.join(sorted(ignoradas))}")
+    if not diff['campos_alterados'].empty:
+        st.caption("Campos alterados: " + ", ".join(f"{c} ({n})" for c, n in diff['campos_alterados'].items()))
+    for titulo, chave in [("Novos", 'novos'), ("Alterados (somente os campos que mudam)", 'alterados'), ("Inválidos (ignorados)", 'invalidos')]:
+        if not diff[chave].empty:
+            with st.expander(f"{titulo} ({len(diff[chave])})"):
+                st.dataframe(diff[chave], hide_index=True, use_container_width=True)
+
 # ==============================================================================
 # FUNÇÕES DE CÁLCULO
 # ==============================================================================
@@ -95,6 +271,37 @@ def calcular_conceito_final(soma_pontos_acoes: float, media_academica_aluno: flo
     conceito_final = linha_base + impacto_acoes + impacto_academico
     return max(0.0, min(conceito_final, 10.0))
 
+def calcular_impacto_academico_vetorizado(medias_academicas, todos_alunos_df: pd.DataFrame, config_dict: dict) -> pd.Series:
+    """Parcela acadêmica do conceito (média normalizada pela turma * peso) para vários alunos de uma vez."""
+    peso_academico = float(config_dict.get('peso_academico', 1.0))
+    if isinstance(medias_academicas, pd.Series):
+        medias_academicas = medias_academicas.to_numpy()
+    medias = pd.to_numeric(pd.Series(medias_academicas, dtype=object), errors='coerce').fillna(0.0)
+
+    if 'media_academica' in todos_alunos_df.columns and not todos_alunos_df.empty:
+        medias_validas = pd.to_numeric(todos_alunos_df['media_academica'], errors='coerce').dropna()
+        if not medias_validas.empty and medias_validas.max() > medias_validas.min():
+            media_min_turma = medias_validas.min()
+            media_max_turma = medias_validas.max()
+            return (medias - media_min_turma) / (media_max_turma - media_min_turma) * peso_academico
+    return pd.Series(0.0, index=medias.index)
+
+def calcular_conceito_final_vetorizado(soma_pontos_acoes, medias_academicas, todos_alunos_df: pd.DataFrame, config_dict: dict) -> pd.Series:
+    """
+    Mesma regra de `calcular_conceito_final`, aplicada a vários valores de uma vez.
+    Os limites da média acadêmica da turma são calculados uma única vez.
+    """
+    linha_base = float(config_dict.get('linha_base_conceito', 8.5))
+    impacto_max_acoes = float(config_dict.get('impacto_max_acoes', 1.5))
+
+    soma_pontos_acoes = pd.Series(soma_pontos_acoes, dtype=float)
+    if medias_academicas is None:
+        medias_academicas = [None] * len(soma_pontos_acoes)
+    impacto_acoes = soma_pontos_acoes.clip(-impacto_max_acoes, impacto_max_acoes)
+    impacto_academico = calcular_impacto_academico_vetorizado(medias_academicas, todos_alunos_df, config_dict).to_numpy()
+
+    return (linha_base + impacto_acoes + impacto_academico).clip(0.0, 10.0)
+
 # ==============================================================================
 # DIÁLOGOS
 # ==============================================================================
@@ -320,20 +527,16 @@ def show_alunos():
     if pelotao_selecionado != "Todos": filtered_df = filtered_df[filtered_df['pelotao'] == pelotao_selecionado]
     if especialidade_selecionada != "Todas": filtered_df = filtered_df[filtered_df['especialidade'] == especialidade_selecionada]
     if search:
-        search_lower = search.lower()
-        mask_nome_guerra = filtered_df['nome_guerra'].str.lower().str.contains(search_lower, na=False)
-        mask_num_interno = filtered_df['numero_interno'].astype(str).str.lower().str.contains(search_lower, na=False)
-        mask_nome_completo = filtered_df['nome_completo'].str.lower().str.contains(search_lower, na=False)
-        mask_nip = filtered_df['nip'].astype(str).str.lower().str.contains(search_lower, na=False)
-        filtered_df = filtered_df[mask_nome_guerra | mask_num_interno | mask_nome_completo | mask_nip]
+        # Busca no índice compartilhado (nome de guerra, número interno, nome completo e NIP, sem acentos)
+        filtered_df = filtrar_por_busca(filtered_df, search)
 
     if sort_option == "Maior Conceito":
         filtered_df = filtered_df.sort_values(by='conceito_final_calculado', ascending=False)
     elif sort_option == "Menor Conceito":
         filtered_df = filtered_df.sort_values(by='conceito_final_calculado', ascending=True)
-    else:
-        filtered_df['numero_interno_num'] = pd.to_numeric(filtered_df['numero_interno'], errors='coerce')
-        filtered_df = filtered_df.sort_values(by='numero_interno_num', ascending=True)
+    elif not search:
+        # Com busca, a ordem padrão é a de relevância devolvida por filtrar_por_busca
+        filtered_df = ordenar_por_numero_interno(filtered_df)
     st.divider()
 
     if check_permission('pode_importar_alunos'):
@@ -367,23 +570,49 @@ def show_alunos():
         
   
             st.subheader("Importar Alunos em Massa (CSV)")
-            st.info("Use o modelo para garantir a formatação correta. A importação irá ATUALIZAR alunos existentes (pelo Nº Interno) e ADICIONAR novos.")
+            st.info("Use o modelo para garantir a formatação correta. A importação irá ATUALIZAR alunos existentes (pelo Nº Interno) e ADICIONAR novos. Células vazias não apagam dados existentes; uma simulação é exibida antes de gravar.")
+            if 'relatorio_importacao_alunos' in st.session_state:
+                st.success(st.session_state.pop('relatorio_importacao_alunos'))
+            if 'falha_importacao_alunos' in st.session_state:
+                st.error(st.session_state.pop('falha_importacao_alunos'))
             csv_template = create_csv_template()
             st.download_button(label="Baixar Modelo CSV", data=csv_template, file_name="modelo_alunos.csv", mime="text/csv")
             uploaded_file = st.file_uploader("Escolha um ficheiro CSV", type="csv")
             if uploaded_file is not None:
                 try:
-                    new_alunos_df = pd.read_csv(uploaded_file, sep=';', dtype=str).fillna('')
-                    
-                    if new_alunos_df.empty or len(new_alunos_df.columns) == 0:
+                    with st.spinner("A validar e comparar o ficheiro..."):
+                        validos_df, invalidos_df, colunas_ignoradas = ler_csv_alunos(uploaded_file)
+                        diff = comparar_importacao_alunos(validos_df, get_indice_alunos().df)
+                        diff['invalidos'] = pd.concat([invalidos_df, diff['invalidos']], ignore_index=True)
+
+                    if validos_df.empty and diff['invalidos'].empty:
                         st.error("Erro: O ficheiro CSV está vazio ou formatado incorretamente.")
                     else:
-                        records_to_upsert = new_alunos_df.to_dict(orient='records')
-                        with st.spinner("A processar e importar alunos..."):
-                            supabase.table("Alunos").upsert(records_to_upsert, on_conflict='numero_interno').execute()
-                        st.success(f"Importação concluída! {len(records_to_upsert)} registos foram processados.")
-                        load_data.clear()
-                        st.rerun()
+                        render_relatorio_importacao_alunos(diff, colunas_ignoradas)
+                        total_para_gravar = len(diff['novos']) + len(diff['alterados'])
+                        if total_para_gravar == 0:
+                            st.info("Nada a importar: todos os alunos do ficheiro já estão atualizados.")
+                        elif st.button(f"Confirmar importação ({total_para_gravar} aluno(s))", type="primary"):
+                            barra = st.progress(0.0, text="Gravando alunos...")
+                            gravados = {'n': 0}
+                            def progresso(feitos, total):
+                                gravados['n'] = feitos
+                                barra.progress(feitos / total, text=f"Gravando alunos... {feitos}/{total}")
+                            try:
+                                gravar_importacao_alunos(supabase, diff['registros'], ao_progredir=progresso)
+                                st.session_state.relatorio_importacao_alunos = (
+                                    f"Importação concluída! {len(diff['novos'])} aluno(s) adicionados e {len(diff['alterados'])} atualizados"
+                                    f"; {len(diff['invalidos'])} linha(s) inválida(s) ignorada(s)."
+                                )
+                            except Exception as e:
+                                st.session_state.falha_importacao_alunos = (
+                                    f"Importação interrompida: {gravados['n']} de {total_para_gravar} aluno(s) já tinham sido gravados "
+                                    f"antes da falha ({e}). Envie o ficheiro de novo para importar o restante."
+                                )
+                            finally:
+                                # Lotes já gravados precisam aparecer no cache, mesmo se a importação falhou
+                                invalidar_tabelas("Alunos")
+                            st.rerun()
                 except Exception as e:
                     st.error(f"Ocorreu um erro ao processar o ficheiro: {e}")
                     st.warning("Verifique se o seu ficheiro CSV usa o separador ';' e a codificação UTF-8.")
@@ -399,7 +628,12 @@ def show_alunos():
     st.subheader(f"Alunos Exibidos ({len(paginated_df)} de {total_items})")
 
     if not paginated_df.empty:
-        for _, aluno in paginated_df.iterrows():
+        # Miniaturas de 100 px da página inteira, baixadas em paralelo só na primeira vez (cache em disco)
+        fotos_pagina = obter_miniaturas([
+            resolver_url_foto(aluno.get('url_foto'), aluno.get('numero_interno'))
+            for aluno in paginated_df.to_dict('records')
+        ], largura=100)
+        for (_, aluno), foto in zip(paginated_df.iterrows(), fotos_pagina):
             aluno_id = aluno['id']
             with st.container(border=True):
                 col_img, col_info, col_actions = st.columns([1, 4, 1.2])
@@ -408,9 +642,7 @@ def show_alunos():
                 conceito_final_aluno = aluno['conceito_final_calculado']
 
                 with col_img:
-                    foto_url = aluno.get('url_foto')
-                    image_source = foto_url if isinstance(foto_url, str) and foto_url.startswith('http') else "https://via.placeholder.com/100?text=Sem+Foto"
-                    st.image(image_source, width=100)
+                    st.image(foto, width=100)
                 
                 with col_info:
                     st.markdown(f"**{aluno.get('nome_guerra', 'N/A')}** (`{aluno.get('numero_interno', 'N/A')}`) | **NIP:** `{aluno.get('nip', 'N/A')}`")
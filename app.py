@@ -1,6 +1,6 @@
 import streamlit as st
 from auth import check_authentication, check_permission, logout
-from database import load_data 
+from database import load_data, get_table_version, carregar_intervalo
 from dashboard import show_dashboard
 from alunos import show_alunos
 from programacao import show_programacao
@@ -40,6 +40,8 @@ st.sidebar.divider()
 st.sidebar.header("Menu de Navegação")
 if st.sidebar.button("🔄 Recarregar Dados"):
     load_data.clear()
+    get_table_version.clear()
+    carregar_intervalo.clear()
     st.toast("Os dados foram recarregados com sucesso!", icon="✅")
     st.rerun()
 
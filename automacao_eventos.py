@@ -1,84 +1,180 @@
 import pandas as pd
-from datetime import datetime
-from database import init_supabase_client, load_data
+from datetime import datetime, timedelta
+import argparse
 import logging
+import os
+import random
+import socket
+import time
+from cliente_supabase import criar_cliente_supabase
 
 # Configuração básica de logging para podermos ver o que o script está a fazer
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def finalizar_eventos_automaticamente():
+# Nomes dos eventos que devem ser finalizados automaticamente
+EVENTOS_PARA_AUTOMATIZAR = [
+    "Rancho Geral",
+    "Ceia",
+    "Verificação de presença",
+    "Alojamento"
+]
+
+# Eventos mais antigos que isso são ignorados (já deveriam ter sido finalizados)
+JANELA_DIAS_PADRAO = 2
+
+# ==============================================================================
+# ROTINAS
+# ==============================================================================
+def finalizar_eventos_automaticamente(supabase=None, janela_dias: int = JANELA_DIAS_PADRAO) -> int:
     """
     Verifica e finaliza eventos rotineiros que já passaram do seu horário.
+    Consulta apenas os eventos pendentes das rotinas dentro da janela de datas.
+    Retorna a quantidade de eventos finalizados.
     """
     logging.info("Iniciando verificação de eventos para finalização automática...")
-    
-    supabase = init_supabase_client()
+
+    supabase = supabase or criar_cliente_supabase()
     if not supabase:
-        logging.error("Não foi possível conectar ao Supabase. Saindo.")
-        return
+        raise RuntimeError("Não foi possível conectar ao Supabase.")
+
+    agora = datetime.now()
+    inicio_janela = (agora - timedelta(days=janela_dias)).strftime('%Y-%m-%d')
+    resposta = (
+        supabase.table("Programacao").select("id, data, horario")
+        .eq("status", "A Realizar")
+        .in_("descricao", EVENTOS_PARA_AUTOMATIZAR)
+        .gte("data", inicio_janela)
+        .lte("data", agora.strftime('%Y-%m-%d'))
+        .execute()
+    )
+    eventos_filtrados = pd.DataFrame(resposta.data)
+    if eventos_filtrados.empty:
+        logging.info("Nenhum evento automático pendente encontrado.")
+        return 0
+
+    # Combina data e horário para criar uma data/hora completa para cada evento
+    eventos_filtrados['data_hora_evento'] = pd.to_datetime(
+        eventos_filtrados['data'].astype(str) + ' ' + eventos_filtrados['horario'].fillna('').astype(str),
+        errors='coerce'
+    )
+
+    # Filtra os eventos cujo horário já passou (datas inválidas viram NaT e ficam de fora)
+    eventos_a_finalizar = eventos_filtrados[eventos_filtrados['data_hora_evento'] <= agora]
+
+    if eventos_a_finalizar.empty:
+        logging.info("Nenhum evento atingiu o seu horário de finalização ainda.")
+        return 0
+
+    ids_para_finalizar = eventos_a_finalizar['id'].tolist()
+    logging.info(f"Encontrados {len(ids_para_finalizar)} eventos para finalizar: {ids_para_finalizar}")
+
+    update_data = {
+        "status": "Concluído",
+        "concluido_por": "Sistema (Automático)",
+        "data_conclusao": agora.strftime('%d/%m/%Y %H:%M')
+    }
+    # O filtro de status evita sobrescrever um evento finalizado manualmente entre a consulta e a atualização
+    resposta = supabase.table("Programacao").update(update_data).in_("id", ids_para_finalizar).eq("status", "A Realizar").execute()
+    finalizados = len(resposta.data or [])
+
+    logging.info(f"Sucesso! {finalizados} eventos foram finalizados automaticamente.")
+    return finalizados
+
+# Rotinas executadas a cada ciclo do agendador: (nome, função(supabase, args) -> itens processados)
+ROTINAS = [
+    ("finalizar_eventos", lambda supabase, args: finalizar_eventos_automaticamente(supabase, args.janela_dias)),
+]
+
+# ==============================================================================
+# AGENDADOR
+# ==============================================================================
+NOME_LOCK = "automacao_eventos"
 
-    # Nomes dos eventos que devem ser finalizados automaticamente
-    eventos_para_automatizar = [
-        "Rancho Geral",
-        "Ceia",
-        "Verificação de presença",
-        "Alojamento"
-    ]
+def adquirir_lock(supabase, dono: str, duracao_segundos: int) -> bool:
+    """Adquire ou renova o lock do agendador (ver sql/003_automacao.sql)."""
+    resposta = supabase.rpc('adquirir_lock_automacao', {
+        'p_nome': NOME_LOCK, 'p_dono': dono, 'p_duracao_segundos': duracao_segundos
+    }).execute()
+    return bool(resposta.data)
 
+def liberar_lock(supabase, dono: str):
     try:
-        # Carrega a programação completa
-        programacao_df = load_data("Programacao")
-        if programacao_df.empty:
-            logging.info("Tabela de programação vazia. Nenhum evento para processar.")
-            return
-
-        # Filtra apenas os eventos que nos interessam e que ainda não foram concluídos
-        eventos_filtrados = programacao_df[
-            programacao_df['descricao'].isin(eventos_para_automatizar) &
-            (programacao_df['status'] == 'A Realizar')
-        ].copy()
-
-        if eventos_filtrados.empty:
-            logging.info("Nenhum evento automático pendente encontrado.")
-            return
-
-        # Combina data e horário para criar uma data/hora completa para cada evento
-        eventos_filtrados['data_hora_evento'] = pd.to_datetime(
-            eventos_filtrados['data'] + ' ' + eventos_filtrados['horario'],
-            errors='coerce'
-        )
-        
-        # Remove eventos que não puderam ter a data/hora convertida
-        eventos_filtrados.dropna(subset=['data_hora_evento'], inplace=True)
-
-        # Pega a hora atual
-        agora = datetime.now()
-        
-        # Filtra os eventos cujo horário já passou
-        eventos_a_finalizar = eventos_filtrados[eventos_filtrados['data_hora_evento'] <= agora]
-
-        if eventos_a_finalizar.empty:
-            logging.info("Nenhum evento atingiu o seu horário de finalização ainda.")
-            return
-
-        ids_para_finalizar = eventos_a_finalizar['id'].tolist()
-        
-        logging.info(f"Encontrados {len(ids_para_finalizar)} eventos para finalizar: {ids_para_finalizar}")
-
-        # Prepara os dados para a atualização em massa
-        update_data = {
-            "status": "Concluído",
-            "concluido_por": "Sistema (Automático)",
-            "data_conclusao": agora.strftime('%d/%m/%Y %H:%M')
-        }
-
-        # Executa a atualização na base de dados
-        supabase.table("Programacao").update(update_data).in_("id", ids_para_finalizar).execute()
-
-        logging.info(f"Sucesso! {len(ids_para_finalizar)} eventos foram finalizados automaticamente.")
+        supabase.table("automacao_lock").delete().eq("nome", NOME_LOCK).eq("dono", dono).execute()
+    except Exception as e:
+        logging.warning(f"Não foi possível liberar o lock: {e}")
 
+def registrar_execucao(supabase, rotina: str, dono: str, iniciado_em: datetime, status: str, itens: int = 0, mensagem: str = None):
+    """Grava o resultado de uma rotina em 'automacao_execucoes'. Falhas aqui não interrompem o agendador."""
+    try:
+        supabase.table("automacao_execucoes").insert({
+            'rotina': rotina, 'dono': dono, 'status': status, 'itens': itens, 'mensagem': mensagem,
+            'iniciado_em': iniciado_em.astimezone().isoformat(),
+            'finalizado_em': datetime.now().astimezone().isoformat(),
+        }).execute()
     except Exception as e:
-        logging.error(f"Ocorreu um erro durante a execução da automação: {e}")
+        logging.warning(f"Não foi possível registrar a execução de '{rotina}': {e}")
+
+def executar_ciclo(supabase, dono: str, args) -> bool:
+    """Executa todas as rotinas uma vez. Retorna False se alguma falhou."""
+    sucesso = True
+    for nome, rotina in ROTINAS:
+        iniciado_em = datetime.now()
+        try:
+            itens = rotina(supabase, args)
+            # Ciclos sem trabalho não são registrados (seriam ~1.440 linhas vazias por dia)
+            if itens:
+                registrar_execucao(supabase, nome, dono, iniciado_em, 'sucesso', itens)
+        except Exception as e:
+            sucesso = False
+            logging.error(f"Ocorreu um erro durante a execução da rotina '{nome}': {e}")
+            registrar_execucao(supabase, nome, dono, iniciado_em, 'erro', mensagem=str(e)[:500])
+    return sucesso
+
+def executar_agendador(args):
+    """
+    Laço principal: a cada intervalo (com variação aleatória), tenta adquirir o lock e,
+    se for o dono, executa as rotinas. Falhas aumentam a espera exponencialmente até o limite.
+    """
+    supabase = criar_cliente_supabase()
+    if not supabase:
+        logging.error("Não foi possível conectar ao Supabase. Saindo.")
+        return
+
+    dono = f"{socket.gethostname()}:{os.getpid()}"
+    duracao_lock = max(int(args.intervalo * 3), 60)
+    falhas_seguidas = 0
+    logging.info(f"Agendador iniciado ({dono}), intervalo de {args.intervalo}s.")
+    try:
+        while True:
+            try:
+                if adquirir_lock(supabase, dono, duracao_lock):
+                    sucesso = executar_ciclo(supabase, dono, args)
+                else:
+                    logging.info("Outra instância detém o lock; aguardando.")
+                    sucesso = True
+            except Exception as e:
+                logging.error(f"Falha no ciclo do agendador: {e}")
+                sucesso = False
+
+            if args.uma_vez:
+                break
+
+            falhas_seguidas = 0 if sucesso else falhas_seguidas + 1
+            espera = min(args.intervalo * (2 ** falhas_seguidas), args.espera_maxima) + random.uniform(0, args.jitter)
+            time.sleep(espera)
+    except KeyboardInterrupt:
+        logging.info("Agendador interrompido.")
+    finally:
+        liberar_lock(supabase, dono)
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Executa as rotinas automáticas da Programação em intervalos regulares.")
+    parser.add_argument("--intervalo", type=float, default=60, help="Segundos entre ciclos (padrão: 60).")
+    parser.add_argument("--jitter", type=float, default=10, help="Variação aleatória máxima, em segundos, somada ao intervalo.")
+    parser.add_argument("--espera-maxima", type=float, default=900, help="Limite da espera após falhas seguidas (backoff).")
+    parser.add_argument("--janela-dias", type=int, default=JANELA_DIAS_PADRAO, help="Quantos dias para trás considerar eventos pendentes.")
+    parser.add_argument("--uma-vez", action="store_true", help="Executa um único ciclo e sai.")
+    return parser
 
 if __name__ == "__main__":
-    finalizar_eventos_automaticamente()
+    executar_agendador(criar_parser().parse_args())
@@ -0,0 +1,88 @@
+# benchmark_evolucao.py
+#
+# Mede o cálculo da evolução do conceito médio por pelotão (relatorios.py) com dados
+# sintéticos do tamanho de um ano de curso e confere o resultado contra o cálculo
+# direto, aluno a aluno, com `calcular_conceito_final`.
+#
+# Uso: python benchmark_evolucao.py [--alunos 400] [--pelotoes 10] [--dias 365] [--acoes-por-dia 150]
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from alunos import calcular_conceito_final
+from relatorios import conceito_medio_diario_por_pelotao, calcular_evolucao
+
+CONFIG_PADRAO = {'linha_base_conceito': 8.5, 'impacto_max_acoes': 1.5, 'peso_academico': 1.0}
+
+def gerar_dados(n_alunos: int, n_pelotoes: int, n_dias: int, acoes_por_dia: int, semente: int = 42):
+    rng = np.random.default_rng(semente)
+    alunos_df = pd.DataFrame({
+        'id': [str(i) for i in range(n_alunos)],
+        'pelotao': [f"PEL-{i % n_pelotoes + 1:02d}" for i in range(n_alunos)],
+        'media_academica': rng.uniform(5.0, 10.0, n_alunos).round(2),
+    })
+    n_acoes = n_dias * acoes_por_dia
+    inicio = pd.Timestamp('2025-02-01')
+    acoes_df = pd.DataFrame({
+        'aluno_id': rng.integers(0, n_alunos, n_acoes).astype(str),
+        'data': inicio + pd.to_timedelta(rng.integers(0, n_dias * 24 * 60, n_acoes), unit='min'),
+        'pontuacao_efetiva': rng.choice([-1.0, -0.5, -0.25, 0.0, 0.25, 0.5, 1.0], n_acoes),
+    })
+    return alunos_df, acoes_df
+
+def referencia_por_aluno(acoes_df, alunos_df, config_dict, pelotoes) -> pd.DataFrame:
+    """Cálculo direto (lento): para cada dia, conceito de cada aluno e média por pelotão."""
+    alunos = alunos_df[alunos_df['pelotao'].isin(pelotoes)]
+    datas = sorted(acoes_df['data'].dt.normalize().unique())
+    linhas = []
+    for data in datas:
+        ate_o_dia = acoes_df[acoes_df['data'].dt.normalize() <= data]
+        soma = ate_o_dia.groupby('aluno_id')['pontuacao_efetiva'].sum()
+        conceitos = [
+            calcular_conceito_final(soma.get(aluno['id'], 0.0), float(aluno['media_academica']), alunos_df, config_dict)
+            for _, aluno in alunos.iterrows()
+        ]
+        medias = pd.Series(conceitos, index=alunos.index).groupby(alunos['pelotao']).mean()
+        linhas.extend({'entidade': p, 'data': data, 'valor_final': v} for p, v in medias.items())
+    return pd.DataFrame(linhas)
+
+def cronometrar(funcao, repeticoes: int = 5) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da evolução do conceito médio por pelotão.")
+    parser.add_argument("--alunos", type=int, default=400)
+    parser.add_argument("--pelotoes", type=int, default=10)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--acoes-por-dia", type=int, default=150)
+    args = parser.parse_args()
+
+    alunos_df, acoes_df = gerar_dados(args.alunos, args.pelotoes, args.dias, args.acoes_por_dia)
+    pelotoes = sorted(alunos_df['pelotao'].unique())
+    print(f"{len(alunos_df)} alunos, {len(pelotoes)} pelotões, {len(acoes_df)} ações em {args.dias} dias")
+
+    # Conferência com o cálculo direto num recorte pequeno (o cálculo direto é lento)
+    recorte = acoes_df[acoes_df['data'] < acoes_df['data'].min() + pd.Timedelta(days=10)]
+    esperado = referencia_por_aluno(recorte, alunos_df, CONFIG_PADRAO, pelotoes)
+    obtido = conceito_medio_diario_por_pelotao(recorte, alunos_df, CONFIG_PADRAO, pelotoes)
+    comparacao = esperado.merge(obtido, on=['entidade', 'data'], suffixes=('_esperado', '_obtido'))
+    diferenca = (comparacao['valor_final_esperado'] - comparacao['valor_final_obtido']).abs().max()
+    print(f"Conferência (10 dias): {len(comparacao)}/{len(esperado)} pontos, diferença máxima {diferenca:.2e}")
+
+    tempo_direto = cronometrar(lambda: referencia_por_aluno(recorte, alunos_df, CONFIG_PADRAO, pelotoes), repeticoes=1)
+    print(f"Cálculo direto, 10 dias:                 {tempo_direto * 1000:9.1f} ms")
+
+    entidade_por_aluno = pd.Series(alunos_df['pelotao'].values, index=alunos_df['id'])
+    tempo_saldo = cronometrar(lambda: calcular_evolucao(acoes_df, entidade_por_aluno))
+    tempo_conceito = cronometrar(lambda: conceito_medio_diario_por_pelotao(acoes_df, alunos_df, CONFIG_PADRAO, pelotoes))
+    print(f"Saldo acumulado por pelotão, ano todo:   {tempo_saldo * 1000:9.1f} ms")
+    print(f"Conceito médio por pelotão, ano todo:    {tempo_conceito * 1000:9.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# cache_acoes.py
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import pytz
+from datetime import date, datetime, timedelta
+from database import load_snapshot
+
+FUSO_HORARIO_LOCAL = pytz.timezone('America/Sao_Paulo')
+
+# ==============================================================================
+# DATAS ORDENADAS E FATIAMENTO POR PERÍODO
+# ==============================================================================
+def datas_locais(serie: pd.Series) -> pd.Series:
+    """Converte a coluna de datas para o horário local (sem fuso), aceitando datas com ou sem fuso."""
+    try:
+        datas = pd.to_datetime(serie, errors='coerce')
+    except (ValueError, TypeError):
+        datas = pd.to_datetime(serie, errors='coerce', utc=True)
+    if getattr(datas.dt, 'tz', None) is not None:
+        datas = datas.dt.tz_convert(FUSO_HORARIO_LOCAL).dt.tz_localize(None)
+    return datas
+
+def ordenar_por_data(df: pd.DataFrame, coluna: str = 'data') -> pd.DataFrame:
+    """
+    Retorna uma cópia com `coluna` em datetime64 (horário local), sem datas inválidas
+    e ordenada de forma estável, pronta para `fatiar_periodo`.
+    """
+    if df.empty or coluna not in df.columns:
+        return df.copy()
+    ordenado = df.assign(**{coluna: datas_locais(df[coluna])}).dropna(subset=[coluna])
+    return ordenado.sort_values(coluna, kind='stable').reset_index(drop=True)
+
+def _limite(valor, fim: bool) -> np.datetime64:
+    # Uma data (sem horário) como fim inclui o dia inteiro
+    if fim and isinstance(valor, date) and not isinstance(valor, datetime):
+        return pd.Timestamp(valor + timedelta(days=1)).to_datetime64()
+    return pd.Timestamp(valor).to_datetime64()
+
+def fatiar_periodo(df_ordenado: pd.DataFrame, inicio=None, fim=None, coluna: str = 'data') -> pd.DataFrame:
+    """
+    Retorna as linhas com `coluna` entre `inicio` e `fim` (inclusive) usando busca binária.
+    `df_ordenado` precisa estar ordenado por `coluna` (ver `ordenar_por_data`).
+    Custo O(log n) + tamanho da fatia; o resultado é uma fatia e não deve ser modificado in-place.
+    """
+    if df_ordenado.empty or (inicio is None and fim is None):
+        return df_ordenado
+    datas = df_ordenado[coluna].to_numpy()
+    primeira = 0 if inicio is None else np.searchsorted(datas, _limite(inicio, fim=False), side='left')
+    if fim is None:
+        ultima = len(datas)
+    elif isinstance(fim, date) and not isinstance(fim, datetime):
+        ultima = np.searchsorted(datas, _limite(fim, fim=True), side='left')
+    else:
+        ultima = np.searchsorted(datas, _limite(fim, fim=True), side='right')
+    return df_ordenado.iloc[primeira:ultima]
+
+# ==============================================================================
+# TABELA ACOES ORDENADA (COMPARTILHADA)
+# ==============================================================================
+@st.cache_resource(max_entries=4)
+def _construir_acoes_ordenadas(versao: str, _acoes_df: pd.DataFrame) -> pd.DataFrame:
+    acoes = ordenar_por_data(_acoes_df)
+    if 'aluno_id' in acoes.columns:
+        acoes['aluno_id'] = acoes['aluno_id'].astype(str)
+    return acoes
+
+def get_acoes_ordenadas() -> pd.DataFrame:
+    """
+    Retorna a tabela 'Acoes' da versão atual ordenada por 'data' (datetime64), compartilhada
+    entre as sessões. Use `fatiar_periodo` para filtrar por período. Somente leitura.
+    """
+    snapshot = load_snapshot("Acoes")
+    return _construir_acoes_ordenadas(snapshot.versao, snapshot.df)
@@ -0,0 +1,239 @@
+# cache_alunos.py
+
+import re
+import unicodedata
+import streamlit as st
+import pandas as pd
+import numpy as np
+from database import load_snapshot
+
+# ==============================================================================
+# ÍNDICE EM MEMÓRIA DA TABELA ALUNOS
+# ==============================================================================
+def normalizar_chave(valor) -> str:
+    """Normaliza NIP / número interno para uso como chave de dicionário."""
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    texto = str(valor).strip().upper()
+    if texto.endswith('.0') and texto[:-2].isdigit():
+        texto = texto[:-2]
+    return texto
+
+def normalizar_serie(serie: pd.Series) -> pd.Series:
+    """`normalizar_chave` aplicada uma única vez por valor distinto da série (nulos viram '')."""
+    codigos, unicos = pd.factorize(serie)
+    normalizados = np.array([normalizar_chave(valor) for valor in unicos] + [""], dtype=object)
+    return pd.Series(normalizados[codigos], index=serie.index)  # código -1 (nulo) -> ''
+
+# ==============================================================================
+# ORDENAÇÃO NATURAL DO NÚMERO INTERNO
+# ==============================================================================
+def chave_natural_numero_interno(valor) -> tuple:
+    """
+    Chave de ordenação natural do número interno ('M-1-101' < 'M-1-1010' < 'M-2-01'):
+    cada parte separada por '-' compara como número quando numérica e como texto caso contrário.
+    Valores vazios vão para o final.
+    """
+    texto = normalizar_chave(valor)
+    if not texto:
+        return ((2, 0, ''),)
+    return tuple(
+        (0, int(parte), '') if parte.isdigit() else (1, 0, parte)
+        for parte in re.split(r'\s*-\s*', texto)
+    )
+
+def calcular_ordem_numero_interno(serie: pd.Series) -> np.ndarray:
+    """Retorna, para cada valor da série, sua posição (inteiro) na ordem natural dos números internos."""
+    chaves = normalizar_serie(serie)
+    unicos = sorted(chaves.unique(), key=chave_natural_numero_interno)
+    posicao = {valor: i for i, valor in enumerate(unicos)}
+    return chaves.map(posicao).to_numpy(dtype=np.int64)
+
+# ==============================================================================
+# BUSCA DE ALUNOS (TEXTO NORMALIZADO E TRIGRAMAS)
+# ==============================================================================
+CAMPOS_BUSCA = ('numero_interno', 'nome_guerra', 'nome_completo', 'nip')
+PELOTAO_INDEFINIDO = 'Não Definido'
+
+def dobrar_acentos(valor) -> str:
+    """Texto em minúsculas, sem acentos e com espaços simples ('  JOÃO ' -> 'joao')."""
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    texto = unicodedata.normalize('NFKD', str(valor))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+def _trigramas(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+def rotulo_aluno(numero_interno, nome_guerra) -> str:
+    """Rótulo padrão dos seletores: 'Numero Interno - Nome de Guerra'."""
+    numero = 'S/N' if numero_interno is None or pd.isna(numero_interno) else numero_interno
+    nome = 'N/A' if nome_guerra is None or pd.isna(nome_guerra) else nome_guerra
+    return f"{numero} - {nome}"
+
+class IndiceAlunos:
+    """
+    Índices construídos uma única vez por versão da tabela 'Alunos' e
+    compartilhados entre as sessões. Devem ser tratados como somente leitura.
+    """
+
+    def __init__(self, alunos_df: pd.DataFrame):
+        df = alunos_df.copy()
+        if not df.empty:
+            df['id'] = df['id'].astype(str)
+            df = df.drop_duplicates(subset=['id'])
+        self._preparar_ordem_numero_interno(df)
+        self.df = df
+        self.por_id = {registro['id']: registro for registro in df.to_dict('records')} if not df.empty else {}
+
+        self._preparar_busca(df)
+        self._preparar_opcoes(df)
+
+        # NIP e número interno apontam para o id do aluno
+        self.por_chave = {}
+        for coluna in ('numero_interno', 'nip'):
+            if coluna in df.columns:
+                for aluno_id, valor in zip(df['id'], df[coluna]):
+                    chave = normalizar_chave(valor)
+                    if chave:
+                        self.por_chave.setdefault(chave, aluno_id)
+
+    def _preparar_ordem_numero_interno(self, df: pd.DataFrame):
+        # Chave inteira pré-calculada ('ordem_numero_interno') e categoria ordenada com os números internos:
+        # o código de cada categoria é a própria posição na ordem natural
+        numeros = df['numero_interno'] if 'numero_interno' in df.columns else pd.Series('', index=df.index)
+        ordem = calcular_ordem_numero_interno(numeros)
+        chaves = normalizar_serie(numeros).to_numpy()
+        posicoes = dict(zip(chaves, ordem))
+        categorias = sorted(posicoes, key=posicoes.get)
+        self.tipo_numero_interno = pd.CategoricalDtype(categories=categorias, ordered=True)
+        df['ordem_numero_interno'] = ordem
+
+    def ordem_numero_interno(self, serie: pd.Series) -> np.ndarray:
+        """
+        Converte números internos em posições na ordem natural. Se algum valor não estiver
+        na tabela (ex.: aluno recém-criado), calcula a ordem da própria série.
+        """
+        codigos = normalizar_serie(serie).astype(self.tipo_numero_interno).cat.codes.to_numpy(dtype=np.int64)
+        if (codigos < 0).any():
+            return calcular_ordem_numero_interno(serie)
+        return codigos
+
+    def _preparar_busca(self, df: pd.DataFrame):
+        # Por campo: texto normalizado de cada aluno e trigramas -> ids
+        self.textos_busca = {}
+        self.trigramas_busca = {}
+        ids = df['id'].tolist() if not df.empty else []
+        for campo in CAMPOS_BUSCA:
+            valores = df[campo] if campo in df.columns else pd.Series('', index=df.index)
+            if campo in ('numero_interno', 'nip'):
+                valores = valores.map(normalizar_chave)
+            textos = {aluno_id: dobrar_acentos(valor) for aluno_id, valor in zip(ids, valores)}
+            trigramas = {}
+            for aluno_id, texto in textos.items():
+                for trigrama in _trigramas(texto):
+                    trigramas.setdefault(trigrama, set()).add(aluno_id)
+            self.textos_busca[campo] = textos
+            self.trigramas_busca[campo] = trigramas
+
+        self.rotulos = {
+            aluno_id: rotulo_aluno(registro.get('numero_interno'), registro.get('nome_guerra'))
+            for aluno_id, registro in zip(ids, df.to_dict('records'))
+        } if ids else {}
+        self.ordem_por_id = dict(zip(ids, df['ordem_numero_interno'])) if ids else {}
+
+    def _preparar_opcoes(self, df: pd.DataFrame):
+        # Modelo de opções dos seletores: pelotão -> (ids, rótulos) na ordem do número interno
+        self.pelotoes, self._opcoes_todos, self._opcoes_por_pelotao = (), ((), ()), {}
+        if df.empty:
+            return
+        ordenados = df.iloc[np.argsort(df['ordem_numero_interno'].to_numpy(), kind='stable')]
+        pelotoes = ordenados['pelotao'].fillna(PELOTAO_INDEFINIDO).astype(str) if 'pelotao' in df.columns else pd.Series(PELOTAO_INDEFINIDO, index=ordenados.index)
+        self.pelotoes = tuple(sorted(pelotoes.unique()))
+        self._opcoes_todos = self._montar_opcoes(ordenados['id'])
+        self._opcoes_por_pelotao = {
+            pelotao: self._montar_opcoes(grupo['id']) for pelotao, grupo in ordenados.groupby(pelotoes.values, sort=False)
+        }
+
+    def _montar_opcoes(self, ids: pd.Series) -> tuple:
+        ids = tuple(ids)
+        return ids, tuple(self.rotulos[i] for i in ids)
+
+    def opcoes(self, pelotao: str = None) -> tuple:
+        """Retorna (ids, rótulos) dos alunos do pelotão (ou de todos), na ordem do número interno."""
+        if pelotao is None:
+            return self._opcoes_todos
+        return self._opcoes_por_pelotao.get(pelotao, ((), ()))
+
+    def buscar(self, termo: str, campos=CAMPOS_BUSCA) -> list:
+        """
+        Retorna os ids dos alunos cujo texto (sem acentos, sem diferenciar maiúsculas) contém `termo`
+        em algum dos `campos`, do mais relevante para o menos relevante: igualdade, início de
+        palavra e, por fim, trecho no meio; empates seguem o número interno.
+        """
+        consulta = dobrar_acentos(termo)
+        if not consulta:
+            return []
+        relevancia = {}
+        for campo in campos:
+            textos = self.textos_busca.get(campo, {})
+            if len(consulta) >= 3:
+                conjuntos = [self.trigramas_busca.get(campo, {}).get(t, set()) for t in _trigramas(consulta)]
+                candidatos = set.intersection(*sorted(conjuntos, key=len))
+            else:
+                candidatos = textos.keys()
+            for aluno_id in candidatos:
+                texto = textos[aluno_id]
+                posicao = texto.find(consulta)
+                if posicao < 0:
+                    continue
+                if texto == consulta:
+                    nivel = 0
+                elif posicao == 0 or texto[posicao - 1] == ' ':
+                    nivel = 1
+                else:
+                    nivel = 2
+                relevancia[aluno_id] = min(nivel, relevancia.get(aluno_id, nivel))
+        return sorted(relevancia, key=lambda i: (relevancia[i], self.ordem_por_id.get(i, 0)))
+
+    def buscar_id(self, chave):
+        """Retorna o id do aluno dono do NIP / número interno informado, ou None."""
+        return self.por_chave.get(normalizar_chave(chave))
+
+    def materializar(self, ids) -> pd.DataFrame:
+        """Monta um DataFrame com os alunos dos ids informados, na mesma ordem."""
+        registros = [self.por_id[i] for i in ids if i in self.por_id]
+        return pd.DataFrame(registros, columns=self.df.columns)
+
+@st.cache_resource(max_entries=4)
+def _construir_indice_alunos(versao: str, _alunos_df: pd.DataFrame) -> IndiceAlunos:
+    return IndiceAlunos(_alunos_df)
+
+def get_indice_alunos() -> IndiceAlunos:
+    """Retorna o índice compartilhado da versão atual da tabela 'Alunos'."""
+    snapshot = load_snapshot("Alunos")
+    return _construir_indice_alunos(snapshot.versao, snapshot.df)
+
+def filtrar_por_busca(df: pd.DataFrame, termo: str, campos=CAMPOS_BUSCA) -> pd.DataFrame:
+    """
+    Mantém as linhas de `df` (coluna 'id') encontradas pela busca no índice compartilhado,
+    na ordem de relevância da busca (melhores resultados primeiro).
+    """
+    if not termo or df.empty:
+        return df
+    posicao = {str(aluno_id): i for i, aluno_id in enumerate(get_indice_alunos().buscar(termo, campos))}
+    ranking = df['id'].astype(str).map(posicao)
+    encontrados = ranking.notna().to_numpy()
+    return df[encontrados].iloc[np.argsort(ranking[encontrados].to_numpy(), kind='stable')]
+
+def ordenar_por_numero_interno(df: pd.DataFrame, coluna: str = 'numero_interno', ascending: bool = True) -> pd.DataFrame:
+    """Ordena `df` pelo número interno (ordem natural) com um único argsort sobre a chave pré-calculada."""
+    if df.empty or coluna not in df.columns:
+        return df
+    if coluna == 'numero_interno' and 'ordem_numero_interno' in df.columns:
+        ordem = df['ordem_numero_interno'].to_numpy()
+    else:
+        ordem = get_indice_alunos().ordem_numero_interno(df[coluna])
+    posicoes = np.argsort(ordem if ascending else -ordem, kind='stable')
+    return df.iloc[posicoes]
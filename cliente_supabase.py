@@ -0,0 +1,34 @@
+# cliente_supabase.py
+#
+# Cliente do Supabase para os scripts que rodam fora do Streamlit (automacao_eventos.py,
+# importar_fotos.py). Não importa o Streamlit nem configura o logging.
+
+import logging
+import os
+
+# Mesmo arquivo de credenciais do app, lido sem importar o Streamlit
+CAMINHO_SECRETS = os.environ.get(
+    "STREAMLIT_SECRETS", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+)
+
+def criar_cliente_supabase():
+    """
+    Cria o cliente a partir das variáveis de ambiente SUPABASE_URL / SUPABASE_KEY.
+    Sem elas, usa a seção [supabase] do secrets.toml (mesmas credenciais do app).
+    Retorna None se não houver credenciais.
+    """
+    from supabase import create_client
+    url, chave = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if not (url and chave):
+        try:
+            import tomllib
+            with open(CAMINHO_SECRETS, 'rb') as arquivo:
+                secao = tomllib.load(arquivo).get("supabase", {})
+            url, chave = secao.get("url"), secao.get("key")
+        except (ImportError, OSError, ValueError) as e:
+            logging.error(f"Credenciais do Supabase não encontradas (variáveis de ambiente ou {CAMINHO_SECRETS}): {e}")
+            return None
+    if not (url and chave):
+        logging.error(f"Seção [supabase] incompleta em {CAMINHO_SECRETS}.")
+        return None
+    return create_client(url, chave)
@@ -3,13 +3,55 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from database import load_data, init_supabase_client
-from io import BytesIO
-from fpdf import FPDF
-import math
+from database import load_data, init_supabase_client, carregar_intervalo, invalidar_tabelas
+from cache_alunos import ordenar_por_numero_interno
+from dispensas import render_dispensas
+from pernoite_mensal import identificar_tipo, salvar_pernoite, render_resumo_mensal
+from relatorio_pdf import RelatorioPDF, criar_modelo_grade, desenhar_grade, hash_valores
+
+# --- PDF DO PERNOITE (MODELO FIXO + CACHE POR DATA, ALUNOS E TEXTOS) ---
+MODELO_GRADE_PERNOITE = criar_modelo_grade(pares_por_linha=4, altura_linha=8, linhas_extras=3)
+TITULO_TABELA_PERNOITE = "NÚMERO INTERNO DE ALUNOS"
+
+def _desenhar_secao_pernoite(pdf, texto_esq, texto_dir, numeros_internos):
+    """Textos superiores, título e grade de números internos de uma categoria (M ou Q)."""
+    pdf.set_font(pdf.fonte, '', 12)
+    y_antes = pdf.get_y()
+    pdf.cell(pdf.w / 2, 8, texto_esq, 0, 0, 'L')
+    pdf.set_y(y_antes)
+    pdf.cell(0, 8, texto_dir, 0, 1, 'R')
+    pdf.ln(5)
+
+    pdf.set_font(pdf.fonte, 'B', 12)
+    pdf.cell(0, 10, TITULO_TABELA_PERNOITE, 1, 1, 'C')
+
+    if not numeros_internos:
+        pdf.set_font(pdf.fonte, '', 10)
+        pdf.cell(0, 10, "Nenhum aluno selecionado para esta categoria.", 1, 1, 'C')
+        pdf.ln(10)
+        return
+
+    desenhar_grade(pdf, numeros_internos, MODELO_GRADE_PERNOITE)
+    pdf.ln(15) # Espaço extra após cada tabela
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _gerar_pdf_pernoite_em_cache(data_iso, hash_alunos, cabecalho_principal, rodape_texto, textos_m, textos_q,
+                                 _numeros_m, _numeros_q) -> bytes:
+    # Os números internos entram na chave pelo hash; a data só identifica o relatório do dia
+    pdf = RelatorioPDF(rodape=rodape_texto)
+    pdf.add_page()
+
+    # Cabeçalho principal uma única vez
+    pdf.set_font(pdf.fonte, 'B', 12)
+    pdf.multi_cell(0, 6, cabecalho_principal, 0, 'C')
+    pdf.ln(10)
+
+    _desenhar_secao_pernoite(pdf, textos_m[0], textos_m[1], _numeros_m)
+    _desenhar_secao_pernoite(pdf, textos_q[0], textos_q[1], _numeros_q)
+    return pdf.para_bytes()
 
-# --- FUNÇÃO PARA GERAR PDF (COM O LAYOUT FINAL E SEPARAÇÃO) ---
 def gerar_pdf_pernoite(
+    data,
     cabecalho_principal,
     rodape_texto,
     alunos_m_df,
@@ -19,110 +61,18 @@ def gerar_pdf_pernoite(
 ):
     """
     Gera o PDF do relatório de pernoite com seções separadas para alunos M e Q.
+    O resultado fica em cache por (data, alunos selecionados, textos): um relatório
+    que não mudou é baixado sem ser desenhado de novo.
     """
-    # --- Classe PDF personalizada para controlar cabeçalho e rodapé ---
-    class PDF(FPDF):
-        def __init__(self, cabecalho_txt, rodape_txt):
-            super().__init__()
-            self.cabecalho_texto = cabecalho_txt
-            self.rodape_texto = rodape_txt
-
-        def header(self):
-            # Esta função é deixada em branco para evitar repetição em novas páginas.
-            pass
-
-        def footer(self):
-            # Rodapé personalizado
-            self.set_y(-25)
-            self.set_font('Arial', 'I', 10)
-            self.multi_cell(0, 5, self.rodape_texto, 0, 'C')
-            
-            # Número da página
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-        def desenhar_corpo_tabela(self, titulo_secao, texto_esq, texto_dir, alunos_df):
-            """
-            Função auxiliar para desenhar uma seção completa da tabela.
-            """
-            self.set_font("Arial", '', 12)
-            y_antes = self.get_y()
-            self.cell(self.w / 2, 8, texto_esq, 0, 0, 'L')
-            self.set_y(y_antes)
-            self.cell(0, 8, texto_dir, 0, 1, 'R')
-            self.ln(5)
-
-            self.set_font("Arial", 'B', 12)
-            self.cell(0, 10, titulo_secao, 1, 1, 'C')
-
-            # Corpo da tabela
-            self.set_font("Arial", '', 10)
-            lista_numeros_internos = alunos_df['numero_interno'].tolist()
-            total_militares = len(lista_numeros_internos)
-
-            if total_militares == 0:
-                self.cell(0, 10, "Nenhum aluno selecionado para esta categoria.", 1, 1, 'C')
-                self.ln(10)
-                return
-
-            num_pares_por_linha = 4
-            largura_pagina = self.w - 2 * self.l_margin
-            largura_par = largura_pagina / num_pares_por_linha
-            largura_col_ordem = largura_par * 0.20
-            largura_col_valor = largura_par * 0.80
-            altura_linha = 8
-
-            num_linhas_dados = math.ceil(total_militares / num_pares_por_linha)
-            num_linhas_total = num_linhas_dados + 3
-            total_celulas_grid = num_linhas_total * num_pares_por_linha
-
-            for idx in range(total_celulas_grid):
-                if idx % num_pares_por_linha == 0 and idx > 0:
-                    self.ln()
-
-                if idx < total_militares:
-                    ordem = str(idx + 1)
-                    numero_interno = str(lista_numeros_internos[idx])
-                else:
-                    ordem = ""
-                    numero_interno = ""
-
-                self.cell(largura_col_ordem, altura_linha, ordem, 1, 0, 'C')
-                self.cell(largura_col_valor, altura_linha, numero_interno, 1, 0, 'C')
-            
-            self.ln(15) # Espaço extra após cada tabela
-
-    # --- Lógica de Geração do PDF ---
-    pdf = PDF(cabecalho_principal, rodape_texto)
-    pdf.add_page()
-
-    # Desenha o cabeçalho principal uma única vez
-    pdf.set_font("Arial", 'B', 12)
-    pdf.multi_cell(0, 6, pdf.cabecalho_texto, 0, 'C')
-    pdf.ln(10)
-
-    # Usa um título genérico para ambas as tabelas
-    titulo_tabela = "NÚMERO INTERNO DE ALUNOS"
-
-    # Desenha a seção para Alunos M (CAP)
-    pdf.desenhar_corpo_tabela(
-        titulo_tabela,
-        textos_m['esquerda'],
-        textos_m['direita'],
-        alunos_m_df
+    numeros_m = [str(n) for n in alunos_m_df['numero_interno'].tolist()]
+    numeros_q = [str(n) for n in alunos_q_df['numero_interno'].tolist()]
+    return _gerar_pdf_pernoite_em_cache(
+        data.strftime('%Y-%m-%d'), hash_valores(numeros_m, numeros_q),
+        cabecalho_principal, rodape_texto,
+        (textos_m['esquerda'], textos_m['direita']), (textos_q['esquerda'], textos_q['direita']),
+        numeros_m, numeros_q
     )
 
-    # Desenha a seção para Alunos Q (QTPA)
-    pdf.desenhar_corpo_tabela(
-        titulo_tabela,
-        textos_q['esquerda'],
-        textos_q['direita'],
-        alunos_q_df
-    )
-
-    return pdf.output(dest='S').encode('latin-1')
-
 
 # --- PÁGINA PRINCIPAL DO MÓDULO (INTERFACE DO STREAMLIT) ---
 def show_controle_pernoite():
@@ -132,7 +82,6 @@ def show_controle_pernoite():
     supabase = init_supabase_client()
     
     alunos_df = load_data("Alunos")
-    pernoite_df = load_data("pernoite")
 
     # Remove o pelotão 'BAIXA' da lista de alunos
     if 'pelotao' in alunos_df.columns:
@@ -140,15 +89,6 @@ def show_controle_pernoite():
 
     # Cria a coluna 'tipo_aluno' dinamicamente baseada no 'numero_interno'
     alunos_df['numero_interno'] = alunos_df['numero_interno'].astype(str)
-    
-    def identificar_tipo(numero):
-        if numero.strip().upper().startswith('M'):
-            return 'M'
-        elif numero.strip().upper().startswith('Q'):
-            return 'Q'
-        else:
-            return 'Outro'
-
     alunos_df['tipo_aluno'] = alunos_df['numero_interno'].apply(identificar_tipo)
     COLUNA_TIPO_ALUNO = "tipo_aluno"
 
@@ -177,23 +117,28 @@ def show_controle_pernoite():
     
     alunos_visiveis_ids = [str(id) for id in alunos_filtrados_df['id'].tolist()]
 
+    with st.expander("⚕️ Dispensados médicos nesta data", expanded=False):
+        render_dispensas("pernoite", data=data_selecionada, pelotao=pelotao_selecionado)
+
     st.markdown("---")
     st.subheader("2. Marque os Alunos em Pernoite")
 
     if 'pernoite_status' not in st.session_state:
         st.session_state.pernoite_status = {}
-    
+
+    ids_alunos = set(alunos_df['id'].astype(str))
+
     if not st.session_state.get('pernoite_status_carregado'):
-        if not pernoite_df.empty and data_selecionada:
-            pernoite_df['data'] = pd.to_datetime(pernoite_df['data']).dt.date
-            pernoite_hoje_df = pernoite_df[pernoite_df['data'] == data_selecionada]
-            alunos_presentes_ids = [str(id) for id in pernoite_hoje_df[pernoite_hoje_df['presente'] == True]['aluno_id'].tolist()]
-        else:
-            alunos_presentes_ids = []
-        
-        for aluno_id in alunos_df['id'].astype(str).tolist():
-            st.session_state.pernoite_status[aluno_id] = aluno_id in alunos_presentes_ids
-        
+        # Só os registros do dia selecionado; o estado carregado fica guardado para comparar no salvamento
+        alunos_presentes_ids = set()
+        if data_selecionada:
+            dia = data_selecionada.strftime('%Y-%m-%d')
+            pernoite_dia_df = carregar_intervalo("pernoite", "data", dia, dia)
+            if not pernoite_dia_df.empty:
+                alunos_presentes_ids = set(pernoite_dia_df.loc[pernoite_dia_df['presente'] == True, 'aluno_id'].astype(str))
+
+        st.session_state.pernoite_status = {aluno_id: aluno_id in alunos_presentes_ids for aluno_id in ids_alunos}
+        st.session_state.pernoite_presentes_salvos = alunos_presentes_ids
         st.session_state.pernoite_status_carregado = True
 
     col_b1, col_b2, col_b3 = st.columns([1, 1, 2])
@@ -209,8 +154,8 @@ def show_controle_pernoite():
     
     st.write("") 
 
-    # Ordena a lista de alunos pelo número interno
-    for _, aluno in alunos_filtrados_df.sort_values('numero_interno').iterrows():
+    # Ordena a lista de alunos pelo número interno (ordem natural)
+    for _, aluno in ordenar_por_numero_interno(alunos_filtrados_df).iterrows():
         aluno_id_str = str(aluno['id'])
         tipo_str = f" ({aluno.get(COLUNA_TIPO_ALUNO, 'N/A')})"
         st.session_state.pernoite_status[aluno_id_str] = st.checkbox(
@@ -221,22 +166,25 @@ def show_controle_pernoite():
 
     st.write("") 
     if st.button("Salvar Alterações", type="primary", use_container_width=True):
-        registos_para_salvar = []
-        for aluno_id, marcado in st.session_state.pernoite_status.items():
-            if aluno_id in alunos_df['id'].astype(str).tolist():
-                registos_para_salvar.append({
-                    'aluno_id': int(aluno_id),
-                    'data': data_selecionada.strftime('%Y-%m-%d'),
-                    'presente': marcado
-                })
-        
-        if registos_para_salvar:
+        # Grava só os alunos cuja marcação mudou em relação ao estado carregado do dia
+        presentes_salvos = st.session_state.get('pernoite_presentes_salvos', set())
+        alterados = {
+            aluno_id: marcado for aluno_id, marcado in st.session_state.pernoite_status.items()
+            if aluno_id in ids_alunos and marcado != (aluno_id in presentes_salvos)
+        }
+
+        if not alterados:
+            st.info("Nenhuma alteração para salvar.")
+        else:
             try:
-                supabase.table("pernoite").upsert(registos_para_salvar, on_conflict='aluno_id,data').execute()
-                st.success("Alterações salvas com sucesso!")
-                load_data.clear()
-                st.session_state.pop('pernoite_status_carregado', None)
-                st.rerun()
+                # Grava o dia e atualiza o consolidado mensal na mesma transação (sql/004)
+                salvar_pernoite(supabase, data_selecionada, alterados)
+                # Atualização otimista: o estado salvo passa a ser o da tela, sem recarregar o dia do banco
+                st.session_state.pernoite_presentes_salvos = {
+                    aluno_id for aluno_id, marcado in st.session_state.pernoite_status.items()
+                    if marcado and aluno_id in ids_alunos
+                } | (presentes_salvos - ids_alunos)
+                st.success(f"Alterações salvas com sucesso! ({len(alterados)} aluno(s) atualizado(s))")
             except Exception as e:
                 st.error(f"Erro ao salvar: {e}")
     
@@ -285,7 +233,7 @@ def show_controle_pernoite():
             {'chave': 'texto_sup_dir_q_pdf', 'valor': texto_dir_q_editado},
         ]
         supabase.table("Config").upsert(configs_para_salvar).execute()
-        st.success("Textos padrão salvos com sucesso!"); load_data.clear()
+        st.success("Textos padrão salvos com sucesso!"); invalidar_tabelas("Config")
 
     # Filtra e separa os alunos por tipo para o PDF
     ids_selecionados_na_tela = [
@@ -295,8 +243,8 @@ def show_controle_pernoite():
     
     alunos_para_pdf_df = alunos_df[alunos_df['id'].astype(str).isin(ids_selecionados_na_tela)]
     
-    alunos_m_df = alunos_para_pdf_df[alunos_para_pdf_df[COLUNA_TIPO_ALUNO] == 'M'].sort_values('numero_interno')
-    alunos_q_df = alunos_para_pdf_df[alunos_para_pdf_df[COLUNA_TIPO_ALUNO] == 'Q'].sort_values('numero_interno')
+    alunos_m_df = ordenar_por_numero_interno(alunos_para_pdf_df[alunos_para_pdf_df[COLUNA_TIPO_ALUNO] == 'M'])
+    alunos_q_df = ordenar_por_numero_interno(alunos_para_pdf_df[alunos_para_pdf_df[COLUNA_TIPO_ALUNO] == 'Q'])
 
     st.write(f"**Total de militares marcados (CAP):** {len(alunos_m_df)} | **Total de militares marcados (QTPA):** {len(alunos_q_df)}")
 
@@ -305,6 +253,7 @@ def show_controle_pernoite():
             st.warning("Nenhum aluno está marcado como 'pernoite'.")
         else:
             pdf_bytes = gerar_pdf_pernoite(
+                data=data_selecionada,
                 cabecalho_principal=cabecalho_editado,
                 rodape_texto=rodape_editado,
                 alunos_m_df=alunos_m_df,
@@ -319,3 +268,7 @@ def show_controle_pernoite():
                 file_name=f"pernoite_{data_selecionada.strftime('%Y-%m-%d')}.pdf",
                 mime="application/pdf"
             )
+
+    st.markdown("---")
+    st.subheader("4. Resumo Mensal de Pernoite")
+    render_resumo_mensal(supabase)
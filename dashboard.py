@@ -1,37 +1,109 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from database import load_data, init_supabase_client
-from PIL import Image
+from database import load_data, init_supabase_client, load_snapshot, get_table_version, invalidar_tabelas
 import numpy as np
-from pyzbar.pyzbar import decode
 import plotly.express as px
 from alunos import calcular_pontuacao_efetiva
 from auth import check_permission
-import pytz
 
 # --- ALTERAÇÃO: Importar o componente de seleção de alunos ---
 from aluno_selection_components import render_alunos_filter_and_selection
+from cache_alunos import get_indice_alunos
+from cache_acoes import FUSO_HORARIO_LOCAL, ordenar_por_data, fatiar_periodo
+from leitor_crachas import decodificar_codigo_de_barras, decodificar_lote_imagens, LeitorCrachasLote, criar_callback_video
 
 # --- FUNÇÕES AUXILIARES ---
-def decodificar_codigo_de_barras(upload_de_imagem):
-    """Lê um arquivo de imagem e retorna uma lista de NIPs encontrados."""
-    try:
-        imagem = Image.open(upload_de_imagem)
-        imagem_cv = np.array(imagem)
-        codigos_barras = decode(imagem_cv)
-        nips_encontrados = []
-        if not codigos_barras:
-            return nips_encontrados, "Nenhum código de barras encontrado na imagem."
-        for codigo in codigos_barras:
-            nip = codigo.data.decode('utf-8')
-            if len(nip) == 8 and nip.isdigit():
-                nips_encontrados.append(nip)
-        if not nips_encontrados:
-            return [], "Código(s) de barras encontrado(s), mas nenhum é um NIP válido (8 dígitos)."
-        return nips_encontrados, f"{len(nips_encontrados)} NIP(s) encontrado(s) com sucesso!"
-    except Exception as e:
-        return [], f"Erro ao processar a imagem: {e}"
+def adicionar_alunos_por_nips(nips, indice_alunos):
+    """
+    Adiciona ao grupo escaneado os alunos correspondentes aos NIPs lidos.
+    Cada NIP custa uma consulta ao índice; o grupo é um conjunto ordenado de ids.
+    Retorna (nomes_adicionados, quantidade_nao_encontrada).
+    """
+    escaneados = st.session_state.alunos_escaneados_ids
+    nomes_adicionados, nao_encontrados = [], 0
+    for nip in nips:
+        aluno_id = indice_alunos.buscar_id(nip)
+        if aluno_id is None:
+            nao_encontrados += 1
+        elif aluno_id not in escaneados:
+            escaneados[aluno_id] = None
+            nomes_adicionados.append(indice_alunos.por_id[aluno_id].get('nome_guerra', 'N/A'))
+    return nomes_adicionados, nao_encontrados
+
+def render_scanner_crachas(indice_alunos):
+    """Renderiza os modos de leitura de crachás (foto única, vídeo ao vivo ou várias imagens)."""
+    modo_leitura = st.radio(
+        "Modo de leitura:",
+        ["📷 Foto", "🎥 Vídeo ao vivo (lote)", "🖼️ Várias imagens (lote)"],
+        horizontal=True, key="modo_leitura_crachas"
+    )
+    if modo_leitura != "🎥 Vídeo ao vivo (lote)" and 'leitor_crachas_lote' in st.session_state:
+        st.session_state.pop('leitor_crachas_lote').parar()
+
+    if modo_leitura == "📷 Foto":
+        st.info("O modo scanner está ativo. Aponte a câmera para um ou mais crachás e tire a foto.")
+        imagem_cracha = st.camera_input("Escanear Crachá(s)", label_visibility="collapsed")
+        if imagem_cracha is not None:
+            nips, msg = decodificar_codigo_de_barras(imagem_cracha)
+            if nips:
+                nomes_adicionados, nao_encontrados = adicionar_alunos_por_nips(nips, indice_alunos)
+                if nomes_adicionados:
+                    st.toast(f"Alunos adicionados: {', '.join(nomes_adicionados)}", icon="✅")
+                elif nao_encontrados == len(nips): st.warning("Nenhum aluno encontrado com o(s) NIP(s) lido(s).")
+            else: st.error(msg)
+
+    elif modo_leitura == "🎥 Vídeo ao vivo (lote)":
+        try:
+            from streamlit_webrtc import webrtc_streamer, WebRtcMode
+        except ImportError:
+            st.error("O componente 'streamlit-webrtc' não está instalado neste servidor."); return
+
+        if 'leitor_crachas_lote' not in st.session_state:
+            st.session_state.leitor_crachas_lote = LeitorCrachasLote()
+        leitor = st.session_state.leitor_crachas_lote
+        leitor.iniciar()
+
+        st.info("Passe os crachás da formação em frente à câmera. Os NIPs lidos são acumulados sem repetição.")
+        webrtc_streamer(
+            key="scanner_crachas_lote",
+            mode=WebRtcMode.SENDRECV,
+            video_frame_callback=criar_callback_video(leitor),
+            media_stream_constraints={"video": True, "audio": False},
+            async_processing=True,
+        )
+
+        @st.fragment(run_every=1)
+        def contador_leitura():
+            nips_lidos = leitor.nips_lidos()
+            st.metric("NIPs lidos", len(nips_lidos))
+            if nips_lidos:
+                st.caption(", ".join(nips_lidos[-10:]))
+        contador_leitura()
+
+        col_add, col_limpar = st.columns(2)
+        if col_add.button("✅ Adicionar lidos à seleção", use_container_width=True):
+            nomes_adicionados, nao_encontrados = adicionar_alunos_por_nips(leitor.nips_lidos(), indice_alunos)
+            st.toast(f"{len(nomes_adicionados)} aluno(s) adicionados.", icon="✅")
+            if nao_encontrados > 0:
+                st.warning(f"{nao_encontrados} NIP(s) lido(s) não correspondem a nenhum aluno.")
+            leitor.limpar()
+        if col_limpar.button("🧹 Limpar leitura", use_container_width=True):
+            leitor.limpar()
+
+    else:
+        uploads = st.file_uploader("Envie as fotos dos crachás", type=["png", "jpg", "jpeg"], accept_multiple_files=True, key="uploads_crachas_lote")
+        if uploads and st.button("🔍 Ler crachás das imagens", type="primary"):
+            with st.spinner(f"Decodificando {len(uploads)} imagem(ns)..."):
+                resultado = decodificar_lote_imagens(uploads)
+            nomes_adicionados, nao_encontrados = adicionar_alunos_por_nips(resultado['nips'], indice_alunos)
+            st.success(f"{len(resultado['nips'])} NIP(s) lido(s) em {len(uploads)} imagem(ns); {len(nomes_adicionados)} aluno(s) adicionados.")
+            if nao_encontrados > 0:
+                st.warning(f"{nao_encontrados} NIP(s) lido(s) não correspondem a nenhum aluno.")
+            if resultado['sem_nip']:
+                st.warning(f"Imagens sem NIP válido: {', '.join(resultado['sem_nip'])}")
+            for erro in resultado['erros']:
+                st.error(erro)
 
 def display_pending_items():
     """Mostra um painel unificado de ordens do dia e tarefas pendentes."""
@@ -60,79 +132,165 @@ def display_pending_items():
         st.divider()
 
 # --- PÁGINA PRINCIPAL DO DASHBOARD ---
-def load_dashboard_data():
-    """Carrega todos os dados necessários para o dashboard e os armazena no session_state."""
-    if 'dashboard_data_loaded' not in st.session_state:
-        st.session_state.alunos_df = load_data("Alunos")
-        st.session_state.acoes_df = load_data("Acoes")
-        st.session_state.tipos_acao_df = load_data("Tipos_Acao")
-        st.session_state.config_df = load_data("Config")
-        st.session_state.ordens_df = load_data("Ordens_Diarias")
-        st.session_state.tarefas_df = load_data("Tarefas")
-        st.session_state.dashboard_data_loaded = True
+TABELAS_DASHBOARD = ["Alunos", "Acoes", "Tipos_Acao", "Config"]
+
+def load_dashboard_data() -> dict:
+    """
+    Retorna os snapshots compartilhados das tabelas do dashboard.
+    Cada snapshot só é recarregado quando a tabela mudou no banco (ver database.load_snapshot).
+    """
+    return {tabela: load_snapshot(tabela) for tabela in TABELAS_DASHBOARD}
+
+def render_indicador_atualizacao(snapshots: dict):
+    """Mostra a idade dos dados exibidos e permite forçar a verificação de mudanças."""
+    carregado_em = min(snap.carregado_em for snap in snapshots.values())
+    verificado_em = min(snap.verificado_em for snap in snapshots.values())
+    idade_minutos = int((datetime.now() - carregado_em).total_seconds() // 60)
+    col_info, col_botao = st.columns([4, 1])
+    col_info.caption(
+        f"🕒 Dados de {carregado_em.strftime('%H:%M:%S')} (há {idade_minutos} min sem alterações) · "
+        f"última verificação às {verificado_em.strftime('%H:%M:%S')}"
+    )
+    if col_botao.button("🔄 Verificar agora", key="dashboard_verificar_dados", use_container_width=True):
+        get_table_version.clear()
+        st.rerun()
+
+# --- AGREGADOS PRÉ-CALCULADOS (UMA VEZ POR VERSÃO DOS DADOS) ---
+def _agrupar_destaques(df: pd.DataFrame) -> list:
+    """Agrupa as ações por dia local em listas prontas para renderização."""
+    buckets = []
+    for day, day_df in df.groupby(df['data_local'].dt.date):
+        itens = [
+            {'nome_guerra': r['nome_guerra'], 'tipo': r.get('tipo', 'N/A'), 'descricao': r['descricao'] if isinstance(r.get('descricao'), str) and r['descricao'].strip() else 'Sem descrição.'}
+            for r in day_df.sort_values('data_local', ascending=False).to_dict('records')
+        ]
+        buckets.append((day, itens))
+    return buckets
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def calcular_agregados_dashboard(versoes: tuple, hoje, _snapshots: dict) -> dict:
+    """
+    Calcula os destaques, as séries por pelotão e o índice de aniversários.
+    O resultado é compartilhado entre usuários e recalculado apenas quando a versão
+    de alguma tabela muda ou o dia vira. Deve ser tratado como somente leitura.
+    """
+    alunos_df = _snapshots["Alunos"].df
+    acoes_df = _snapshots["Acoes"].df
+    tipos_acao_df = _snapshots["Tipos_Acao"].df
+    config_df = _snapshots["Config"].df
+
+    agregados = {'vazio': True, 'destaques_positivos': [], 'destaques_negativos': [], 'pelotoes': [], 'series_pelotao': {}, 'aniversarios_por_dia': {}}
+    acoes_com_pontos_df = calcular_pontuacao_efetiva(acoes_df, tipos_acao_df, config_df) if not acoes_df.empty and not tipos_acao_df.empty else pd.DataFrame()
+    if alunos_df.empty or acoes_com_pontos_df.empty:
+        return agregados
+    agregados['vazio'] = False
+
+    alunos_df = alunos_df.assign(id=alunos_df['id'].astype(str))
+    acoes_com_pontos_df['aluno_id'] = acoes_com_pontos_df['aluno_id'].astype(str)
+
+    # --- Destaques dos últimos 3 dias ---
+    # Ordena por data local e recorta a janela por busca binária antes de juntar os nomes
+    data_limite = pd.Timestamp(hoje - timedelta(days=2))
+    acoes_ordenadas_df = ordenar_por_data(acoes_com_pontos_df.assign(data_local=acoes_com_pontos_df['data']), 'data_local')
+    acoes_recentes_df = fatiar_periodo(acoes_ordenadas_df, data_limite, None, coluna='data_local')
+    acoes_com_nomes_df = pd.merge(acoes_recentes_df, alunos_df[['id', 'nome_guerra']], left_on='aluno_id', right_on='id', how='left')
+    acoes_com_nomes_df['nome_guerra'] = acoes_com_nomes_df['nome_guerra'].fillna('N/A')
+    status = acoes_com_nomes_df['status'] if 'status' in acoes_com_nomes_df.columns else pd.Series('', index=acoes_com_nomes_df.index)
+    df_filtrado = acoes_com_nomes_df[
+        (acoes_com_nomes_df['pontuacao_efetiva'] != 0) &
+        (status != 'Arquivado')
+    ]
+    agregados['destaques_positivos'] = _agrupar_destaques(df_filtrado[df_filtrado['pontuacao_efetiva'] > 0])
+    agregados['destaques_negativos'] = _agrupar_destaques(df_filtrado[df_filtrado['pontuacao_efetiva'] < 0])
+
+    # --- Séries por pelotão (as três visualizações do gráfico) ---
+    if 'pelotao' in alunos_df.columns:
+        pelotoes_para_exibir = sorted(alunos_df['pelotao'].dropna().unique().tolist())
+        alunos_pelotoes_df = alunos_df[alunos_df['pelotao'].isin(pelotoes_para_exibir)]
+        acoes_com_alunos_df = pd.merge(acoes_com_pontos_df, alunos_pelotoes_df[['id', 'pelotao']], left_on='aluno_id', right_on='id', how='inner')
+        agregados['pelotoes'] = pelotoes_para_exibir
+
+        if acoes_com_alunos_df.empty:
+            agregados['series_pelotao'] = {modo: pd.DataFrame() for modo in ["Conceito Médio", "Soma de Pontos (Valor)", "Quantidade de Anotações"]}
+        else:
+            config_dict = pd.Series(config_df.valor.values, index=config_df.chave).to_dict() if not config_df.empty else {}
+            linha_base_conceito = float(config_dict.get('linha_base_conceito', 8.5))
+            soma_pontos_por_aluno = acoes_com_alunos_df.groupby('aluno_id')['pontuacao_efetiva'].sum()
+            pontuacao_final = linha_base_conceito + alunos_pelotoes_df['id'].map(soma_pontos_por_aluno).fillna(0)
+            agregados['series_pelotao']["Conceito Médio"] = pontuacao_final.groupby(alunos_pelotoes_df['pelotao']).mean().rename('pontuacao_final').reset_index()
+
+            agregados['series_pelotao']["Soma de Pontos (Valor)"] = acoes_com_alunos_df.groupby('pelotao')['pontuacao_efetiva'].sum().reset_index()
+
+            tipo_anotacao = np.where(acoes_com_alunos_df['pontuacao_efetiva'] > 0, 'Positivas', 'Negativas')
+            agregados['series_pelotao']["Quantidade de Anotações"] = (
+                acoes_com_alunos_df.assign(**{'Tipo de Anotação': tipo_anotacao})
+                .groupby(['pelotao', 'Tipo de Anotação']).size().reset_index(name='Quantidade')
+            )
+
+    # --- Índice de aniversários por (mês, dia) ---
+    if 'data_nascimento' in alunos_df.columns:
+        nascimentos = pd.to_datetime(alunos_df['data_nascimento'], errors='coerce')
+        alunos_nasc_df = alunos_df.assign(data_nascimento=nascimentos).dropna(subset=['data_nascimento']).sort_values('data_nascimento')
+        for aluno in alunos_nasc_df.to_dict('records'):
+            data_nasc = aluno['data_nascimento']
+            agregados['aniversarios_por_dia'].setdefault((data_nasc.month, data_nasc.day), []).append({
+                'numero_interno': aluno.get('numero_interno', 'N/A'),
+                'nome_guerra': aluno.get('nome_guerra', 'N/A'),
+                'data': data_nasc.strftime('%d/%m'),
+            })
+    return agregados
 
 # --- PÁGINA PRINCIPAL DO DASHBOARD (MODIFICADA) ---
 def show_dashboard():
-    # Garante que os dados são carregados apenas uma vez por sessão
-    load_dashboard_data()
-
-    # Pega os dados do session_state em vez de chamar load_data repetidamente
-    alunos_df = st.session_state.alunos_df
-    acoes_df = st.session_state.acoes_df
-    tipos_acao_df = st.session_state.tipos_acao_df
-    config_df = st.session_state.config_df
+    # Snapshots compartilhados entre sessões: não devem ser modificados in-place
+    snapshots = load_dashboard_data()
+    tipos_acao_df = snapshots["Tipos_Acao"].df
 
     user_display_name = st.session_state.get('full_name', st.session_state.get('username', ''))
     st.title(f"Dashboard - Bem-vindo(a), {user_display_name}!")
+    render_indicador_atualizacao(snapshots)
     
     display_pending_items()
     
     supabase = init_supabase_client()
     
     if 'scanner_ativo' not in st.session_state: st.session_state.scanner_ativo = False
-    if 'alunos_escaneados_df' not in st.session_state: st.session_state.alunos_escaneados_df = pd.DataFrame()
+    if 'alunos_escaneados_ids' not in st.session_state: st.session_state.alunos_escaneados_ids = {}
 
-    acoes_com_pontos_df = calcular_pontuacao_efetiva(acoes_df, tipos_acao_df, config_df) if not acoes_df.empty and not tipos_acao_df.empty else pd.DataFrame()
+    indice_alunos = get_indice_alunos()
 
     if check_permission('pode_escanear_cracha'):
         with st.expander("⚡ Anotação Rápida em Massa", expanded=False):
             if st.button("📸 Iniciar/Parar Leitor de Crachás", type="primary"):
                 st.session_state.scanner_ativo = not st.session_state.scanner_ativo
                 if not st.session_state.scanner_ativo:
-                    st.session_state.alunos_escaneados_df = pd.DataFrame()
+                    st.session_state.alunos_escaneados_ids = {}
 
             if st.session_state.scanner_ativo:
                 with st.container(border=True):
-                    st.info("O modo scanner está ativo. Aponte a câmera para um ou mais crachás e tire a foto.")
-                    imagem_cracha = st.camera_input("Escanear Crachá(s)", label_visibility="collapsed")
-                    if imagem_cracha is not None:
-                        nips, msg = decodificar_codigo_de_barras(imagem_cracha)
-                        if nips and 'nip' in alunos_df.columns:
-                            alunos_encontrados_df = alunos_df[alunos_df['nip'].isin(nips)]
-                            if not alunos_encontrados_df.empty:
-                                st.session_state.alunos_escaneados_df = pd.concat([st.session_state.alunos_escaneados_df, alunos_encontrados_df]).drop_duplicates(subset=['id'])
-                                st.toast(f"Alunos adicionados: {', '.join(alunos_encontrados_df['nome_guerra'].tolist())}", icon="✅")
-                            else: st.warning("Nenhum aluno encontrado com o(s) NIP(s) lido(s).")
-                        else: st.error(msg)
+                    render_scanner_crachas(indice_alunos)
+            elif 'leitor_crachas_lote' in st.session_state:
+                st.session_state.pop('leitor_crachas_lote').parar()
             
             st.subheader("Seleção de Alunos")
             alunos_selecionados_df = render_alunos_filter_and_selection(key_suffix="dashboard_quick_action", include_full_name_search=True)
             
-            if not st.session_state.alunos_escaneados_df.empty:
-                alunos_selecionados_df = pd.concat([alunos_selecionados_df, st.session_state.alunos_escaneados_df]).drop_duplicates(subset=['id'])
+            # Conjunto ordenado de ids: seleção manual seguida dos crachás escaneados
+            ids_selecionados = dict.fromkeys(alunos_selecionados_df['id'].astype(str)) if not alunos_selecionados_df.empty else {}
+            ids_selecionados.update(st.session_state.alunos_escaneados_ids)
 
             with st.form("anotacao_rapida_form"):
-                if not alunos_selecionados_df.empty:
-                    nomes_selecionados = ", ".join(alunos_selecionados_df['nome_guerra'].tolist())
-                    st.info(f"A ação será registrada para ({len(alunos_selecionados_df)}): **{nomes_selecionados}**")
+                if ids_selecionados:
+                    nomes_selecionados = ", ".join(indice_alunos.por_id[i].get('nome_guerra', 'N/A') for i in ids_selecionados if i in indice_alunos.por_id)
+                    st.info(f"A ação será registrada para ({len(ids_selecionados)}): **{nomes_selecionados}**")
                 else: st.warning("Nenhum aluno selecionado.")
 
                 opcoes_finais, tipos_opcoes_map = [], {}
                 if not tipos_acao_df.empty:
-                    tipos_acao_df['pontuacao'] = pd.to_numeric(tipos_acao_df['pontuacao'], errors='coerce').fillna(0)
-                    for df, cat in [(tipos_acao_df[tipos_acao_df['pontuacao'] > 0].sort_values('nome'), "POSITIVAS"),
-                                    (tipos_acao_df[tipos_acao_df['pontuacao'] == 0].sort_values('nome'), "NEUTRAS"),
-                                    (tipos_acao_df[tipos_acao_df['pontuacao'] < 0].sort_values('nome'), "NEGATIVAS")]:
+                    tipos_ordenados_df = tipos_acao_df.assign(pontuacao=pd.to_numeric(tipos_acao_df['pontuacao'], errors='coerce').fillna(0))
+                    for df, cat in [(tipos_ordenados_df[tipos_ordenados_df['pontuacao'] > 0].sort_values('nome'), "POSITIVAS"),
+                                    (tipos_ordenados_df[tipos_ordenados_df['pontuacao'] == 0].sort_values('nome'), "NEUTRAS"),
+                                    (tipos_ordenados_df[tipos_ordenados_df['pontuacao'] < 0].sort_values('nome'), "NEGATIVAS")]:
                         if not df.empty:
                             opcoes_finais.append(f"--- AÇÕES {cat} ---")
                             for _, r in df.iterrows():
@@ -142,117 +300,77 @@ def show_dashboard():
                 descricao = st.text_area("Descrição da Ação (Opcional)")
                 
                 if st.form_submit_button("Registrar Ação"):
-                    if alunos_selecionados_df.empty or not tipo_selecionado_str or tipo_selecionado_str.startswith("---"):
+                    if not ids_selecionados or not tipo_selecionado_str or tipo_selecionado_str.startswith("---"):
                         st.warning("Selecione ao menos um aluno e um tipo de ação válido.")
                     else:
                         try:
-                            ids_alunos = alunos_selecionados_df['id'].tolist()
+                            ids_alunos = list(ids_selecionados)
                             tipo_info = tipos_opcoes_map[tipo_selecionado_str]
                             novas_acoes = [{'aluno_id': str(aluno_id), 'tipo_acao_id': str(tipo_info['id']), 'tipo': tipo_info['nome'], 'descricao': descricao, 'data': datetime.now().strftime('%Y-%m-%d'), 'usuario': st.session_state.username, 'status': 'Pendente', 'lancado_faia': False} for aluno_id in ids_alunos]
                             if novas_acoes:
                                 supabase.table("Acoes").insert(novas_acoes).execute()
                                 st.success(f"Ação registrada para {len(novas_acoes)} aluno(s)!")
-                                # Limpa os dados para forçar recarregamento na próxima vez
-                                del st.session_state.dashboard_data_loaded
-                                st.session_state.alunos_escaneados_df = pd.DataFrame()
-                                load_data.clear() 
+                                # A nova versão de 'Acoes' é detectada pela verificação de versão
+                                st.session_state.alunos_escaneados_ids = {}
+                                invalidar_tabelas("Acoes")
                                 st.rerun()
                         except Exception as e:
                             st.error(f"Falha ao salvar a(s) ação(ões): {e}")
     st.divider()
-    if alunos_df.empty or acoes_com_pontos_df.empty:
+    agregados = calcular_agregados_dashboard(
+        tuple(snap.versao for snap in snapshots.values()), datetime.now(FUSO_HORARIO_LOCAL).date(), snapshots
+    )
+    if agregados['vazio']:
         st.info("Registre alunos e ações para visualizar os painéis de dados.")
+        return
+
+    st.header("Destaques dos Últimos 3 Dias")
+    col_pos, col_neg = st.columns(2)
+
+    def render_highlights(buckets, title, is_expanded):
+        st.markdown(f"#### {title}")
+        st.write("---")
+        if not buckets:
+            st.info("Nenhum registro para exibir."); return
+        for day, itens in buckets:
+            label = f"🗓️ {day.strftime('%d de %B')} ({len(itens)} {'item' if len(itens) == 1 else 'itens'})"
+            with st.expander(label, expanded=is_expanded):
+                for acao in itens:
+                    st.markdown(f"**{acao['nome_guerra']}**: {acao['tipo']}")
+                    st.caption(f"*{acao['descricao']}*")
+            is_expanded = False # Expande apenas o primeiro dia
+
+    with col_pos: render_highlights(agregados['destaques_positivos'], "✅ Destaques Positivos", True)
+    with col_neg: render_highlights(agregados['destaques_negativos'], "⚠️ Destaques Negativos", True)
+
+    st.divider()
+    st.subheader("Análise de Desempenho por Pelotão")
+
+    if agregados['pelotoes']:
+        chart_mode = st.radio("Visualização do gráfico:", ["Conceito Médio", "Soma de Pontos (Valor)", "Quantidade de Anotações"], horizontal=True)
+        serie = agregados['series_pelotao'][chart_mode]
+
+        if serie.empty:
+            st.info(f"Nenhuma ação encontrada para os pelotões: {', '.join(agregados['pelotoes'])}")
+        elif chart_mode == "Conceito Médio":
+            fig = px.bar(serie, x='pelotao', y='pontuacao_final', title='Conceito Médio por Pelotão', labels={'pelotao': 'Pelotão', 'pontuacao_final': 'Conceito Médio'}, color='pontuacao_final', color_continuous_scale='RdYlGn', text_auto='.2f')
+            st.plotly_chart(fig, use_container_width=True)
+        elif chart_mode == "Soma de Pontos (Valor)":
+            fig = px.bar(serie, x='pelotao', y='pontuacao_efetiva', title='Saldo de Pontos por Pelotão', labels={'pelotao': 'Pelotão', 'pontuacao_efetiva': 'Saldo de Pontos'}, color='pontuacao_efetiva', color_continuous_scale='RdYlGn', text_auto='.1f')
+            st.plotly_chart(fig, use_container_width=True)
+        else: # Quantidade de Anotações
+            fig = px.bar(serie, x='pelotao', y='Quantidade', color='Tipo de Anotação', barmode='group', title='Quantidade de Anotações por Pelotão', labels={'pelotao': 'Pelotão'}, color_discrete_map={'Positivas': 'green', 'Negativas': 'red'}, text_auto=True)
+            st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("🎂 Aniversariantes (Próximos 7 dias e Últimos 7 dias)")
+    hoje = datetime.now(FUSO_HORARIO_LOCAL).date()
+    # Período de 14 dias: semana passada + semana atual (até o domingo)
+    domingo_semana_atual = hoje - timedelta(days=hoje.weekday()) + timedelta(days=6)
+    inicio_periodo_busca = domingo_semana_atual - timedelta(days=13)
+    dias_periodo = sorted({((inicio_periodo_busca + timedelta(days=i)).month, (inicio_periodo_busca + timedelta(days=i)).day) for i in range(14)})
+    aniversariantes = [aluno for dia in dias_periodo for aluno in agregados['aniversarios_por_dia'].get(dia, [])]
+    if aniversariantes:
+        for aluno in aniversariantes:
+            st.success(f"**{aluno['numero_interno']}** - **{aluno['nome_guerra']}** - {aluno['data']}")
     else:
-        acoes_com_pontos_df['data'] = pd.to_datetime(acoes_com_pontos_df['data'], errors='coerce')
-        acoes_com_nomes_df = pd.merge(acoes_com_pontos_df, alunos_df[['id', 'nome_guerra']], left_on='aluno_id', right_on='id', how='left')
-        if 'nome_guerra' in acoes_com_nomes_df:
-            acoes_com_nomes_df['nome_guerra'].fillna('N/A', inplace=True)
-        
-        fuso_horario_local = pytz.timezone('America/Sao_Paulo')
-        hoje = datetime.now(fuso_horario_local).date()
-        data_limite = hoje - timedelta(days=2)
-
-        df_filtrado = acoes_com_nomes_df[
-            (acoes_com_nomes_df['data'].dt.tz_convert(fuso_horario_local).dt.date >= data_limite) &
-            (acoes_com_nomes_df['pontuacao_efetiva'] != 0) &
-            (acoes_com_nomes_df['status'] != 'Arquivado')
-        ].copy()
-        
-        df_filtrado = df_filtrado.sort_values(by="data", ascending=False)
-        
-        st.header("Destaques dos Últimos 3 Dias")
-        col_pos, col_neg = st.columns(2)
-
-        def render_highlights(dataframe, title, is_expanded):
-            st.markdown(f"#### {title}")
-            st.write("---")
-            if dataframe.empty:
-                st.info("Nenhum registro para exibir."); return
-            
-            # Agrupa por data já convertida para o fuso horário local
-            for day, day_df in dataframe.groupby(dataframe['data'].dt.tz_convert(fuso_horario_local).dt.date):
-                label = f"🗓️ {day.strftime('%d de %B')} ({len(day_df)} {'item' if len(day_df) == 1 else 'itens'})"
-                with st.expander(label, expanded=is_expanded):
-                    for _, acao in day_df.iterrows():
-                        st.markdown(f"**{acao.get('nome_guerra')}**: {acao.get('tipo', 'N/A')}")
-                        st.caption(f"*{acao.get('descricao', 'Sem descrição.')}*")
-                is_expanded = False # Expande apenas o primeiro dia
-        
-        with col_pos: render_highlights(df_filtrado[df_filtrado['pontuacao_efetiva'] > 0], "✅ Destaques Positivos", True)
-        with col_neg: render_highlights(df_filtrado[df_filtrado['pontuacao_efetiva'] < 0], "⚠️ Destaques Negativos", True)
-        
-        st.divider()
-        st.subheader("Análise de Desempenho por Pelotão")
-        
-        if 'pelotao' in alunos_df.columns:
-            pelotoes_para_exibir = sorted(alunos_df['pelotao'].dropna().unique().tolist())
-            chart_mode = st.radio("Visualização do gráfico:", ["Conceito Médio", "Soma de Pontos (Valor)", "Quantidade de Anotações"], horizontal=True)
-            
-            acoes_com_alunos_df = pd.merge(acoes_com_pontos_df, alunos_df[alunos_df['pelotao'].isin(pelotoes_para_exibir)][['id', 'pelotao']], left_on='aluno_id', right_on='id', how='inner')
-            
-            if acoes_com_alunos_df.empty:
-                st.info(f"Nenhuma ação encontrada para os pelotões: {', '.join(pelotoes_para_exibir)}")
-            else:
-                if chart_mode == "Conceito Médio":
-                    config_dict = pd.Series(config_df.valor.values, index=config_df.chave).to_dict() if not config_df.empty else {}
-                    linha_base_conceito = float(config_dict.get('linha_base_conceito', 8.5))
-                    soma_pontos_por_aluno = acoes_com_alunos_df.groupby('aluno_id')['pontuacao_efetiva'].sum()
-                    alunos_com_pontuacao = pd.merge(alunos_df[alunos_df['pelotao'].isin(pelotoes_para_exibir)], soma_pontos_por_aluno.rename('soma_pontos'), left_on='id', right_on='aluno_id', how='left')
-                    alunos_com_pontuacao['soma_pontos'] = alunos_com_pontuacao['soma_pontos'].fillna(0)
-                    alunos_com_pontuacao['pontuacao_final'] = linha_base_conceito + alunos_com_pontuacao['soma_pontos']
-                    media_por_pelotao = alunos_com_pontuacao.groupby('pelotao')['pontuacao_final'].mean().reset_index()
-                    fig = px.bar(media_por_pelotao, x='pelotao', y='pontuacao_final', title='Conceito Médio por Pelotão', labels={'pelotao': 'Pelotão', 'pontuacao_final': 'Conceito Médio'}, color='pontuacao_final', color_continuous_scale='RdYlGn', text_auto='.2f')
-                    st.plotly_chart(fig, use_container_width=True)
-
-                elif chart_mode == "Soma de Pontos (Valor)":
-                    soma_por_pelotao = acoes_com_alunos_df.groupby('pelotao')['pontuacao_efetiva'].sum().reset_index()
-                    fig = px.bar(soma_por_pelotao, x='pelotao', y='pontuacao_efetiva', title='Saldo de Pontos por Pelotão', labels={'pelotao': 'Pelotão', 'pontuacao_efetiva': 'Saldo de Pontos'}, color='pontuacao_efetiva', color_continuous_scale='RdYlGn', text_auto='.1f')
-                    st.plotly_chart(fig, use_container_width=True)
-
-                else: # Quantidade de Anotações
-                    contagem_por_tipo = acoes_com_alunos_df.copy()
-                    contagem_por_tipo['Tipo de Anotação'] = np.where(contagem_por_tipo['pontuacao_efetiva'] > 0, 'Positivas', 'Negativas')
-                    contagem_df = contagem_por_tipo.groupby(['pelotao', 'Tipo de Anotação']).size().reset_index(name='Quantidade')
-                    fig = px.bar(contagem_df, x='pelotao', y='Quantidade', color='Tipo de Anotação', barmode='group', title='Quantidade de Anotações por Pelotão', labels={'pelotao': 'Pelotão'}, color_discrete_map={'Positivas': 'green', 'Negativas': 'red'}, text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-
-        st.subheader("🎂 Aniversariantes (Próximos 7 dias e Últimos 7 dias)")
-        if not alunos_df.empty and 'data_nascimento' in alunos_df.columns:
-            alunos_df['data_nascimento'] = pd.to_datetime(alunos_df['data_nascimento'], errors='coerce')
-            alunos_nasc_validos = alunos_df.dropna(subset=['data_nascimento'])
-            
-            # Lógica para encontrar o período de 14 dias (semana passada + semana atual/próxima)
-            dia_da_semana_hoje = hoje.weekday() 
-            domingo_semana_atual = hoje - timedelta(days=dia_da_semana_hoje) + timedelta(days=6)
-            inicio_periodo_busca = domingo_semana_atual - timedelta(days=13)
-            
-            aniversarios_periodo = [(inicio_periodo_busca + timedelta(days=i)).strftime('%m-%d') for i in range(14)]
-            aniversariantes_df = alunos_nasc_validos[alunos_nasc_validos['data_nascimento'].dt.strftime('%m-%d').isin(aniversarios_periodo)].copy()
-            
-            if not aniversariantes_df.empty:
-                aniversariantes_df['dia_mes'] = aniversariantes_df['data_nascimento'].dt.strftime('%m-%d')
-                aniversariantes_df = aniversariantes_df.sort_values(by='dia_mes')
-                for _, aluno in aniversariantes_df.iterrows():
-                    st.success(f"**{aluno.get('numero_interno', 'N/A')}** - **{aluno['nome_guerra']}** - {aluno['data_nascimento'].strftime('%d/%m')}")
-            else:
-                st.info("Nenhum aniversariante no período.")
+        st.info("Nenhum aniversariante no período.")
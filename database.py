@@ -4,6 +4,9 @@ import streamlit as st
 from supabase import create_client, Client
 import pandas as pd
 import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -18,6 +21,27 @@ def init_supabase_client() -> Client:
         st.error(f"Erro ao conectar com o Supabase. Verifique seu arquivo 'secrets.toml'. Detalhe: {e}")
         return None
 
+def buscar_todas_paginas(construir_consulta, page_size: int = 1000) -> list:
+    """
+    Executa uma consulta paginada, superando o limite de 1000 linhas do Supabase.
+    `construir_consulta` deve devolver uma consulta nova (já com select e filtros) a cada chamada.
+    """
+    all_data = []
+    page = 0
+    while True:
+        # Calcula o range (intervalo) da página atual
+        start_index = page * page_size
+        end_index = start_index + page_size - 1
+        current_page_data = construir_consulta().range(start_index, end_index).execute().data
+        if not current_page_data:
+            break
+        all_data.extend(current_page_data)
+        # Se a página retornou menos dados que o tamanho máximo, chegamos ao fim.
+        if len(current_page_data) < page_size:
+            break
+        page += 1
+    return all_data
+
 # --- FUNÇÃO load_data ATUALIZADA COM PAGINAÇÃO ---
 @st.cache_data(ttl=60)
 def load_data(table_name: str) -> pd.DataFrame:
@@ -31,34 +55,7 @@ def load_data(table_name: str) -> pd.DataFrame:
 
     logging.info(f"Carregando TODOS os dados da tabela Supabase: '{table_name}'")
     try:
-        all_data = []
-        page = 0
-        page_size = 1000  # O tamanho da página padrão do Supabase
-
-        while True:
-            # Calcula o range (intervalo) da página atual
-            start_index = page * page_size
-            end_index = start_index + page_size - 1
-            
-            # Busca a página atual de dados usando .range()
-            response = supabase.table(table_name).select("*").range(start_index, end_index).execute()
-            
-            current_page_data = response.data
-            if not current_page_data:
-                # Se não houver mais dados, para o loop
-                break
-            
-            # Adiciona os dados da página à nossa lista completa
-            all_data.extend(current_page_data)
-            
-            # Se a página retornou menos dados que o tamanho máximo,
-            # significa que chegamos ao fim.
-            if len(current_page_data) < page_size:
-                break
-            
-            # Prepara para buscar a próxima página na próxima iteração
-            page += 1
-
+        all_data = buscar_todas_paginas(lambda: supabase.table(table_name).select("*"))
         df = pd.DataFrame(all_data)
         logging.info(f"Carregamento concluído. Total de {len(df)} linhas da tabela '{table_name}'.")
         return df
@@ -67,3 +64,191 @@ def load_data(table_name: str) -> pd.DataFrame:
         logging.error(f"Ocorreu um erro ao carregar dados da tabela '{table_name}': {e}", exc_info=True)
         st.error(f"Erro ao ler a tabela '{table_name}' do Supabase: {e}")
         return pd.DataFrame()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def carregar_intervalo(table_name: str, coluna_data: str, inicio: str, fim: str, filtros: tuple = ()) -> pd.DataFrame:
+    """
+    Carrega apenas as linhas com `coluna_data` entre `inicio` e `fim` (inclusive, 'AAAA-MM-DD').
+    `filtros` é uma tupla de pares (coluna, valores) aplicados com `in` no próprio banco.
+    """
+    supabase = init_supabase_client()
+    if supabase is None:
+        return pd.DataFrame()
+
+    def construir_consulta():
+        consulta = supabase.table(table_name).select("*").gte(coluna_data, inicio).lte(coluna_data, fim)
+        for coluna, valores in filtros:
+            consulta = consulta.in_(coluna, list(valores))
+        return consulta.order(coluna_data)
+
+    try:
+        return pd.DataFrame(buscar_todas_paginas(construir_consulta))
+    except Exception as e:
+        logging.error(f"Erro ao carregar '{table_name}' entre {inicio} e {fim}: {e}", exc_info=True)
+        st.error(f"Erro ao ler a tabela '{table_name}' do Supabase: {e}")
+        return pd.DataFrame()
+
+
+# ==============================================================================
+# SNAPSHOTS VERSIONADOS E COMPARTILHADOS
+# ==============================================================================
+# Coluna mantida por trigger no banco (ver sql/001_updated_at.sql)
+COLUNA_ATUALIZACAO = 'updated_at'
+# Intervalo de recarga para tabelas sem a coluna de atualização
+TTL_SNAPSHOT_SEM_VERSAO = 60
+# Uma transação aberta antes do snapshot pode gravar um updated_at menor que o máximo já visto
+# e só ficar visível depois. A busca incremental relê essa janela antes do máximo, e cada
+# snapshot é relido uma vez depois dela (limite suposto para a duração de uma transação).
+MARGEM_ATUALIZACAO_SEGUNDOS = 300
+
+@dataclass
+class SnapshotTabela:
+    """Cópia em memória de uma tabela, compartilhada entre sessões. Somente leitura."""
+    df: pd.DataFrame
+    contagem: int = None
+    max_atualizacao: str = None
+    carregado_em: datetime = field(default_factory=datetime.now)
+    verificado_em: datetime = field(default_factory=datetime.now)
+    consolidado: bool = False  # já relido depois da margem de transações em andamento
+
+    @property
+    def versao(self) -> str:
+        return f"{self.contagem}|{self.max_atualizacao}|{self.carregado_em.timestamp()}"
+
+    @property
+    def idade_segundos(self) -> float:
+        return (datetime.now() - self.carregado_em).total_seconds()
+
+@st.cache_data(ttl=15, show_spinner=False)
+def get_table_version(table_name: str):
+    """
+    Consulta barata para saber se uma tabela mudou: (contagem de linhas, max(updated_at)).
+    Retorna (contagem, None) quando a tabela não possui a coluna de atualização.
+    """
+    supabase = init_supabase_client()
+    if supabase is None:
+        return None, None
+    try:
+        response = supabase.table(table_name).select(COLUNA_ATUALIZACAO, count='exact').order(COLUNA_ATUALIZACAO, desc=True).limit(1).execute()
+        max_atualizacao = response.data[0].get(COLUNA_ATUALIZACAO) if response.data else None
+        return response.count, max_atualizacao
+    except Exception:
+        try:
+            response = supabase.table(table_name).select('*', count='exact').limit(1).execute()
+            return response.count, None
+        except Exception as e:
+            logging.error(f"Erro ao consultar a versão da tabela '{table_name}': {e}")
+            return None, None
+
+@st.cache_resource
+def _snapshot_store() -> dict:
+    return {'snapshots': {}, 'locks': {}, 'lock_global': threading.Lock()}
+
+def _lock_da_tabela(store: dict, table_name: str) -> threading.Lock:
+    with store['lock_global']:
+        return store['locks'].setdefault(table_name, threading.Lock())
+
+def _atualizar_incrementalmente(table_name: str, atual: SnapshotTabela, contagem: int, max_atualizacao: str):
+    """
+    Busca apenas as linhas alteradas desde o último snapshot (menos a margem de transações
+    em andamento, ver MARGEM_ATUALIZACAO_SEGUNDOS). Retorna None se for preciso recarregar tudo.
+    """
+    if atual.max_atualizacao is None or 'id' not in atual.df.columns:
+        return None
+    supabase = init_supabase_client()
+    desde = (pd.Timestamp(atual.max_atualizacao) - pd.Timedelta(seconds=MARGEM_ATUALIZACAO_SEGUNDOS)).isoformat()
+    alteradas = buscar_todas_paginas(
+        lambda: supabase.table(table_name).select("*").gte(COLUNA_ATUALIZACAO, desde).order(COLUNA_ATUALIZACAO)
+    )
+    alteradas_df = pd.DataFrame(alteradas)
+    if alteradas_df.empty:
+        df = atual.df
+    else:
+        ids_alterados = set(alteradas_df['id'].astype(str))
+        df = pd.concat([atual.df[~atual.df['id'].astype(str).isin(ids_alterados)], alteradas_df], ignore_index=True)
+    # Exclusões não aparecem em updated_at; se a contagem não bater, recarrega tudo.
+    if len(df) != contagem:
+        return None
+    logging.info(f"Snapshot '{table_name}' atualizado incrementalmente ({len(alteradas_df)} linha(s) alterada(s)).")
+    return SnapshotTabela(df=df, contagem=contagem, max_atualizacao=max_atualizacao)
+
+def load_snapshot(table_name: str) -> SnapshotTabela:
+    """
+    Retorna o snapshot compartilhado da tabela, recarregando-o apenas quando a
+    versão no banco mudou. O DataFrame retornado NÃO deve ser modificado.
+    """
+    contagem, max_atualizacao = get_table_version(table_name)
+    store = _snapshot_store()
+    with _lock_da_tabela(store, table_name):
+        atual = store['snapshots'].get(table_name)
+        consolidar = False
+        if atual is not None:
+            if max_atualizacao is not None and (contagem, max_atualizacao) == (atual.contagem, atual.max_atualizacao):
+                if atual.consolidado or atual.idade_segundos < MARGEM_ATUALIZACAO_SEGUNDOS:
+                    atual.verificado_em = datetime.now()
+                    return atual
+                # Mesma versão, mas ainda não relida depois da margem: linhas gravadas por transações
+                # que terminaram após o snapshot não mudam contagem nem máximo
+                consolidar = True
+            if max_atualizacao is None and contagem in (None, atual.contagem) and atual.idade_segundos < TTL_SNAPSHOT_SEM_VERSAO:
+                atual.verificado_em = datetime.now()
+                return atual
+
+        novo = None
+        if atual is not None and max_atualizacao is not None:
+            try:
+                novo = _atualizar_incrementalmente(table_name, atual, contagem, max_atualizacao)
+            except Exception as e:
+                logging.error(f"Falha na atualização incremental de '{table_name}': {e}")
+            if novo is not None:
+                novo.consolidado = consolidar
+        if novo is None:
+            supabase = init_supabase_client()
+            try:
+                df = pd.DataFrame(buscar_todas_paginas(lambda: supabase.table(table_name).select("*"))) if supabase else pd.DataFrame()
+            except Exception as e:
+                logging.error(f"Ocorreu um erro ao carregar o snapshot da tabela '{table_name}': {e}", exc_info=True)
+                st.error(f"Erro ao ler a tabela '{table_name}' do Supabase: {e}")
+                return atual if atual is not None else SnapshotTabela(df=pd.DataFrame())
+            novo = SnapshotTabela(df=df, contagem=contagem if contagem is not None else len(df), max_atualizacao=max_atualizacao)
+            logging.info(f"Snapshot '{table_name}' carregado por completo ({len(df)} linhas).")
+        store['snapshots'][table_name] = novo
+        return novo
+
+def invalidar_tabelas(*table_names: str):
+    """Invalida os caches (load_data, intervalos e snapshots) apenas das tabelas informadas."""
+    get_table_version.clear()
+    # As consultas por intervalo são poucas e curtas; descartá-las por inteiro é suficiente.
+    carregar_intervalo.clear()
+    for table_name in table_names:
+        try:
+            load_data.clear(table_name)
+        except TypeError:
+            # Versões do Streamlit sem limpeza por argumento
+            load_data.clear()
+            break
+
+# ==============================================================================
+# GRAVAÇÃO EM LOTES
+# ==============================================================================
+TAMANHO_LOTE_PADRAO = 500
+
+def gravar_em_lotes(supabase, table_name: str, registros: list, operacao: str = "upsert",
+                    tamanho_lote: int = TAMANHO_LOTE_PADRAO, ao_progredir=None, **opcoes) -> int:
+    """
+    Envia `registros` em lotes de tamanho limitado, evitando o limite de tamanho das requisições.
+    `operacao` pode ser 'insert' ou 'upsert'; `opcoes` são repassadas ao cliente
+    (ex.: on_conflict='aluno_id,data', ignore_duplicates=True).
+    `ao_progredir(gravados, total)` é chamado após cada lote. Retorna o total gravado.
+    """
+    total = len(registros)
+    gravados = 0
+    for inicio in range(0, total, tamanho_lote):
+        lote = registros[inicio:inicio + tamanho_lote]
+        tabela = supabase.table(table_name)
+        consulta = tabela.insert(lote, **opcoes) if operacao == "insert" else tabela.upsert(lote, **opcoes)
+        consulta.execute()
+        gravados += len(lote)
+        if ao_progredir:
+            ao_progredir(gravados, total)
+    return gravados
@@ -0,0 +1,236 @@
+# dispensas.py
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from fpdf import FPDF
+from database import load_snapshot
+from cache_acoes import datas_locais
+from cache_alunos import get_indice_alunos, ordenar_por_numero_interno, PELOTAO_INDEFINIDO
+from pdf_utils import registrar_fonte_dejavu, pdf_para_bytes
+
+COLUNAS_DISPENSA = ['acao_id', 'aluno_id', 'numero_interno', 'nome_guerra', 'pelotao', 'tipo', 'tipo_dispensa', 'inicio', 'fim']
+
+# ==============================================================================
+# ÍNDICE DE INTERVALOS (INÍCIOS ORDENADOS + JANELA DA MAIOR DURAÇÃO)
+# ==============================================================================
+class _Intervalos:
+    """
+    Dispensas de um grupo (todas com data de fim) ordenadas pelo início. Um intervalo que
+    cruza [a, b] começa em [a - maior_duracao, b], então a busca binária limita a varredura a essa janela.
+    """
+    def __init__(self, dispensas: pd.DataFrame):
+        self.linhas = dispensas.sort_values('inicio', kind='stable').reset_index(drop=True)
+        self.inicios = self.linhas['inicio'].to_numpy('datetime64[ns]')
+        self.fins = self.linhas['fim'].to_numpy('datetime64[ns]')
+        self.maior_duracao = (self.fins - self.inicios).max() if len(self.linhas) else np.timedelta64(0, 'ns')
+
+    def sobrepostos(self, inicio: np.datetime64, fim: np.datetime64) -> pd.DataFrame:
+        primeira = np.searchsorted(self.inicios, inicio - self.maior_duracao, side='left')
+        ultima = np.searchsorted(self.inicios, fim, side='right')
+        janela = self.linhas.iloc[primeira:ultima]
+        return janela[self.fins[primeira:ultima] >= inicio]
+
+def extrair_dispensas(acoes_df: pd.DataFrame, alunos_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uma linha por ação com 'esta_dispensado', com o período em datetime64 (dia, sem horário)
+    e os dados do aluno. Sem início informado, vale a data da ação; fim antes do início é descartado.
+    """
+    colunas_necessarias = {'esta_dispensado', 'periodo_dispensa_inicio', 'periodo_dispensa_fim'}
+    if acoes_df.empty or not colunas_necessarias.issubset(acoes_df.columns):
+        return pd.DataFrame(columns=COLUNAS_DISPENSA)
+
+    acoes = acoes_df[acoes_df['esta_dispensado'].eq(True)]
+    inicio = pd.to_datetime(acoes['periodo_dispensa_inicio'], errors='coerce').dt.normalize()
+    if 'data' in acoes.columns:
+        inicio = inicio.fillna(datas_locais(acoes['data']).dt.normalize())
+    fim = pd.to_datetime(acoes['periodo_dispensa_fim'], errors='coerce').dt.normalize()
+    dispensas = pd.DataFrame({
+        'acao_id': acoes['id'].astype(str) if 'id' in acoes.columns else '',
+        'aluno_id': acoes['aluno_id'].astype(str) if 'aluno_id' in acoes.columns else '',
+        'tipo': acoes['tipo'] if 'tipo' in acoes.columns else '',
+        'tipo_dispensa': acoes['tipo_dispensa'] if 'tipo_dispensa' in acoes.columns else None,
+        'inicio': inicio,
+        'fim': fim,
+    })
+    dispensas = dispensas[dispensas['inicio'].notna() & ~(dispensas['fim'] < dispensas['inicio'])]
+
+    if not alunos_df.empty and 'id' in alunos_df.columns:
+        alunos = alunos_df.assign(id=alunos_df['id'].astype(str)).set_index('id')
+        for coluna in ('numero_interno', 'nome_guerra', 'pelotao'):
+            dispensas[coluna] = dispensas['aluno_id'].map(alunos[coluna]) if coluna in alunos.columns else None
+    else:
+        dispensas = dispensas.assign(numero_interno=None, nome_guerra=None, pelotao=None)
+    dispensas['pelotao'] = dispensas['pelotao'].fillna(PELOTAO_INDEFINIDO)
+    dispensas['tipo_dispensa'] = dispensas['tipo_dispensa'].fillna('')
+    return dispensas[COLUNAS_DISPENSA].reset_index(drop=True)
+
+class IndiceDispensas:
+    """
+    Índice das dispensas médicas por período, geral e por pelotão.
+    Cada consulta custa O(log n) + tamanho da janela; os resultados são DataFrames novos.
+    Dispensas sem data de fim não entram na relação, a mesma regra do módulo de Saúde
+    (que as mostra em "Sem Dispensa"); ficam em `sem_fim` para serem apontadas à parte.
+    """
+    def __init__(self, acoes_df: pd.DataFrame, alunos_df: pd.DataFrame):
+        self.dispensas = extrair_dispensas(acoes_df, alunos_df)
+        com_fim = self.dispensas[self.dispensas['fim'].notna()]
+        self.sem_fim = self.dispensas[self.dispensas['fim'].isna()].reset_index(drop=True)
+        self._geral = _Intervalos(com_fim)
+        self._por_pelotao = {pelotao: _Intervalos(grupo) for pelotao, grupo in com_fim.groupby('pelotao')}
+
+    def contar_sem_fim(self, ate, pelotao=None) -> int:
+        """Quantas dispensas sem data de fim começaram até `ate` (não entram na relação)."""
+        sem_fim = self.sem_fim if pelotao in (None, "Todos") else self.sem_fim[self.sem_fim['pelotao'] == pelotao]
+        return int((sem_fim['inicio'] <= pd.Timestamp(ate)).sum())
+
+    def no_periodo(self, inicio, fim, pelotao=None) -> pd.DataFrame:
+        """
+        Alunos dispensados em algum dia entre `inicio` e `fim` (inclusive), em ordem de número interno.
+        Se o aluno tiver mais de uma dispensa no período, fica a que termina por último.
+        """
+        intervalos = self._geral if pelotao in (None, "Todos") else self._por_pelotao.get(pelotao)
+        if intervalos is None:
+            return pd.DataFrame(columns=COLUNAS_DISPENSA)
+        inicio = pd.Timestamp(inicio).normalize().to_datetime64()
+        fim = pd.Timestamp(fim).normalize().to_datetime64()
+        encontrados = intervalos.sobrepostos(inicio, fim)
+        if encontrados.empty:
+            return encontrados
+        ultima_por_aluno = encontrados.sort_values('fim', kind='stable').drop_duplicates('aluno_id', keep='last')
+        return ordenar_por_numero_interno(ultima_por_aluno).reset_index(drop=True)
+
+    def em(self, data, pelotao=None) -> pd.DataFrame:
+        """Alunos dispensados na data informada."""
+        return self.no_periodo(data, data, pelotao)
+
+@st.cache_resource(max_entries=4)
+def _construir_indice_dispensas(versao_acoes: str, versao_alunos: str, _acoes_df: pd.DataFrame, _alunos_df: pd.DataFrame) -> IndiceDispensas:
+    return IndiceDispensas(_acoes_df, _alunos_df)
+
+def get_indice_dispensas() -> IndiceDispensas:
+    """Retorna o índice de dispensas das versões atuais de 'Acoes' e 'Alunos', compartilhado entre as sessões."""
+    acoes = load_snapshot("Acoes")
+    alunos = load_snapshot("Alunos")
+    return _construir_indice_dispensas(acoes.versao, alunos.versao, acoes.df, alunos.df)
+
+# ==============================================================================
+# LISTA IMPRESSA (UMA PÁGINA)
+# ==============================================================================
+# Larguras relativas; são escaladas para a largura útil da página
+COLUNAS_PDF_DISPENSAS = [("Nº", 22), ("Nome de Guerra", 52), ("Pelotão", 28), ("Tipo", 38), ("Período", 50)]
+ALTURA_UTIL_PDF = 297 - 2 * 12 - 32  # A4 menos margens, título e rodapé
+
+def formatar_periodo(inicio, fim) -> str:
+    inicio_str = inicio.strftime('%d/%m/%Y') if pd.notna(inicio) else "?"
+    fim_str = fim.strftime('%d/%m/%Y') if pd.notna(fim) else "sem data de fim"
+    return f"{inicio_str} a {fim_str}"
+
+@st.cache_data(max_entries=32)
+def gerar_pdf_dispensas(dispensas: pd.DataFrame, titulo: str) -> bytes:
+    """
+    Lista de dispensados em uma única página A4: a altura das linhas (e a fonte) diminui
+    conforme a quantidade de alunos para caber tudo na folha.
+    """
+    pdf = FPDF()
+    fonte = registrar_fonte_dejavu(pdf)
+    pdf.set_auto_page_break(False)
+    pdf.set_margins(15, 12)
+    pdf.add_page()
+
+    pdf.set_font(fonte, 'B', 13)
+    pdf.cell(0, 8, 'Relação de Dispensados Médicos', 0, 1, 'C')
+    pdf.set_font(fonte, '', 10)
+    pdf.cell(0, 6, titulo, 0, 1, 'C')
+    pdf.ln(2)
+
+    largura_util = pdf.w - pdf.l_margin - pdf.r_margin
+    soma_larguras = sum(largura for _, largura in COLUNAS_PDF_DISPENSAS)
+    colunas = [(rotulo, largura * largura_util / soma_larguras) for rotulo, largura in COLUNAS_PDF_DISPENSAS]
+
+    altura = max(2.5, min(7.0, ALTURA_UTIL_PDF / (len(dispensas) + 1)))
+    tamanho_fonte = max(5, min(10, altura * 1.5))
+    pdf.set_font(fonte, 'B', tamanho_fonte)
+    for rotulo, largura in colunas:
+        pdf.cell(largura, altura, rotulo, 1, 0, 'C')
+    pdf.ln()
+
+    pdf.set_font(fonte, '', tamanho_fonte)
+    cabem = int(ALTURA_UTIL_PDF // altura) - 1
+    for registro in dispensas.head(cabem).to_dict('records'):
+        valores = [
+            str(registro.get('numero_interno') or ''), str(registro.get('nome_guerra') or ''),
+            str(registro.get('pelotao') or ''), str(registro.get('tipo_dispensa') or registro.get('tipo') or ''),
+            formatar_periodo(registro.get('inicio'), registro.get('fim')),
+        ]
+        for valor, (_, largura) in zip(valores, colunas):
+            pdf.cell(largura, altura, valor, 1, 0, 'L')
+        pdf.ln()
+    if len(dispensas) > cabem:
+        pdf.set_font(fonte, 'B', 8)
+        pdf.cell(0, 5, f"... e mais {len(dispensas) - cabem} aluno(s) não listado(s) por falta de espaço.", 0, 1, 'L')
+
+    pdf.set_xy(15, 297 - 12 - 5)
+    pdf.set_font(fonte, '', 7)
+    # Sem horário de geração: o PDF fica em cache e o horário ficaria desatualizado
+    pdf.cell(0, 5, f"Total: {len(dispensas)}", 0, 0, 'R')
+    return pdf_para_bytes(pdf)
+
+# ==============================================================================
+# COMPONENTE (SAÚDE, PERNOITE E PROGRAMAÇÃO)
+# ==============================================================================
+def render_dispensas(chave: str, data=None, pelotao=None):
+    """
+    Mostra os alunos dispensados e o botão da lista impressa.
+    Sem `data`, o usuário escolhe uma data ou um período; sem `pelotao`, escolhe o pelotão.
+    `chave` evita colisão de widgets quando o componente aparece em mais de uma página.
+    """
+    indice = get_indice_dispensas()
+
+    colunas = st.columns(2)
+    if pelotao is None:
+        pelotao = colunas[0].selectbox(
+            "Pelotão", ["Todos"] + list(get_indice_alunos().pelotoes), key=f"dispensas_pelotao_{chave}"
+        )
+    if data is None:
+        periodo = colunas[1].date_input(
+            "Data ou período", value=(datetime.now().date(),), format="DD/MM/YYYY", key=f"dispensas_data_{chave}"
+        )
+        if not periodo:
+            return
+        inicio, fim = periodo[0], periodo[-1]
+    else:
+        inicio = fim = data
+
+    dispensados = indice.no_periodo(inicio, fim, pelotao)
+    titulo = inicio.strftime('%d/%m/%Y') if inicio == fim else f"{inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
+    if pelotao not in (None, "Todos"):
+        titulo += f" | Pelotão {pelotao}"
+
+    sem_fim = indice.contar_sem_fim(fim, pelotao)
+    if sem_fim:
+        st.caption(f"⚠️ {sem_fim} dispensa(s) sem data de fim não entram na relação; corrija o período no módulo de Saúde.")
+
+    if dispensados.empty:
+        st.info(f"Nenhum aluno dispensado em {titulo}.")
+        return
+
+    st.caption(f"{len(dispensados)} aluno(s) dispensado(s) em {titulo}.")
+    st.dataframe(
+        pd.DataFrame({
+            'Nº': dispensados['numero_interno'],
+            'Nome de Guerra': dispensados['nome_guerra'],
+            'Pelotão': dispensados['pelotao'],
+            'Tipo': dispensados['tipo_dispensa'].where(dispensados['tipo_dispensa'] != '', dispensados['tipo']),
+            'Período': [formatar_periodo(i, f) for i, f in zip(dispensados['inicio'], dispensados['fim'])],
+        }),
+        hide_index=True, use_container_width=True
+    )
+    st.download_button(
+        "🖨️ Imprimir lista (PDF)",
+        data=gerar_pdf_dispensas(dispensados, titulo),
+        file_name=f"dispensados_{inicio.strftime('%Y%m%d')}.pdf",
+        mime="application/pdf",
+        key=f"dispensas_pdf_{chave}"
+    )
@@ -4,6 +4,7 @@ from io import BytesIO
 from database import load_data
 from auth import check_permission
 from alunos import calcular_pontuacao_efetiva, calcular_conceito_final
+from cache_alunos import ordenar_por_numero_interno
 
 @st.cache_data(ttl=300)
 def processar_dados_para_exportacao():
@@ -46,22 +47,8 @@ def processar_dados_para_exportacao():
     alunos_df['media_academica_num'] = pd.to_numeric(alunos_df['media_academica'], errors='coerce').fillna(0.0)
     alunos_df['classificacao_final_prevista'] = ((alunos_df['media_academica_num'] * 3) + (alunos_df['conceito_final'] * 2)) / 5
     
-    # Lógica de ordenação por número interno (corrigida)
-    alunos_df['numero_interno_str'] = alunos_df['numero_interno'].astype(str)
-    split_cols = alunos_df['numero_interno_str'].str.split('-', expand=True)
-    alunos_df['sort_part_1'] = split_cols[0]
-    if len(split_cols.columns) > 1:
-        alunos_df['sort_part_2'] = pd.to_numeric(split_cols[1], errors='coerce').fillna(0)
-    else:
-        alunos_df['sort_part_2'] = 0
-    if len(split_cols.columns) > 2:
-        alunos_df['sort_part_3'] = pd.to_numeric(split_cols[2], errors='coerce').fillna(0)
-    else:
-        alunos_df['sort_part_3'] = 0
-
-    alunos_df = alunos_df.sort_values(by=['sort_part_1', 'sort_part_2', 'sort_part_3'])
-
-    return alunos_df
+    # Ordenação natural pelo número interno (chave pré-calculada no cache de alunos)
+    return ordenar_por_numero_interno(alunos_df)
 
 def to_excel(df: pd.DataFrame) -> bytes:
     """
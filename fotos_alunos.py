@@ -0,0 +1,252 @@
+# fotos_alunos.py
+
+import streamlit as st
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageOps
+from utils import get_student_photo_url
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+# Larguras servidas: 80 (listas de ações), 100 (lista de alunos) e 400 (conselho)
+LARGURAS_MINIATURA = (80, 100, 400)
+DIRETORIO_CACHE = os.environ.get("FOTOS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fotos_alunos"))
+MAX_BYTES_CACHE = 200 * 1024 * 1024
+REVALIDAR_APOS_SEGUNDOS = 6 * 3600   # depois disso, confere o ETag na origem
+REPETIR_FALHA_APOS_SEGUNDOS = 1800   # URLs que falharam não são tentadas de novo antes disso
+# Foto inexistente na origem (404): gravado no disco e não tentado de novo antes disso.
+# Fotos importadas (importar_fotos.py) ganham 'url_foto' própria, então não ficam presas aqui.
+REPETIR_AUSENTE_APOS_SEGUNDOS = 7 * 24 * 3600
+CODIGOS_FOTO_AUSENTE = (400, 404)    # o Storage do Supabase responde 400 para objeto inexistente
+TIMEOUT_DOWNLOAD = 10
+ESPERA_LISTA_SEGUNDOS = 0.2          # listas não esperam o download: mostram o placeholder e a foto aparece depois
+
+# ==============================================================================
+# URL E PLACEHOLDER
+# ==============================================================================
+def resolver_url_foto(url_foto, numero_interno=None):
+    """
+    Retorna a URL da foto do aluno: `url_foto` se for http/https; senão, a URL padrão do bucket
+    a partir do número interno (ver utils.get_student_photo_url); senão, None.
+    """
+    if isinstance(url_foto, str) and url_foto.startswith(('http://', 'https://')):
+        return url_foto
+    if numero_interno is None or (isinstance(numero_interno, float) and numero_interno != numero_interno):
+        return None
+    numero = str(numero_interno).strip()
+    return get_student_photo_url(numero) if numero else None
+
+@lru_cache(maxsize=len(LARGURAS_MINIATURA))
+def placeholder(largura: int = 100) -> bytes:
+    """Imagem 'Sem Foto' gerada localmente (sem depender de serviço externo)."""
+    imagem = Image.new('RGB', (largura, largura), (224, 224, 224))
+    desenho = ImageDraw.Draw(imagem)
+    texto = "Sem Foto"
+    caixa = desenho.textbbox((0, 0), texto)
+    posicao = ((largura - (caixa[2] - caixa[0])) / 2, (largura - (caixa[3] - caixa[1])) / 2)
+    desenho.text(posicao, texto, fill=(120, 120, 120))
+    saida = BytesIO()
+    imagem.save(saida, format='PNG')
+    return saida.getvalue()
+
+# ==============================================================================
+# CACHE EM DISCO (LRU POR TAMANHO TOTAL)
+# ==============================================================================
+def _hash(texto: str) -> str:
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+def _caminho_meta(url: str) -> str:
+    return os.path.join(DIRETORIO_CACHE, f"{_hash(url)}.json")
+
+def _caminho_miniatura(url: str, etag: str, largura: int) -> str:
+    # A chave inclui o ETag: uma foto trocada na origem gera arquivos novos e os antigos saem pelo LRU
+    return os.path.join(DIRETORIO_CACHE, f"{_hash(url + '|' + (etag or ''))}_{largura}.jpg")
+
+def _ler_meta(url: str) -> dict:
+    try:
+        with open(_caminho_meta(url), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_arquivo(caminho: str, conteudo: bytes):
+    # Grava num temporário e renomeia, para outra sessão nunca ler um arquivo pela metade
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+def _ler_arquivo(caminho: str):
+    try:
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        os.utime(caminho)  # marca o uso para o LRU
+        return conteudo
+    except OSError:
+        return None
+
+def _aplicar_limite_disco():
+    """Remove os arquivos usados há mais tempo até o cache caber em MAX_BYTES_CACHE."""
+    try:
+        arquivos = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(DIRETORIO_CACHE) if e.is_file()]
+    except OSError:
+        return
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= MAX_BYTES_CACHE:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+# ==============================================================================
+# DOWNLOAD E REDIMENSIONAMENTO
+# ==============================================================================
+def gerar_miniaturas(conteudo: bytes) -> dict:
+    """Gera as variantes JPEG de LARGURAS_MINIATURA a partir da imagem original."""
+    original = ImageOps.exif_transpose(Image.open(BytesIO(conteudo))).convert('RGB')
+    variantes = {}
+    for largura in LARGURAS_MINIATURA:
+        imagem = original.copy()
+        imagem.thumbnail((largura, largura * 2), Image.LANCZOS)
+        saida = BytesIO()
+        imagem.save(saida, format='JPEG', quality=85, optimize=True)
+        variantes[largura] = saida.getvalue()
+    return variantes
+
+def _baixar(url: str, etag: str = None):
+    """Retorna (conteúdo, etag); conteúdo None significa 304 (não modificado)."""
+    requisicao = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(requisicao, timeout=TIMEOUT_DOWNLOAD) as resposta:
+            return resposta.read(), resposta.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag
+        raise
+
+def _foto_ausente(meta: dict) -> bool:
+    return time.time() - meta.get('ausente_em', 0) < REPETIR_AUSENTE_APOS_SEGUNDOS
+
+def _miniatura_em_disco(url: str, largura: int):
+    """Retorna (conteúdo ou None, precisa_revalidar, foto_ausente) sem acessar a rede."""
+    meta = _ler_meta(url)
+    if _foto_ausente(meta):
+        return None, False, True
+    conteudo = _ler_arquivo(_caminho_miniatura(url, meta.get('etag'), largura)) if meta else None
+    return conteudo, time.time() - meta.get('verificado_em', 0) >= REVALIDAR_APOS_SEGUNDOS, False
+
+def _carregar_miniatura(url: str, largura: int) -> bytes:
+    """Serve a miniatura do disco; baixa e redimensiona só na primeira vez ou quando a origem mudou."""
+    meta = _ler_meta(url)
+    if _foto_ausente(meta):
+        return None
+    etag = meta.get('etag')
+    caminho = _caminho_miniatura(url, etag, largura)
+    em_disco = os.path.exists(caminho)
+    if em_disco and time.time() - meta.get('verificado_em', 0) < REVALIDAR_APOS_SEGUNDOS:
+        conteudo = _ler_arquivo(caminho)
+        if conteudo is not None:
+            return conteudo
+
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    try:
+        conteudo, novo_etag = _baixar(url, etag if em_disco else None)
+    except urllib.error.HTTPError as e:
+        if e.code not in CODIGOS_FOTO_AUSENTE:
+            raise
+        # Cache negativo em disco: vale para todas as sessões e sobrevive a reinícios
+        _gravar_arquivo(_caminho_meta(url), json.dumps({'ausente_em': time.time()}).encode('utf-8'))
+        return None
+    if conteudo is not None:
+        for largura_variante, miniatura in gerar_miniaturas(conteudo).items():
+            _gravar_arquivo(_caminho_miniatura(url, novo_etag, largura_variante), miniatura)
+        _aplicar_limite_disco()
+    _gravar_arquivo(_caminho_meta(url), json.dumps({'etag': novo_etag, 'verificado_em': time.time()}).encode('utf-8'))
+    return _ler_arquivo(_caminho_miniatura(url, novo_etag, largura))
+
+# ==============================================================================
+# API: PRÉ-CARREGAMENTO EM PARALELO E LEITURA
+# ==============================================================================
+@st.cache_resource
+def _estado_downloads() -> dict:
+    """Executor e downloads em andamento compartilhados entre as sessões."""
+    return {
+        'executor': ThreadPoolExecutor(max_workers=4, thread_name_prefix="fotos-alunos"),
+        'em_andamento': {},
+        'falhas': {},
+        'lock': threading.Lock(),
+    }
+
+def prefetch_miniatura(url, largura: int = 100):
+    """Agenda a miniatura em segundo plano (sem bloquear a página). Retorna o Future ou None."""
+    if not url:
+        return None
+    estado = _estado_downloads()
+    chave = (url, largura)
+    with estado['lock']:
+        if time.time() - estado['falhas'].get(url, 0) < REPETIR_FALHA_APOS_SEGUNDOS:
+            return None
+        futuro = estado['em_andamento'].get(chave)
+        if futuro is None:
+            futuro = estado['executor'].submit(_carregar_miniatura, url, largura)
+            estado['em_andamento'][chave] = futuro
+            novo = True
+        else:
+            novo = False
+    if novo:
+        # Fora do lock: se o download já terminou, o callback roda nesta mesma thread
+        futuro.add_done_callback(lambda f: _finalizar_download(estado, chave, f))
+    return futuro
+
+def _finalizar_download(estado, chave, futuro):
+    with estado['lock']:
+        if estado['em_andamento'].get(chave) is futuro:
+            del estado['em_andamento'][chave]
+        if futuro.exception() is not None or futuro.result() is None:
+            estado['falhas'][chave[0]] = time.time()
+
+def obter_miniatura(url, largura: int = 100, espera: float = TIMEOUT_DOWNLOAD) -> bytes:
+    """
+    Retorna os bytes da miniatura (JPEG) ou o placeholder local se não houver foto ou o download falhar.
+    O que já está no disco é servido na hora (se vencido, é revalidado em segundo plano); um download
+    novo é esperado no máximo `espera` segundos, senão vem o placeholder e a foto aparece na próxima execução.
+    """
+    if not url:
+        return placeholder(largura)
+    conteudo, revalidar, ausente = _miniatura_em_disco(url, largura)
+    if ausente:
+        return placeholder(largura)
+    if conteudo is not None:
+        if revalidar:
+            prefetch_miniatura(url, largura)
+        return conteudo
+    futuro = prefetch_miniatura(url, largura)
+    if futuro is None:
+        return placeholder(largura)
+    try:
+        return futuro.result(timeout=espera) or placeholder(largura)
+    except Exception:
+        return placeholder(largura)
+
+def obter_miniaturas(urls, largura: int = 100, espera: float = ESPERA_LISTA_SEGUNDOS) -> list:
+    """
+    Agenda em paralelo as miniaturas que faltam e retorna os bytes na mesma ordem de `urls`.
+    A espera total pelos downloads é limitada a `espera` segundos; as pendentes saem como placeholder.
+    """
+    for url in urls:
+        prefetch_miniatura(url, largura)
+    limite = time.monotonic() + espera
+    return [obter_miniatura(url, largura, espera=max(0.0, limite - time.monotonic())) for url in urls]
@@ -3,6 +3,7 @@ import pandas as pd
 from io import BytesIO
 from pypdf import PdfReader, PdfWriter
 from database import load_data, init_supabase_client
+from cache_alunos import filtrar_por_busca
 from auth import check_permission
 import json
 import fitz  # PyMuPDF
@@ -155,10 +156,7 @@ def show_geracao_documentos():
             if pelotoes_selecionados:
                 alunos_filtrados_df = alunos_filtrados_df[alunos_filtrados_df['pelotao'].isin(pelotoes_selecionados)]
             if termo_busca:
-                alunos_filtrados_df = alunos_filtrados_df[
-                    alunos_filtrados_df['nome_guerra'].str.contains(termo_busca, case=False, na=False) |
-                    alunos_filtrados_df['numero_interno'].astype(str).str.contains(termo_busca, case=False, na=False)
-                ]
+                alunos_filtrados_df = filtrar_por_busca(alunos_filtrados_df, termo_busca, campos=('nome_guerra', 'numero_interno'))
 
             st.subheader("Seleção de Alunos")
             if 'selecionar' not in alunos_filtrados_df.columns:
@@ -8,6 +8,7 @@ from io import BytesIO
 import zipfile
 # Importar o componente de seleção de alunos
 from aluno_selection_components import render_alunos_filter_and_selection
+from fotos_alunos import resolver_url_foto, obter_miniaturas
 
 # ==============================================================================
 # DIÁLOGOS E POPUPS (Função de edição em massa adicionada)
@@ -458,15 +459,21 @@ def show_gestao_acoes():
         st.write("") 
 
         df_filtrado_final.drop_duplicates(subset=['id_x'], keep='first', inplace=True)
+        # Agenda as miniaturas (80 px) de todos os alunos da lista de uma vez; cada foto é baixada uma única vez
+        urls_fotos = {
+            id_acao: resolver_url_foto(url, numero)
+            for id_acao, url, numero in zip(df_filtrado_final['id_x'], df_filtrado_final['url_foto'], df_filtrado_final['numero_interno'])
+        }
+        # Espera curta e limitada: as fotos ainda não baixadas aparecem como placeholder nesta execução
+        urls_unicas = list(set(urls_fotos.values()))
+        miniaturas = dict(zip(urls_unicas, obter_miniaturas(urls_unicas, largura=80)))
         for _, acao in df_filtrado_final.iterrows():
             acao_id = acao['id_x']
             with st.container(border=True):
                 col_foto, col_info, col_actions = st.columns([1, 4, 2])
                 
                 with col_foto:
-                    foto_url = acao.get('url_foto')
-                    image_source = foto_url if isinstance(foto_url, str) and foto_url.startswith('http') else "https://via.placeholder.com/100?text=S/Foto"
-                    st.image(image_source, width=80)
+                    st.image(miniaturas[urls_fotos[acao_id]], width=80)
 
                 with col_info:
                     st.session_state.action_selection[acao_id] = st.checkbox("Selecionar esta ação", value=st.session_state.action_selection.get(acao_id, False), key=f"select_{acao_id}", label_visibility="visible")
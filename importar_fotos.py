@@ -0,0 +1,217 @@
+# importar_fotos.py
+#
+# Importa em lote as fotos dos alunos para o bucket 'fotos-alunos' do Supabase.
+# Os arquivos (pasta ou ZIP) são associados aos alunos pelo nome: NIP ou número interno
+# (ex.: 'M-1-101.jpg', '12345678.png', 'M-1-101 FULANO.jpeg'). Cada foto é girada conforme
+# o EXIF, reduzida e gravada como JPEG compacto; ao final, 'url_foto' do aluno é atualizada
+# e um relatório de cobertura é exibido.
+#
+# Uso: python importar_fotos.py fotos.zip [--simular] [--pular-existentes] [--concorrencia 4]
+
+import argparse
+import csv
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+import pandas as pd
+from PIL import Image, ImageOps, UnidentifiedImageError
+from database import buscar_todas_paginas
+from cache_alunos import IndiceAlunos, normalizar_chave
+from cliente_supabase import criar_cliente_supabase
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+BUCKET_FOTOS = "fotos-alunos"
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+LADO_MAXIMO_PADRAO = 800        # suficiente para a variante de 400 px em telas de alta densidade
+TAMANHO_ALVO_KB_PADRAO = 120
+QUALIDADES_JPEG = (85, 78, 70, 62, 55, 48)
+
+# ==============================================================================
+# LEITURA E ASSOCIAÇÃO DOS ARQUIVOS
+# ==============================================================================
+def ler_fotos(origem: str):
+    """Gera (nome do arquivo, bytes) para cada imagem de uma pasta (recursiva) ou de um arquivo ZIP."""
+    if zipfile.is_zipfile(origem):
+        with zipfile.ZipFile(origem) as arquivo_zip:
+            for info in arquivo_zip.infolist():
+                nome = os.path.basename(info.filename)
+                if not info.is_dir() and nome.lower().endswith(EXTENSOES_IMAGEM) and not nome.startswith('.'):
+                    yield nome, arquivo_zip.read(info)
+        return
+    for raiz, _, arquivos in os.walk(origem):
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(EXTENSOES_IMAGEM) and not nome.startswith('.'):
+                with open(os.path.join(raiz, nome), 'rb') as arquivo:
+                    yield nome, arquivo.read()
+
+def identificar_aluno(nome_arquivo: str, indice: IndiceAlunos):
+    """Retorna o id do aluno pelo nome do arquivo (NIP ou número interno, inteiro ou como primeira palavra)."""
+    base = os.path.splitext(nome_arquivo)[0].strip()
+    for candidato in (base, re.split(r'[\s_]+', base)[0]):
+        aluno_id = indice.buscar_id(candidato)
+        if aluno_id:
+            return aluno_id
+    return None
+
+# ==============================================================================
+# NORMALIZAÇÃO DA IMAGEM
+# ==============================================================================
+def preparar_foto(conteudo: bytes, lado_maximo: int = LADO_MAXIMO_PADRAO, tamanho_alvo_kb: int = TAMANHO_ALVO_KB_PADRAO) -> bytes:
+    """Corrige a orientação (EXIF), limita o maior lado e codifica em JPEG na maior qualidade que caiba no tamanho alvo."""
+    imagem = ImageOps.exif_transpose(Image.open(BytesIO(conteudo))).convert('RGB')
+    imagem.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+    codificada = b''
+    for qualidade in QUALIDADES_JPEG:
+        saida = BytesIO()
+        imagem.save(saida, format='JPEG', quality=qualidade, optimize=True, progressive=True)
+        codificada = saida.getvalue()
+        if len(codificada) <= tamanho_alvo_kb * 1024:
+            break
+    return codificada
+
+# ==============================================================================
+# ENVIO
+# ==============================================================================
+def tem_url_foto(valor) -> bool:
+    return isinstance(valor, str) and valor.startswith(('http://', 'https://'))
+
+def caminho_no_bucket(aluno: dict) -> str:
+    numero = normalizar_chave(aluno.get('numero_interno')) or normalizar_chave(aluno.get('nip')) or str(aluno['id'])
+    return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', numero)}.jpg"
+
+def enviar_foto(supabase, aluno: dict, foto: bytes) -> str:
+    """Envia a foto (substituindo a anterior), grava 'url_foto' do aluno e retorna a URL pública."""
+    caminho = caminho_no_bucket(aluno)
+    armazenamento = supabase.storage.from_(BUCKET_FOTOS)
+    armazenamento.upload(path=caminho, file=foto, file_options={"content-type": "image/jpeg", "upsert": "true"})
+    url = armazenamento.get_public_url(caminho).rstrip('?')
+    supabase.table("Alunos").update({'url_foto': url}).eq('id', aluno['id']).execute()
+    return url
+
+# ==============================================================================
+# IMPORTAÇÃO E RELATÓRIO
+# ==============================================================================
+def importar_fotos(supabase, origem: str, simular: bool = False, pular_existentes: bool = False,
+                   concorrencia: int = 4, lado_maximo: int = LADO_MAXIMO_PADRAO,
+                   tamanho_alvo_kb: int = TAMANHO_ALVO_KB_PADRAO) -> dict:
+    """
+    Associa, normaliza e envia as fotos de `origem`. Com `simular`, só associa e valida (nada é enviado).
+    Retorna o resumo usado no relatório de cobertura.
+    """
+    alunos_df = pd.DataFrame(buscar_todas_paginas(
+        lambda: supabase.table("Alunos").select("id, numero_interno, nip, nome_guerra, pelotao, url_foto")
+    ))
+    indice = IndiceAlunos(alunos_df)
+
+    resumo = {'arquivos': 0, 'sem_aluno': [], 'duplicados': [], 'invalidos': [], 'ignorados': [],
+              'enviados': [], 'falhas': [], 'alunos': indice.df}
+    fotos_por_aluno = {}
+    for nome, conteudo in ler_fotos(origem):
+        resumo['arquivos'] += 1
+        aluno_id = identificar_aluno(nome, indice)
+        if not aluno_id:
+            resumo['sem_aluno'].append(nome)
+        elif aluno_id in fotos_por_aluno:
+            resumo['duplicados'].append((nome, fotos_por_aluno[aluno_id][0]))
+        elif pular_existentes and tem_url_foto(indice.por_id[aluno_id].get('url_foto')):
+            resumo['ignorados'].append(nome)
+        else:
+            fotos_por_aluno[aluno_id] = (nome, conteudo)
+
+    preparadas = {}
+    for aluno_id, (nome, conteudo) in fotos_por_aluno.items():
+        try:
+            preparadas[aluno_id] = (nome, preparar_foto(conteudo, lado_maximo, tamanho_alvo_kb))
+        except (UnidentifiedImageError, OSError, ValueError) as e:
+            resumo['invalidos'].append((nome, str(e)))
+
+    if simular:
+        resumo['enviados'] = [(aluno_id, nome, None) for aluno_id, (nome, _) in preparadas.items()]
+        return resumo
+
+    # Envio concorrente, limitado a `concorrencia` uploads simultâneos
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia), thread_name_prefix="importar-fotos") as executor:
+        futuros = {
+            executor.submit(enviar_foto, supabase, indice.por_id[aluno_id], foto): (aluno_id, nome)
+            for aluno_id, (nome, foto) in preparadas.items()
+        }
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            aluno_id, nome = futuros[futuro]
+            try:
+                resumo['enviados'].append((aluno_id, nome, futuro.result()))
+            except Exception as e:
+                resumo['falhas'].append((nome, str(e)))
+                logging.error(f"Falha ao enviar '{nome}': {e}")
+            if i % 25 == 0 or i == len(futuros):
+                logging.info(f"{i}/{len(futuros)} fotos processadas.")
+    return resumo
+
+def alunos_sem_foto(resumo: dict) -> pd.DataFrame:
+    """Alunos ativos (fora da 'BAIXA') que continuam sem 'url_foto' depois da importação."""
+    alunos = resumo['alunos']
+    if alunos.empty:
+        return alunos
+    enviados = {aluno_id for aluno_id, _, _ in resumo['enviados']}
+    tem_foto = alunos['url_foto'].map(tem_url_foto) if 'url_foto' in alunos.columns else pd.Series(False, index=alunos.index)
+    ativos = alunos['pelotao'].fillna('').astype(str).str.strip().str.upper() != 'BAIXA'
+    return alunos[ativos & ~tem_foto & ~alunos['id'].isin(enviados)]
+
+def imprimir_relatorio(resumo: dict, simular: bool, arquivo_csv: str = None):
+    alunos = resumo['alunos']
+    sem_foto = alunos_sem_foto(resumo)
+    total_ativos = int((alunos['pelotao'].fillna('').astype(str).str.strip().str.upper() != 'BAIXA').sum()) if not alunos.empty else 0
+    com_foto = total_ativos - len(sem_foto)
+
+    print("\n=== Relatório de importação de fotos" + (" (simulação)" if simular else "") + " ===")
+    print(f"Arquivos lidos:              {resumo['arquivos']}")
+    print(f"{'A enviar' if simular else 'Enviados'}:                    {len(resumo['enviados'])}")
+    print(f"Sem aluno correspondente:    {len(resumo['sem_aluno'])}")
+    print(f"Duplicados (mesmo aluno):    {len(resumo['duplicados'])}")
+    print(f"Imagens inválidas:           {len(resumo['invalidos'])}")
+    print(f"Ignorados (já tinham foto):  {len(resumo['ignorados'])}")
+    print(f"Falhas no envio:             {len(resumo['falhas'])}")
+    if total_ativos:
+        print(f"Cobertura: {com_foto}/{total_ativos} alunos ativos com foto ({com_foto / total_ativos:.0%})")
+
+    for titulo, itens in (("Sem aluno correspondente", resumo['sem_aluno']),
+                          ("Duplicados (arquivo, já usado)", resumo['duplicados']),
+                          ("Inválidos", resumo['invalidos']),
+                          ("Falhas", resumo['falhas'])):
+        if itens:
+            print(f"\n{titulo}:")
+            for item in itens:
+                print(f"  - {item}")
+
+    if arquivo_csv and not sem_foto.empty:
+        colunas = [c for c in ('numero_interno', 'nip', 'nome_guerra', 'pelotao') if c in sem_foto.columns]
+        with open(arquivo_csv, 'w', newline='', encoding='utf-8') as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(colunas)
+            escritor.writerows(sem_foto[colunas].itertuples(index=False))
+        print(f"\nAlunos sem foto gravados em '{arquivo_csv}'.")
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Importa fotos de alunos (pasta ou ZIP) para o bucket 'fotos-alunos'.")
+    parser.add_argument("origem", help="Pasta ou arquivo .zip com as fotos, nomeadas pelo NIP ou número interno.")
+    parser.add_argument("--simular", action="store_true", help="Só associa e valida as fotos; nada é enviado.")
+    parser.add_argument("--pular-existentes", action="store_true", help="Não substitui a foto de quem já tem 'url_foto'.")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Uploads simultâneos (padrão: 4).")
+    parser.add_argument("--lado-maximo", type=int, default=LADO_MAXIMO_PADRAO, help="Maior lado da imagem, em pixels.")
+    parser.add_argument("--tamanho-alvo-kb", type=int, default=TAMANHO_ALVO_KB_PADRAO, help="Tamanho alvo de cada JPEG.")
+    parser.add_argument("--relatorio-csv", help="Grava a lista de alunos ativos sem foto neste arquivo CSV.")
+    return parser
+
+if __name__ == "__main__":
+    args = criar_parser().parse_args()
+    supabase = criar_cliente_supabase()
+    if not supabase:
+        raise SystemExit("Não foi possível conectar ao Supabase.")
+    resumo = importar_fotos(
+        supabase, args.origem, simular=args.simular, pular_existentes=args.pular_existentes,
+        concorrencia=args.concorrencia, lado_maximo=args.lado_maximo, tamanho_alvo_kb=args.tamanho_alvo_kb,
+    )
+    imprimir_relatorio(resumo, args.simular, args.relatorio_csv)
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from database import load_data, init_supabase_client
+from cache_alunos import get_indice_alunos, filtrar_por_busca
 from auth import check_permission
 from acoes import calcular_pontuacao_efetiva
 from io import BytesIO
@@ -74,7 +75,7 @@ def render_filters(alunos_df):
     with col2:
         busca_nome = st.text_input("2. Buscar por Nome de Guerra", help="Pode ser usado em conjunto com o filtro de pelotão.")
         if busca_nome:
-            alunos_filtrados_df = alunos_filtrados_df[alunos_filtrados_df['nome_guerra'].str.contains(busca_nome, case=False, na=False)]
+            alunos_filtrados_df = filtrar_por_busca(alunos_filtrados_df, busca_nome, campos=('nome_guerra',))
 
         nomes_unicos = alunos_filtrados_df['nome_guerra'].unique()
         nomes_validos = [str(nome) for nome in nomes_unicos if pd.notna(nome)]
@@ -199,8 +200,8 @@ def show_lancamentos_faia():
     
     # Filter by Search Name
     if busca_nome:
-        alunos_ids_por_busca = alunos_df[alunos_df['nome_guerra'].str.contains(busca_nome, case=False, na=False)]['id'].tolist()
-        df_filtrado_para_display = df_filtrado_para_display[df_filtrado_para_display['aluno_id'].isin(alunos_ids_por_busca)]
+        alunos_ids_por_busca = get_indice_alunos().buscar(busca_nome, campos=('nome_guerra',))
+        df_filtrado_para_display = df_filtrado_para_display[df_filtrado_para_display['aluno_id'].astype(str).isin(alunos_ids_por_busca)]
 
     # Filter by Specific Student (if selected)
     if aluno_selecionado != "Todos":
@@ -0,0 +1,187 @@
+# leitor_crachas.py
+
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+from pyzbar.pyzbar import decode
+
+# Largura máxima (em pixels) usada na decodificação. Fotos de celular chegam com
+# 3000-4000 px de largura; o código de barras do crachá continua legível bem abaixo disso.
+LARGURA_MAXIMA_DECODIFICACAO = 1280
+
+# Sem frames por esse tempo, a thread de decodificação encerra sozinha (sessão abandonada).
+# Ela volta a ser iniciada quando chega um novo frame ou a página é recarregada no modo vídeo.
+OCIOSIDADE_MAXIMA_SEGUNDOS = 60
+
+# ==============================================================================
+# DECODIFICAÇÃO DE UM ÚNICO FRAME / IMAGEM
+# ==============================================================================
+def preparar_frame(imagem: np.ndarray, largura_maxima: int = LARGURA_MAXIMA_DECODIFICACAO, formato: str = "RGB") -> np.ndarray:
+    """Converte o frame para tons de cinza e reduz a resolução antes da decodificação."""
+    if imagem.ndim == 3:
+        if imagem.shape[2] == 4:
+            codigo_cor = cv2.COLOR_RGBA2GRAY if formato == "RGB" else cv2.COLOR_BGRA2GRAY
+        else:
+            codigo_cor = cv2.COLOR_RGB2GRAY if formato == "RGB" else cv2.COLOR_BGR2GRAY
+        imagem = cv2.cvtColor(imagem, codigo_cor)
+
+    altura, largura = imagem.shape[:2]
+    if largura > largura_maxima:
+        escala = largura_maxima / float(largura)
+        imagem = cv2.resize(imagem, (largura_maxima, int(altura * escala)), interpolation=cv2.INTER_AREA)
+    return imagem
+
+def extrair_nips(codigos_barras) -> list:
+    """Filtra os códigos lidos, mantendo apenas NIPs válidos (8 dígitos) e sem repetição."""
+    nips = []
+    for codigo in codigos_barras:
+        nip = codigo.data.decode('utf-8', errors='ignore').strip()
+        if len(nip) == 8 and nip.isdigit() and nip not in nips:
+            nips.append(nip)
+    return nips
+
+def decodificar_frame(imagem: np.ndarray, formato: str = "RGB") -> tuple:
+    """
+    Decodifica os códigos de barras de um frame.
+    Retorna (nips, quantidade_de_codigos_encontrados).
+    """
+    cinza = preparar_frame(imagem, formato=formato)
+    codigos = decode(cinza)
+    # Se a redução de resolução tornou o código ilegível, tenta novamente na resolução original.
+    if not codigos and cinza.shape[1] < imagem.shape[1]:
+        codigos = decode(preparar_frame(imagem, largura_maxima=imagem.shape[1], formato=formato))
+    return extrair_nips(codigos), len(codigos)
+
+def decodificar_codigo_de_barras(upload_de_imagem):
+    """Lê um arquivo de imagem e retorna uma lista de NIPs encontrados."""
+    try:
+        imagem = np.array(Image.open(upload_de_imagem).convert("RGB"))
+        nips_encontrados, total_codigos = decodificar_frame(imagem)
+        if total_codigos == 0:
+            return [], "Nenhum código de barras encontrado na imagem."
+        if not nips_encontrados:
+            return [], "Código(s) de barras encontrado(s), mas nenhum é um NIP válido (8 dígitos)."
+        return nips_encontrados, f"{len(nips_encontrados)} NIP(s) encontrado(s) com sucesso!"
+    except Exception as e:
+        return [], f"Erro ao processar a imagem: {e}"
+
+# ==============================================================================
+# DECODIFICAÇÃO EM LOTE (VÁRIAS IMAGENS ENVIADAS)
+# ==============================================================================
+def decodificar_lote_imagens(uploads, max_workers: int = 4) -> dict:
+    """
+    Decodifica várias imagens em paralelo.
+    Retorna um dicionário com os NIPs únicos (na ordem de leitura), os nomes dos
+    arquivos sem NIP válido e os erros encontrados.
+    """
+    resultado = {'nips': [], 'sem_nip': [], 'erros': []}
+    if not uploads:
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        respostas = list(executor.map(decodificar_codigo_de_barras, uploads))
+
+    vistos = set()
+    for upload, (nips, msg) in zip(uploads, respostas):
+        nome_arquivo = getattr(upload, 'name', str(upload))
+        if msg.startswith("Erro"):
+            resultado['erros'].append(f"{nome_arquivo}: {msg}")
+        elif not nips:
+            resultado['sem_nip'].append(nome_arquivo)
+        for nip in nips:
+            if nip not in vistos:
+                vistos.add(nip)
+                resultado['nips'].append(nip)
+    return resultado
+
+# ==============================================================================
+# LEITURA CONTÍNUA (VÍDEO AO VIVO VIA STREAMLIT-WEBRTC)
+# ==============================================================================
+class LeitorCrachasLote:
+    """
+    Decodifica frames de vídeo numa thread de trabalho, acumulando NIPs sem repetição.
+
+    Os frames recebidos da câmera são colocados numa fila de tamanho 1: enquanto a
+    thread decodifica um frame, os frames novos substituem o pendente. Assim a taxa
+    de decodificação se ajusta sozinha à capacidade do servidor, sem acumular atraso.
+    Após OCIOSIDADE_MAXIMA_SEGUNDOS sem frames a thread encerra.
+    """
+
+    def __init__(self):
+        self._fila = queue.Queue(maxsize=1)
+        self._lock = threading.Lock()
+        self._nips = []
+        self._nips_vistos = set()
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock_thread = threading.Lock()
+        self.frames_decodificados = 0
+
+    def iniciar(self):
+        self._parar.clear()
+        self._garantir_thread()
+
+    def _garantir_thread(self):
+        with self._lock_thread:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="leitor-crachas", daemon=True)
+                self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def enviar_frame(self, frame_bgr: np.ndarray):
+        """Entrega um frame para decodificação sem bloquear a thread de vídeo."""
+        try:
+            self._fila.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._fila.put_nowait(frame_bgr)
+        except queue.Full:
+            pass
+        # A thread pode ter encerrado por ociosidade enquanto a câmera estava parada
+        if not self._parar.is_set():
+            self._garantir_thread()
+
+    def nips_lidos(self) -> list:
+        with self._lock:
+            return list(self._nips)
+
+    def limpar(self):
+        with self._lock:
+            self._nips = []
+            self._nips_vistos = set()
+            self.frames_decodificados = 0
+
+    def _executar(self):
+        ultimo_frame = time.monotonic()
+        while not self._parar.is_set():
+            try:
+                frame = self._fila.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() - ultimo_frame > OCIOSIDADE_MAXIMA_SEGUNDOS:
+                    return
+                continue
+            ultimo_frame = time.monotonic()
+            try:
+                nips, _ = decodificar_frame(frame, formato="BGR")
+            except Exception:
+                continue
+            with self._lock:
+                self.frames_decodificados += 1
+                for nip in nips:
+                    if nip not in self._nips_vistos:
+                        self._nips_vistos.add(nip)
+                        self._nips.append(nip)
+
+def criar_callback_video(leitor: LeitorCrachasLote):
+    """Cria o callback de frames para o `webrtc_streamer`, encaminhando cada frame ao leitor."""
+    def video_frame_callback(frame):
+        leitor.enviar_frame(frame.to_ndarray(format="bgr24"))
+        return frame
+    return video_frame_callback
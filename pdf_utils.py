@@ -1,3 +1,4 @@
+import os
 from io import BytesIO
 import pdfrw
 from PyPDF2 import PdfMerger
@@ -65,3 +66,36 @@ def merge_pdfs(pdf_list):
     
     output_buffer.seek(0)
     return output_buffer
+
+# Fontes Unicode distribuídas com o projeto (acentos, "º", travessões etc. sem conversão para latin-1)
+DIRETORIO_FONTES = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_FONTE_DEJAVU = os.path.join(DIRETORIO_FONTES, "DejaVuSans.ttf")
+FONTES_DEJAVU = {
+    '': CAMINHO_FONTE_DEJAVU,
+    'B': os.path.join(DIRETORIO_FONTES, "DejaVuSans-Bold.ttf"),
+    'I': os.path.join(DIRETORIO_FONTES, "DejaVuSans-Oblique.ttf"),
+}
+
+def registrar_fonte_dejavu(pdf, familia="DejaVu"):
+    """
+    Registra a DejaVuSans no objeto FPDF (normal, negrito e itálico) e retorna o nome da família.
+    Gera FileNotFoundError se algum arquivo da fonte não existir: as fontes embutidas do FPDF
+    só aceitam latin-1 e quebrariam com nomes acentuados.
+    """
+    faltando = [caminho for caminho in FONTES_DEJAVU.values() if not os.path.exists(caminho)]
+    if faltando:
+        raise FileNotFoundError(f"Fonte(s) do relatório não encontrada(s): {', '.join(faltando)}")
+    for estilo, caminho in FONTES_DEJAVU.items():
+        try:
+            pdf.add_font(familia, estilo, caminho, uni=True)
+        except TypeError:
+            # fpdf2 não aceita mais o parâmetro `uni`
+            pdf.add_font(familia, estilo, caminho)
+    return familia
+
+def pdf_para_bytes(pdf):
+    """Retorna o conteúdo do FPDF como bytes (compatível com PyFPDF e fpdf2)."""
+    conteudo = pdf.output(dest='S')
+    if isinstance(conteudo, (bytes, bytearray)):
+        return bytes(conteudo)
+    return conteudo.encode('latin-1')
@@ -0,0 +1,157 @@
+# pernoite_mensal.py
+
+import streamlit as st
+import pandas as pd
+from datetime import date, datetime
+from io import BytesIO
+from database import carregar_intervalo, invalidar_tabelas
+from cache_alunos import get_indice_alunos, ordenar_por_numero_interno
+
+COLUNAS_ALUNO_RESUMO = ['numero_interno', 'tipo_aluno', 'nome_guerra', 'pelotao']
+
+# ==============================================================================
+# TIPO DO ALUNO (M = CAP, Q = QTPA)
+# ==============================================================================
+def identificar_tipo(numero) -> str:
+    """Tipo do aluno a partir do número interno: 'M', 'Q' ou 'Outro'."""
+    numero = str(numero).strip().upper()
+    if numero.startswith('M'):
+        return 'M'
+    elif numero.startswith('Q'):
+        return 'Q'
+    else:
+        return 'Outro'
+
+# ==============================================================================
+# GRAVAÇÃO (MARCAÇÕES DO DIA + CONSOLIDADO INCREMENTAL)
+# ==============================================================================
+def salvar_pernoite(supabase, data: date, alterados: dict) -> int:
+    """
+    Grava as marcações alteradas do dia ({aluno_id: presente}) pela função 'salvar_pernoite'
+    (sql/004), que na mesma transação soma/subtrai a diferença no consolidado mensal.
+    Retorna a quantidade de alunos cuja contagem do mês mudou.
+    """
+    resposta = supabase.rpc('salvar_pernoite', {
+        'p_data': data.strftime('%Y-%m-%d'),
+        'p_registros': [{'aluno_id': int(aluno_id), 'presente': bool(presente)} for aluno_id, presente in alterados.items()],
+    }).execute()
+    invalidar_tabelas("pernoite", "pernoite_mensal")
+    return resposta.data or 0
+
+def recalcular_pernoite_mensal(supabase, inicio: date, fim: date) -> int:
+    """Reconstrói o consolidado dos meses do período a partir da tabela diária 'pernoite'."""
+    resposta = supabase.rpc('recalcular_pernoite_mensal', {
+        'p_inicio': inicio.strftime('%Y-%m-%d'),
+        'p_fim': fim.strftime('%Y-%m-%d'),
+    }).execute()
+    invalidar_tabelas("pernoite_mensal")
+    return resposta.data or 0
+
+# ==============================================================================
+# CONSULTA
+# ==============================================================================
+def primeiro_dia_mes(data: date) -> date:
+    return data.replace(day=1)
+
+def rotulo_mes(mes) -> str:
+    return pd.Timestamp(mes).strftime('%m/%Y')
+
+def carregar_pernoite_mensal(inicio: date, fim: date) -> pd.DataFrame:
+    """
+    Linhas (aluno_id, mes, noites) do consolidado entre os meses de `inicio` e `fim`.
+    Lê algumas centenas de linhas, em vez de todos os registros diários do período.
+    """
+    mensal = carregar_intervalo(
+        "pernoite_mensal", "mes", primeiro_dia_mes(inicio).isoformat(), primeiro_dia_mes(fim).isoformat()
+    )
+    if mensal.empty:
+        return pd.DataFrame(columns=['aluno_id', 'mes', 'noites'])
+    return mensal.assign(
+        aluno_id=mensal['aluno_id'].astype(str),
+        mes=pd.to_datetime(mensal['mes']).dt.date,
+        noites=mensal['noites'].astype(int),
+    )[['aluno_id', 'mes', 'noites']]
+
+def noites_por_aluno(inicio: date, fim: date) -> pd.DataFrame:
+    """
+    Uma linha por aluno com noites no período: número interno, nome de guerra, pelotão, tipo,
+    uma coluna por mês ('MM/AAAA') e o total. Ordenado pelo número interno.
+    """
+    mensal = carregar_pernoite_mensal(inicio, fim)
+    mensal = mensal[mensal['noites'] != 0]
+    if mensal.empty:
+        return pd.DataFrame()
+
+    tabela = mensal.pivot_table(index='aluno_id', columns='mes', values='noites', aggfunc='sum', fill_value=0)
+    meses = sorted(tabela.columns)
+    tabela = tabela[meses].rename(columns=rotulo_mes)
+    tabela['Total'] = tabela.sum(axis=1)
+
+    alunos = get_indice_alunos().df
+    dados_alunos = pd.DataFrame(index=tabela.index, columns=['numero_interno', 'nome_guerra', 'pelotao'])
+    if 'id' in alunos.columns:
+        dados_alunos = alunos.assign(id=alunos['id'].astype(str)).set_index('id') \
+            .reindex(index=tabela.index, columns=['numero_interno', 'nome_guerra', 'pelotao'])
+    resultado = dados_alunos.assign(numero_interno=dados_alunos['numero_interno'].fillna('S/N').astype(str))
+    resultado['tipo_aluno'] = resultado['numero_interno'].map(identificar_tipo)
+    resultado = resultado[COLUNAS_ALUNO_RESUMO].join(tabela).rename_axis('aluno_id').reset_index()
+    return ordenar_por_numero_interno(resultado).reset_index(drop=True)
+
+def noites_por_tipo(por_aluno: pd.DataFrame) -> pd.DataFrame:
+    """Totais de noites por tipo de aluno (M/Q/Outro) e mês, a partir de `noites_por_aluno`."""
+    if por_aluno.empty:
+        return pd.DataFrame()
+    colunas_mes = [c for c in por_aluno.columns if c not in COLUNAS_ALUNO_RESUMO and c != 'aluno_id']
+    por_tipo = por_aluno.groupby('tipo_aluno')[colunas_mes].sum()
+    por_tipo.insert(0, 'Alunos', por_aluno.groupby('tipo_aluno').size())
+    return por_tipo.reset_index()
+
+def to_excel(por_aluno: pd.DataFrame, por_tipo: pd.DataFrame) -> bytes:
+    """Planilha com as abas 'Por Aluno' e 'Por Tipo'."""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        for nome_aba, df in (('Por Aluno', por_aluno.drop(columns='aluno_id', errors='ignore')), ('Por Tipo', por_tipo)):
+            df.to_excel(writer, index=False, sheet_name=nome_aba)
+            # Auto-ajuste da largura das colunas
+            for col_idx, column in enumerate(df.columns):
+                column_width = max(df[column].astype(str).map(len).max() if not df.empty else 0, len(str(column)))
+                writer.sheets[nome_aba].set_column(col_idx, col_idx, column_width)
+    return output.getvalue()
+
+# ==============================================================================
+# SEÇÃO DA PÁGINA DE PERNOITE
+# ==============================================================================
+def render_resumo_mensal(supabase):
+    """Resumo de noites por aluno e por tipo nos meses escolhidos, com exportação para Excel."""
+    hoje = datetime.now().date()
+    periodo = st.date_input(
+        "Meses do resumo", value=(primeiro_dia_mes(hoje), hoje), format="DD/MM/YYYY", key="pernoite_mensal_periodo",
+        help="São considerados os meses inteiros entre as duas datas."
+    )
+    if not periodo:
+        return
+    inicio, fim = periodo[0], periodo[-1]
+
+    por_aluno = noites_por_aluno(inicio, fim)
+    if por_aluno.empty:
+        st.info("Nenhum pernoite registrado nos meses selecionados.")
+    else:
+        por_tipo = noites_por_tipo(por_aluno)
+        st.markdown("##### Por Tipo")
+        st.dataframe(por_tipo, hide_index=True, use_container_width=True)
+        st.markdown("##### Por Aluno")
+        st.dataframe(por_aluno.drop(columns='aluno_id'), hide_index=True, use_container_width=True)
+        st.download_button(
+            "📥 Baixar Resumo (Excel)",
+            data=to_excel(por_aluno, por_tipo),
+            file_name=f"pernoite_mensal_{primeiro_dia_mes(inicio).strftime('%Y-%m')}_{primeiro_dia_mes(fim).strftime('%Y-%m')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+    if st.button("Recalcular resumo a partir dos registros diários", key="pernoite_mensal_recalcular"):
+        try:
+            linhas = recalcular_pernoite_mensal(supabase, inicio, fim)
+            st.toast(f"Resumo recalculado ({linhas} linha(s) gravada(s)).")
+            st.rerun()
+        except Exception as e:
+            st.error(f"Erro ao recalcular: {e}")
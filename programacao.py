@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import time # <-- Importado para o delay
-from database import load_data, init_supabase_client
+import numpy as np
+import logging
+from datetime import datetime, date, timedelta
+from database import load_data, init_supabase_client, gravar_em_lotes, invalidar_tabelas, carregar_intervalo, buscar_todas_paginas
+from postgrest.exceptions import APIError
 from auth import check_permission
+from cache_alunos import get_indice_alunos
+from dispensas import get_indice_dispensas, render_dispensas
 from io import BytesIO
 import xlsxwriter
 
@@ -35,7 +39,7 @@ def edit_event_dialog(evento, supabase):
                 }
                 supabase.table("Programacao").update(update_data).eq("id", evento['id']).execute()
                 st.success("Evento atualizado com sucesso!")
-                load_data.clear()
+                invalidar_tabelas("Programacao")
                 st.rerun()
             except Exception as e:
                 st.error(f"Falha ao atualizar o evento: {e}")
@@ -79,14 +83,12 @@ def registrar_faia_dialog(evento, turmas_concluidas, supabase):
     with col1:
         if st.button("Apenas FINALIZAR", type="secondary"):
             try:
-                update_data = {"status": 'Concluído', "concluido_por": st.session_state.username, "data_conclusao": datetime.now().strftime('%d/%m/%Y %H:%M')}
-                supabase.table("Programacao").update(update_data).eq("id", evento['id']).execute()
-                st.toast("Evento finalizado com sucesso!"); load_data.clear()
-                time.sleep(2) # <-- PAUSA ADICIONADA
+                finalizar_evento(evento, supabase)
+                st.toast("Evento finalizado com sucesso!")
+                invalidar_tabelas("Programacao")
+                st.rerun()
             except Exception as e:
                 st.error(f"Falha ao finalizar o evento: {e}")
-                time.sleep(2) # <-- PAUSA ADICIONADA
-            st.rerun()
             
     with col2:
         if st.button("FINALIZAR E LANÇAR NA FAIA", type="primary"):
@@ -94,42 +96,18 @@ def registrar_faia_dialog(evento, turmas_concluidas, supabase):
                 st.warning("Por favor, selecione um tipo de ação."); return
 
             with st.spinner("Finalizando evento e registrando participações..."):
-                update_data = {"status": 'Concluído', "concluido_por": st.session_state.username, "data_conclusao": datetime.now().strftime('%d/%m/%Y %H:%M')}
-                supabase.table("Programacao").update(update_data).eq("id", evento['id']).execute()
-
-                alunos_df = load_data("Alunos")
-                alunos_para_registrar = alunos_df[alunos_df['pelotao'].isin(turmas_concluidas)]
-                
-                if not alunos_para_registrar.empty:
+                try:
+                    finalizar_evento(evento, supabase)
                     tipo_info = tipos_opcoes[tipo_selecionado_str]
-                    tipo_acao_id = tipo_info['id']
-                    tipo_acao_nome = tipo_info['nome']
-                    
-                    descricao_acao = f"{tipo_acao_nome}: {evento['descricao']}"
-                    data_acao = pd.to_datetime(evento['data']).strftime('%Y-%m-%d')
-
-                    novas_acoes = []
-                    for _, aluno in alunos_para_registrar.iterrows():
-                        nova_acao = {
-                            'aluno_id': str(aluno['id']), 'tipo_acao_id': str(tipo_acao_id), 
-                            'tipo': tipo_acao_nome, 'descricao': descricao_acao, 'data': data_acao, 
-                            'usuario': st.session_state.username, 'status': 'Lançado'
-                        }
-                        novas_acoes.append(nova_acao)
-                                        
-                    if novas_acoes:
-                        try:
-                            supabase.table("Acoes").insert(novas_acoes).execute()
-                            st.success(f"Ação '{tipo_acao_nome}' registrada para {len(novas_acoes)} alunos!")
-                            load_data.clear()
-                            time.sleep(2) # <-- PAUSA ADICIONADA
-                        except Exception as e:
-                            st.error(f"Falha ao salvar os registros na FAIA: {e}")
-                            time.sleep(2) # <-- PAUSA ADICIONADA
-                else:
-                    st.warning("Nenhum aluno encontrado nas turmas selecionadas para lançar na FAIA.")
-                    time.sleep(2) # <-- PAUSA ADICIONADA
-            st.rerun()
+                    inseridas = registrar_participacao_evento(supabase, evento, turmas_concluidas, tipo_info, st.session_state.username)
+                    if inseridas:
+                        st.toast(f"Ação '{tipo_info['nome']}' registrada para {inseridas} alunos!")
+                    else:
+                        st.toast("Evento finalizado. Nenhuma nova participação a lançar para estas turmas.")
+                    invalidar_tabelas("Acoes", "Programacao")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Falha ao salvar os registros na FAIA: {e}")
 
 @st.dialog("Gerenciar Status Parcial do Evento")
 def gerenciar_status_dialog(evento, supabase):
@@ -162,16 +140,62 @@ def gerenciar_status_dialog(evento, supabase):
                     st.session_state['evento_para_logar'] = supabase.table("Programacao").select("*").eq("id", evento['id']).execute().data[0]
                     st.session_state['turmas_para_logar'] = turmas_recem_concluidas
                 st.toast("Status do evento atualizado!")
-                load_data.clear()
+                invalidar_tabelas("Programacao")
                 st.rerun() # <-- CORREÇÃO PARA EVITAR DIÁLOGO DUPLO
             except Exception as e:
                 st.error(f"Falha ao salvar o status: {e}")
 
+def finalizar_evento(evento, supabase):
+    """Marca o evento como concluído pelo usuário atual."""
+    update_data = {"status": 'Concluído', "concluido_por": st.session_state.username, "data_conclusao": datetime.now().strftime('%d/%m/%Y %H:%M')}
+    supabase.table("Programacao").update(update_data).eq("id", evento['id']).execute()
+
+CODIGOS_FUNCAO_INEXISTENTE = ('PGRST202', '42883')
+
+def registrar_participacao_evento(supabase, evento, turmas: list, tipo_info, usuario: str) -> int:
+    """
+    Lança a ação `tipo_info` para todos os alunos das turmas informadas, vinculada ao evento.
+    Usa a função `registrar_participacao_evento` do banco (sql/002_participacao_evento.sql) e,
+    só se ela não existir, um upsert em lotes. Em ambos os casos a chave (evento_id, aluno_id)
+    impede lançamentos duplicados. Retorna a quantidade de ações criadas.
+    """
+    acao_modelo = {
+        'tipo_acao_id': str(tipo_info['id']), 'tipo': tipo_info['nome'],
+        'descricao': f"{tipo_info['nome']}: {evento['descricao']}",
+        'data': pd.to_datetime(evento['data']).strftime('%Y-%m-%d'),
+        'usuario': usuario, 'status': 'Lançado'
+    }
+    evento_id = str(evento['id'])
+    try:
+        resposta = supabase.rpc('registrar_participacao_evento', {
+            'p_evento_id': evento_id, 'p_pelotoes': list(turmas), 'p_acao': acao_modelo
+        }).execute()
+        return int(resposta.data or 0)
+    except APIError as e:
+        # Só a função inexistente (PostgREST PGRST202 / Postgres 42883) cai no modo em lotes
+        if e.code not in CODIGOS_FUNCAO_INEXISTENTE:
+            raise
+        logging.warning(f"RPC registrar_participacao_evento indisponível, usando upsert em lotes: {e}")
+
+    # Envia só os alunos ainda sem ação do evento, para a contagem refletir o que foi criado
+    ja_lancados = {
+        str(registro['aluno_id']) for registro in buscar_todas_paginas(
+            lambda: supabase.table("Acoes").select("aluno_id").eq("evento_id", evento_id)
+        )
+    }
+    alunos_df = get_indice_alunos().df
+    ids_alunos = alunos_df.loc[alunos_df['pelotao'].isin(turmas), 'id']
+    novas_acoes = [
+        {**acao_modelo, 'aluno_id': aluno_id, 'evento_id': evento_id}
+        for aluno_id in ids_alunos if str(aluno_id) not in ja_lancados
+    ]
+    return gravar_em_lotes(supabase, "Acoes", novas_acoes, on_conflict='evento_id,aluno_id', ignore_duplicates=True)
+
 def on_delete_click(evento_id, supabase):
     try:
         supabase.table("Programacao").delete().eq('id', evento_id).execute()
         st.success("Evento excluído.")
-        load_data.clear()
+        invalidar_tabelas("Programacao")
     except Exception as e:
         st.error(f"Falha ao excluir o evento: {e}")
 
@@ -182,6 +206,190 @@ def create_excel_modelo():
         modelo_df.to_excel(writer, index=False, sheet_name='Programacao')
     return output.getvalue()
 
+# ==============================================================================
+# IMPORTAÇÃO EM MASSA (XLSX)
+# ==============================================================================
+COLUNAS_IMPORTACAO = ['data', 'horario', 'descricao', 'local', 'responsavel', 'obs', 'destinatarios']
+CHAVE_EVENTO = ['_chave_data', '_chave_horario', '_chave_descricao']
+
+def _adicionar_chave_evento(df: pd.DataFrame) -> pd.DataFrame:
+    """Adiciona as colunas normalizadas da chave composta (data, horário, descrição)."""
+    df = df.copy()
+    df['_chave_data'] = pd.to_datetime(df['data'], errors='coerce').dt.strftime('%Y-%m-%d')
+    df['_chave_horario'] = df['horario'].fillna('').astype(str).str.strip()
+    df['_chave_descricao'] = df['descricao'].fillna('').astype(str).str.strip()
+    return df
+
+def comparar_importacao_programacao(df_import: pd.DataFrame, programacao_atual: pd.DataFrame) -> dict:
+    """
+    Compara o ficheiro importado com a programação atual numa única junção pela chave
+    (data, horário, descrição). Retorna um dicionário com os DataFrames 'novos',
+    'alterados', 'inalterados' e 'invalidos' (data inválida ou descrição vazia, com o 'motivo').
+    """
+    colunas = [c for c in COLUNAS_IMPORTACAO if c in df_import.columns]
+    importacao = _adicionar_chave_evento(df_import[colunas])
+    data_invalida = importacao['_chave_data'].isna()
+    sem_descricao = importacao['_chave_descricao'] == ''
+    invalidos = importacao[data_invalida | sem_descricao].assign(
+        motivo=np.where(data_invalida[data_invalida | sem_descricao], "data inválida", "descrição vazia")
+    )
+    importacao = importacao[~(data_invalida | sem_descricao)].drop_duplicates(subset=CHAVE_EVENTO, keep='last')
+    importacao['data'] = importacao['_chave_data']
+    importacao['horario'] = importacao['_chave_horario']
+    importacao['descricao'] = importacao['_chave_descricao']
+
+    if programacao_atual.empty:
+        existentes = pd.DataFrame(columns=CHAVE_EVENTO + ['id'])
+    else:
+        existentes = _adicionar_chave_evento(programacao_atual).dropna(subset=['_chave_data']).drop_duplicates(subset=CHAVE_EVENTO, keep='first')
+        # Mantém o id como objeto para não virar float após a junção com linhas sem correspondência
+        existentes['id'] = existentes['id'].astype(object)
+
+    colunas_comparadas = [c for c in colunas if c not in ('data', 'horario', 'descricao') and c in existentes.columns]
+    existentes = existentes[CHAVE_EVENTO + ['id'] + colunas_comparadas].rename(columns={c: f"{c}_atual" for c in colunas_comparadas})
+    juncao = importacao.merge(existentes, on=CHAVE_EVENTO, how='left')
+
+    novos = juncao[juncao['id'].isna()]
+    encontrados = juncao[juncao['id'].notna()]
+    mudou = pd.Series(False, index=encontrados.index)
+    for coluna in colunas_comparadas:
+        novo_valor = encontrados[coluna].fillna('').astype(str).str.strip()
+        valor_atual = encontrados[f"{coluna}_atual"].fillna('').astype(str).str.strip()
+        mudou |= novo_valor != valor_atual
+
+    return {
+        'novos': novos[colunas],
+        'alterados': encontrados[mudou][['id'] + colunas],
+        'inalterados': encontrados[~mudou][['id'] + colunas],
+        'invalidos': invalidos[['motivo'] + colunas],
+    }
+
+def registros_para_gravar(df: pd.DataFrame) -> list:
+    """Converte o DataFrame em registros JSON (NaN vira None)."""
+    return df.astype(object).where(pd.notna(df), None).to_dict(orient='records')
+
+def render_relatorio_importacao(diff: dict):
+    """Exibe o resultado da simulação (dry-run) antes de gravar."""
+    st.markdown("##### Simulação da Importação")
+    cols = st.columns(4)
+    cols[0].metric("Novos", len(diff['novos']))
+    cols[1].metric("Alterados", len(diff['alterados']))
+    cols[2].metric("Sem alteração", len(diff['inalterados']))
+    cols[3].metric("Inválidos", len(diff['invalidos']))
+    for titulo, chave in [("Novos", 'novos'), ("Alterados", 'alterados'), ("Inválidos (ignorados)", 'invalidos')]:
+        if not diff[chave].empty:
+            with st.expander(f"{titulo} ({len(diff[chave])})"):
+                st.dataframe(diff[chave], hide_index=True, use_container_width=True)
+
+# ==============================================================================
+# AGENDA EM JANELAS (SEMANA / MÊS)
+# ==============================================================================
+def calcular_janela(referencia: date, visao: str) -> tuple:
+    """Retorna (início, fim) da semana (segunda a domingo) ou do mês que contém a data de referência."""
+    if visao == "Semana":
+        inicio = referencia - timedelta(days=referencia.weekday())
+        return inicio, inicio + timedelta(days=6)
+    inicio = referencia.replace(day=1)
+    proximo_mes = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, proximo_mes - timedelta(days=1)
+
+def deslocar_referencia(passos: int):
+    """Callback dos botões de navegação: avança ou recua uma semana/mês."""
+    if passos == 0:
+        st.session_state.programacao_referencia = datetime.now().date()
+        return
+    referencia = st.session_state.programacao_referencia
+    if st.session_state.programacao_visao == "Semana":
+        st.session_state.programacao_referencia = referencia + timedelta(weeks=passos)
+    else:
+        mes = referencia.month - 1 + passos
+        st.session_state.programacao_referencia = date(referencia.year + mes // 12, mes % 12 + 1, 1)
+
+def render_card_evento(evento: dict, permissoes: dict, pelotoes: list, supabase):
+    """Desenha o cartão de um evento com os botões permitidos ao usuário."""
+    status = evento.get('status') or 'A Realizar'
+    cor_status = {"A Realizar": "blue", "Em Andamento": "orange", "Concluído": "green"}.get(status, "gray")
+    info_conclusao = ""
+    if status == 'Concluído': 
+        info_conclusao = f"<br><small><b>Concluído por:</b> {evento.get('concluido_por', '')} em {evento.get('data_conclusao', '')}</small>"
+    elif status == 'Em Andamento': 
+        info_conclusao = f"<br><small><b>Turmas Concluídas:</b> {evento.get('pelotoes_concluidos', 'Nenhuma')}</small>"
+
+    with st.container(border=True):
+        st.markdown(f"""
+            <p style="margin-bottom: 0.2rem;"><span style="color:{cor_status};"><b>{evento.get('horario', '')}</b></span> - <b>{evento.get('descricao', '')}</b></p>
+            <small><b>Local:</b> {evento.get('local', 'N/A')}</small>
+            <br><small><b>Responsável:</b> {evento.get('responsavel', 'N/A')}</small>
+            <br><small><b>Para:</b> {evento.get('destinatarios', 'Todos')}</small>
+            {info_conclusao}
+        """, unsafe_allow_html=True)
+
+        if permissoes['finalizar'] or permissoes['excluir']:
+            st.write("")
+            cols_botoes = st.columns(4)
+            
+            if permissoes['finalizar']:
+                with cols_botoes[0]:
+                    if st.button("Finalizar", key=f"finish_{evento['id']}", help="Finalizar este evento para todas as turmas.", type="primary", disabled=(status == 'Concluído')):
+                        destinatarios_str = evento.get('destinatarios') or 'Todos'
+                        turmas_evento = pelotoes if destinatarios_str == 'Todos' else [p.strip() for p in destinatarios_str.split(',')]
+                        registrar_faia_dialog(evento, turmas_evento, supabase)
+                with cols_botoes[1]:
+                    if st.button("Feito Parcialmente", key=f"status_{evento['id']}", help="Gerenciar status por turma."):
+                        gerenciar_status_dialog(evento, supabase)
+                with cols_botoes[2]:
+                    if st.button("✏️ Alterar", key=f"edit_{evento['id']}", help="Alterar data e horário"):
+                        edit_event_dialog(evento, supabase)
+
+            if permissoes['excluir']:
+                with cols_botoes[3]:
+                    st.button("🗑️ Excluir", key=f"delete_{evento['id']}", help="Excluir permanentemente.", on_click=on_delete_click, args=(evento['id'], supabase))
+
+def render_agenda(filtro_status: str, pelotoes: list, supabase):
+    """
+    Mostra apenas a semana/mês selecionado. O intervalo de datas e o status são
+    filtrados no próprio banco, então o custo de cada execução não cresce com o calendário.
+    """
+    if 'programacao_referencia' not in st.session_state:
+        st.session_state.programacao_referencia = datetime.now().date()
+
+    col_visao, col_ant, col_hoje, col_prox = st.columns([3, 1, 1, 1])
+    visao = col_visao.radio("Visualizar:", ["Semana", "Mês"], horizontal=True, key="programacao_visao", label_visibility="collapsed")
+    col_ant.button("◀ Anterior", on_click=deslocar_referencia, args=(-1,), use_container_width=True)
+    col_hoje.button("Hoje", on_click=deslocar_referencia, args=(0,), use_container_width=True)
+    col_prox.button("Próximo ▶", on_click=deslocar_referencia, args=(1,), use_container_width=True)
+
+    inicio, fim = calcular_janela(st.session_state.programacao_referencia, visao)
+    st.caption(f"Período: {inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}")
+
+    filtros = (('status', (filtro_status,)),) if filtro_status != "Todos" else ()
+    eventos_df = carregar_intervalo("Programacao", "data", inicio.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d'), filtros)
+    if not eventos_df.empty:
+        eventos_df['data'] = pd.to_datetime(eventos_df['data'], errors='coerce')
+        eventos_df = eventos_df.dropna(subset=['data'])
+
+    if eventos_df.empty:
+        st.info(f"Nenhum evento na categoria '{filtro_status}' encontrado neste período.")
+        return
+
+    # Permissões verificadas uma única vez por execução, não a cada evento
+    permissoes = {
+        'finalizar': check_permission('pode_finalizar_evento_programacao'),
+        'excluir': check_permission('pode_excluir_evento_programacao'),
+    }
+    hoje = datetime.now().date()
+    indice_dispensas = get_indice_dispensas()
+    eventos_df = eventos_df.sort_values(by=['data', 'horario'], ascending=True)
+    for data_evento, eventos_do_dia in eventos_df.groupby(eventos_df['data'].dt.date):
+        dispensados = len(indice_dispensas.em(data_evento))
+        titulo = f"🗓️ {data_evento.strftime('%d/%m/%Y')} - ({len(eventos_do_dia)} evento(s))"
+        if dispensados:
+            titulo += f" | ⚕️ {dispensados} dispensado(s)"
+        with st.expander(titulo, expanded=(data_evento == hoje)):
+            for evento in eventos_do_dia.to_dict('records'):
+                render_card_evento(evento, permissoes, pelotoes, supabase)
+                st.divider()
+
 # ==============================================================================
 # PÁGINA PRINCIPAL
 # ==============================================================================
@@ -194,21 +402,16 @@ def show_programacao():
         turmas = st.session_state.pop('turmas_para_logar')
         registrar_faia_dialog(evento, turmas, supabase)
 
-    programacao_df = load_data("Programacao")
     alunos_df = load_data("Alunos")
-    
-    if 'status' not in programacao_df.columns: programacao_df['status'] = 'A Realizar'
-    if not programacao_df.empty:
-        programacao_df['data'] = pd.to_datetime(programacao_df['data'], errors='coerce')
-        programacao_df.dropna(subset=['data'], inplace=True)
+    pelotoes = sorted([p for p in alunos_df['pelotao'].unique() if pd.notna(p)]) if 'pelotao' in alunos_df.columns else []
 
     st.info("Presença Diária 6:30 | 7:00 Café | 12:00 Almoço | 17:40 Jantar | 21:00 Ceia")
+
+    with st.expander("⚕️ Dispensados médicos"):
+        render_dispensas("programacao")
     
     st.subheader("Filtros")
     filtro_status = st.radio("Ver eventos:", ["A Realizar", "Em Andamento", "Concluído", "Todos"], horizontal=True, index=0)
-    df_filtrado = programacao_df.copy()
-    if filtro_status != "Todos":
-        df_filtrado = programacao_df[programacao_df['status'] == filtro_status]
     
     st.divider()
 
@@ -216,7 +419,6 @@ def show_programacao():
         with st.expander("➕ Opções de Cadastro de Eventos"):
             st.subheader("Adicionar Novo Evento")
             with st.form("novo_evento_form", clear_on_submit=True):
-                pelotoes = sorted([p for p in alunos_df['pelotao'].unique() if pd.notna(p)])
                 opcoes_destinatarios = ["Todos"] + pelotoes
                 nova_descricao = st.text_input("Descrição do Evento*")
                 cols_data = st.columns(2)
@@ -244,14 +446,16 @@ def show_programacao():
                         }
                         try:
                             supabase.table("Programacao").insert(novo_evento).execute()
-                            st.success("Evento adicionado com sucesso!"); load_data.clear(); st.rerun()
+                            st.success("Evento adicionado com sucesso!"); invalidar_tabelas("Programacao"); st.rerun()
                         except Exception as e:
                             st.error(f"Erro ao adicionar evento: {e}")
 
             st.divider()
             
             st.subheader("Importar Eventos em Massa (XLSX)")
-            st.info("O sistema irá atualizar eventos com mesma data, horário e descrição, ou adicionar novos.")
+            if 'relatorio_importacao_programacao' in st.session_state:
+                st.success(st.session_state.pop('relatorio_importacao_programacao'))
+            st.info("O sistema irá atualizar eventos com mesma data, horário e descrição, ou adicionar novos. Uma simulação é exibida antes de gravar.")
             excel_modelo_bytes = create_excel_modelo()
             st.download_button("Baixar Modelo XLSX", excel_modelo_bytes, "modelo_programacao.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             
@@ -263,107 +467,28 @@ def show_programacao():
                         required_cols = ['data', 'horario', 'descricao']
                         if not all(col in df_import.columns for col in required_cols):
                             st.error(f"O ficheiro deve conter as colunas obrigatórias: {', '.join(required_cols)}")
+                            df_import = None
                         else:
-                            registros_para_upsert = []
-                            programacao_atual = load_data("Programacao")
-                            
-                            programacao_atual['data'] = pd.to_datetime(programacao_atual['data'], errors='coerce')
-                            programacao_atual['horario'] = programacao_atual['horario'].astype(str).str.strip()
-                            programacao_atual['descricao'] = programacao_atual['descricao'].astype(str).str.strip()
-                            
-                            for _, row in df_import.iterrows():
-                                try:
-                                    row_data = pd.to_datetime(row['data']).date()
-                                except Exception:
-                                    continue
-                                    
-                                row_horario = str(row.get('horario', '')).strip()
-                                row_descricao = str(row.get('descricao', '')).strip()
-
-                                match = programacao_atual[
-                                    (programacao_atual['data'].dt.date == row_data) &
-                                    (programacao_atual['horario'] == row_horario) &
-                                    (programacao_atual['descricao'] == row_descricao)
-                                ]
-                                
-                                registro = row.to_dict()
-                                if not match.empty:
-                                    registro['id'] = match.iloc[0]['id']
-                                else:
-                                    # Para novos itens, o ID será gerado pelo Supabase
-                                    if 'id' in registro:
-                                        del registro['id']
-                                
-                                registro['data'] = row_data.strftime('%Y-%m-%d')
-                                # Garante que colunas extras não causem erro
-                                for k in list(registro.keys()):
-                                    if k not in ['id', 'data', 'horario', 'descricao', 'local', 'responsavel', 'obs', 'destinatarios']:
-                                        del registro[k]
-
-                                registros_para_upsert.append(registro)
-
-                            if registros_para_upsert:
-                                supabase.table("Programacao").upsert(registros_para_upsert).execute()
-                                st.success(f"Importação concluída! {len(registros_para_upsert)} eventos foram processados.")
-                                load_data.clear(); st.rerun()
+                            diff = comparar_importacao_programacao(df_import, load_data("Programacao"))
+
+                    if df_import is not None:
+                        render_relatorio_importacao(diff)
+                        total_para_gravar = len(diff['novos']) + len(diff['alterados'])
+                        if total_para_gravar == 0:
+                            st.info("Nada a importar: todos os eventos do ficheiro já estão atualizados.")
+                        elif st.button(f"Confirmar importação ({total_para_gravar} evento(s))", type="primary"):
+                            barra = st.progress(0.0, text="Gravando eventos...")
+                            progresso = lambda gravados, total: barra.progress(gravados / total, text=f"Gravando eventos... {gravados}/{total}")
+                            gravar_em_lotes(supabase, "Programacao", registros_para_gravar(diff['novos']), operacao="insert", ao_progredir=progresso)
+                            gravar_em_lotes(supabase, "Programacao", registros_para_gravar(diff['alterados']), ao_progredir=progresso)
+                            # Mostrado na próxima execução, depois do rerun
+                            st.session_state.relatorio_importacao_programacao = (
+                                f"Importação concluída! {len(diff['novos'])} evento(s) adicionados e {len(diff['alterados'])} atualizados"
+                                f"; {len(diff['invalidos'])} linha(s) inválida(s) ignorada(s)."
+                            )
+                            invalidar_tabelas("Programacao"); st.rerun()
                 except Exception as e:
                     st.error(f"Erro ao processar o ficheiro: {e}")
             
     st.header("Agenda")
-    
-    if filtro_status not in ["Concluído", "Todos"]:
-        conclusao_por_data = df_filtrado.groupby(df_filtrado['data'].dt.date)['status'].apply(lambda x: (x == 'Concluído').all())
-        if not conclusao_por_data.empty:
-            datas_para_mostrar = conclusao_por_data[~conclusao_por_data].index
-            df_filtrado = df_filtrado[df_filtrado['data'].dt.date.isin(datas_para_mostrar)]
-
-    if df_filtrado.empty:
-        st.info(f"Nenhum evento na categoria '{filtro_status}' encontrado.")
-    else:
-        df_filtrado = df_filtrado.sort_values(by=['data', 'horario'], ascending=True)
-        for data_evento, eventos_do_dia in df_filtrado.groupby(df_filtrado['data'].dt.date):
-            
-            with st.expander(f"🗓️ {data_evento.strftime('%d/%m/%Y')} - ({len(eventos_do_dia)} evento(s))"):
-                for _, evento in eventos_do_dia.iterrows():
-                    status = evento.get('status', 'A Realizar')
-                    cor_status = {"A Realizar": "blue", "Em Andamento": "orange", "Concluído": "green"}.get(status, "gray")
-                    info_conclusao = ""
-                    if status == 'Concluído': 
-                        info_conclusao = f"<br><small><b>Concluído por:</b> {evento.get('concluido_por', '')} em {evento.get('data_conclusao', '')}</small>"
-                    elif status == 'Em Andamento': 
-                        info_conclusao = f"<br><small><b>Turmas Concluídas:</b> {evento.get('pelotoes_concluidos', 'Nenhuma')}</small>"
-
-                    with st.container(border=True):
-                        st.markdown(f"""
-                            <p style="margin-bottom: 0.2rem;"><span style="color:{cor_status};"><b>{evento.get('horario', '')}</b></span> - <b>{evento.get('descricao', '')}</b></p>
-                            <small><b>Local:</b> {evento.get('local', 'N/A')}</small>
-                            <br><small><b>Responsável:</b> {evento.get('responsavel', 'N/A')}</small>
-                            <br><small><b>Para:</b> {evento.get('destinatarios', 'Todos')}</small>
-                            {info_conclusao}
-                        """, unsafe_allow_html=True)
-
-                        if check_permission('pode_finalizar_evento_programacao') or check_permission('pode_excluir_evento_programacao'):
-                            st.write("")
-                            cols_botoes = st.columns(4)
-                            
-                            with cols_botoes[0]:
-                                if check_permission('pode_finalizar_evento_programacao'):
-                                    if st.button("Finalizar", key=f"finish_{evento['id']}", help="Finalizar este evento para todas as turmas.", type="primary", disabled=(status == 'Concluído')):
-                                        destinatarios_str = evento.get('destinatarios', 'Todos')
-                                        turmas_evento = sorted([p for p in alunos_df['pelotao'].unique() if pd.notna(p)]) if destinatarios_str == 'Todos' else [p.strip() for p in destinatarios_str.split(',')]
-                                        registrar_faia_dialog(evento, turmas_evento, supabase)
-                            
-                            with cols_botoes[1]:
-                                if check_permission('pode_finalizar_evento_programacao'):
-                                    if st.button("Feito Parcialmente", key=f"status_{evento['id']}", help="Gerenciar status por turma."):
-                                        gerenciar_status_dialog(evento, supabase)
-                            
-                            with cols_botoes[2]:
-                                if check_permission('pode_finalizar_evento_programacao'): 
-                                    if st.button("✏️ Alterar", key=f"edit_{evento['id']}", help="Alterar data e horário"):
-                                        edit_event_dialog(evento, supabase)
-
-                            with cols_botoes[3]:
-                                if check_permission('pode_excluir_evento_programacao'):
-                                    st.button("🗑️ Excluir", key=f"delete_{evento['id']}", help="Excluir permanentemente.", on_click=on_delete_click, args=(evento['id'], supabase))
-                    st.divider()
+    render_agenda(filtro_status, pelotoes, supabase)
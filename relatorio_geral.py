@@ -7,6 +7,7 @@ from fpdf import FPDF
 from database import load_data
 from auth import check_permission
 from alunos import calcular_pontuacao_efetiva, calcular_conceito_final
+from cache_alunos import ordenar_por_numero_interno
 from aluno_selection_components import render_alunos_filter_and_selection
 
 # (A função processar_dados_relatorio_geral permanece a mesma)
@@ -45,12 +46,7 @@ def processar_dados_relatorio_geral(alunos_selecionados_df, todos_alunos_df, sor
 
     if not df_final.empty:
         if sort_option == "Número Interno":
-            df_final['numero_interno_str'] = df_final['numero_interno'].astype(str)
-            split_cols = df_final['numero_interno_str'].str.split('-', expand=True)
-            df_final['sort_part_1'] = split_cols[0]
-            df_final['sort_part_2'] = pd.to_numeric(split_cols.get(1), errors='coerce').fillna(0)
-            df_final['sort_part_3'] = pd.to_numeric(split_cols.get(2), errors='coerce').fillna(0)
-            df_final = df_final.sort_values(by=['sort_part_1', 'sort_part_2', 'sort_part_3'])
+            df_final = ordenar_por_numero_interno(df_final)
         else:
             df_final = df_final.sort_values(by='conceito_final', ascending=False)
             
@@ -0,0 +1,108 @@
+# relatorio_pdf.py
+
+import hashlib
+from collections import namedtuple
+from fpdf import FPDF
+from pdf_utils import registrar_fonte_dejavu, pdf_para_bytes
+
+# ==============================================================================
+# DOCUMENTO BASE (DEJAVU + RODAPÉ PADRÃO)
+# ==============================================================================
+class RelatorioPDF(FPDF):
+    """
+    FPDF com a DejaVuSans já registrada (texto Unicode, sem conversão para latin-1)
+    e rodapé opcional com número de página. Use `self.fonte` em `set_font`.
+    """
+    def __init__(self, rodape: str = "", orientacao: str = 'P'):
+        super().__init__(orientation=orientacao, unit='mm', format='A4')
+        self.fonte = registrar_fonte_dejavu(self)
+        self.rodape_texto = rodape
+
+    def footer(self):
+        if self.rodape_texto:
+            self.set_y(-25)
+            self.set_font(self.fonte, 'I', 10)
+            self.multi_cell(0, 5, self.rodape_texto, 0, 'C')
+        self.set_y(-15)
+        self.set_font(self.fonte, 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+    def para_bytes(self) -> bytes:
+        return pdf_para_bytes(self)
+
+# ==============================================================================
+# MODELOS DE GRADE (CALCULADOS UMA VEZ)
+# ==============================================================================
+ModeloGrade = namedtuple('ModeloGrade', [
+    'pares_por_linha',  # pares (ordem, valor) por linha
+    'largura_ordem',
+    'largura_valor',
+    'altura_linha',
+    'linhas_extras',    # linhas em branco no fim, para anotações à mão
+    'tamanho_fonte',
+])
+
+LARGURA_UTIL_A4 = 210 - 2 * 10  # margens padrão do FPDF (1 cm)
+
+def criar_modelo_grade(pares_por_linha: int = 4, proporcao_ordem: float = 0.20, altura_linha: float = 8,
+                       linhas_extras: int = 3, tamanho_fonte: int = 10, largura_util: float = LARGURA_UTIL_A4) -> ModeloGrade:
+    largura_par = largura_util / pares_por_linha
+    return ModeloGrade(
+        pares_por_linha, largura_par * proporcao_ordem, largura_par * (1 - proporcao_ordem),
+        altura_linha, linhas_extras, tamanho_fonte
+    )
+
+def desenhar_grade(pdf: RelatorioPDF, valores: list, modelo: ModeloGrade):
+    """
+    Desenha a grade numerada (ordem | valor) preenchendo por linha.
+    As bordas são traçadas por bloco de linhas que cabe na página (uma linha por divisão),
+    e só as células preenchidas recebem texto.
+    """
+    pares = modelo.pares_por_linha
+    total_linhas = -(-len(valores) // pares) + modelo.linhas_extras
+    larguras = [modelo.largura_ordem, modelo.largura_valor] * pares
+    x_inicial = pdf.l_margin
+    largura_total = sum(larguras)
+    pdf.set_font(pdf.fonte, '', modelo.tamanho_fonte)
+
+    linha = 0
+    while linha < total_linhas:
+        espaco = pdf.page_break_trigger - pdf.get_y()
+        cabem = int(espaco // modelo.altura_linha)
+        if cabem < 1:
+            pdf.add_page()
+            continue
+        bloco = min(cabem, total_linhas - linha)
+        y_inicial = pdf.get_y()
+        altura_bloco = bloco * modelo.altura_linha
+
+        # Bordas do bloco
+        for i in range(bloco + 1):
+            y = y_inicial + i * modelo.altura_linha
+            pdf.line(x_inicial, y, x_inicial + largura_total, y)
+        x = x_inicial
+        for largura in [0] + larguras:
+            x += largura
+            pdf.line(x, y_inicial, x, y_inicial + altura_bloco)
+
+        # Texto só nas células preenchidas
+        for i in range(bloco):
+            inicio = (linha + i) * pares
+            preenchidas = valores[inicio:inicio + pares]
+            if not preenchidas:
+                break
+            pdf.set_xy(x_inicial, y_inicial + i * modelo.altura_linha)
+            for deslocamento, valor in enumerate(preenchidas):
+                pdf.cell(modelo.largura_ordem, modelo.altura_linha, str(inicio + deslocamento + 1), 0, 0, 'C')
+                pdf.cell(modelo.largura_valor, modelo.altura_linha, str(valor), 0, 0, 'C')
+
+        linha += bloco
+        pdf.set_xy(x_inicial, y_inicial + altura_bloco)
+
+# ==============================================================================
+# CHAVES DE CACHE
+# ==============================================================================
+def hash_valores(*listas) -> str:
+    """Resumo (sha1) de listas de valores, para usar como chave de cache de um relatório."""
+    conteudo = '\x1e'.join('\x1f'.join(str(valor) for valor in lista) for lista in listas)
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
@@ -1,17 +1,21 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.io as pio
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from database import load_data
+from database import load_snapshot
+from cache_acoes import ordenar_por_data, fatiar_periodo
 from auth import check_permission
-from alunos import calcular_pontuacao_efetiva, calcular_conceito_final
+from alunos import calcular_pontuacao_efetiva, calcular_conceito_final_vetorizado, calcular_impacto_academico_vetorizado
 
 # =============================================================================
 # FUNÇÕES DE RENDERIZAÇÃO DAS ABAS
 # =============================================================================
 
-def render_graficos_tab(acoes_filtradas, alunos_filtrados, config_dict, view_mode, tipos_acao_df):
+def render_graficos_tab(acoes_filtradas, alunos_filtrados, config_dict, view_mode, tipos_acao_df, chave_base=None):
     """Renderiza a aba de Gráficos com base no modo de visualização."""
     st.header("Análise Gráfica")
     
@@ -21,9 +25,9 @@ def render_graficos_tab(acoes_filtradas, alunos_filtrados, config_dict, view_mod
     )
 
     if grafico_tipo == "Pontuação por Pelotão":
-        show_pontuacao_pelotao(alunos_filtrados, acoes_filtradas, config_dict, view_mode)
+        show_pontuacao_pelotao(alunos_filtrados, acoes_filtradas, config_dict, view_mode, chave_base)
     elif grafico_tipo == "Distribuição de Ações":
-        show_distribuicao_acoes(acoes_filtradas, tipos_acao_df)
+        show_distribuicao_acoes(acoes_filtradas, tipos_acao_df, chave_base)
     elif grafico_tipo == "Ranking de Ações (Top 5)":
         show_ranking_acoes(acoes_filtradas)
 
@@ -34,10 +38,7 @@ def render_rankings_tab(acoes_filtradas, alunos_filtrados):
     if acoes_filtradas.empty:
         st.info("Nenhuma ação registrada para os filtros selecionados."); return
 
-    # Garante que 'aluno_id' e 'id' são do mesmo tipo para o merge
-    acoes_filtradas['aluno_id'] = acoes_filtradas['aluno_id'].astype(str)
-    alunos_filtrados['id'] = alunos_filtrados['id'].astype(str)
-
+    # 'aluno_id' e 'id' já chegam como texto (preparar_dados_relatorios)
     pontuacao_periodo = acoes_filtradas.groupby('aluno_id')['pontuacao_efetiva'].sum().reset_index()
     alunos_com_pontuacao = pd.merge(alunos_filtrados, pontuacao_periodo, left_on='id', right_on='aluno_id', how='inner')
     
@@ -67,79 +68,117 @@ def render_rankings_tab(acoes_filtradas, alunos_filtrados):
             for i, (_, aluno) in enumerate(top_negativos.iterrows()):
                 st.write(f"#{i+1}: **{aluno['nome_guerra']}** ({aluno['pelotao']}) - {aluno['pontuacao_efetiva']:+.2f} pts")
 
-def render_evolucao_tab(acoes_filtradas, alunos_filtrados, config_dict, view_mode):
+def render_evolucao_tab(acoes_filtradas, alunos_filtrados, config_dict, view_mode, chave_base=None):
     """Renderiza a aba de Evolução com comparação múltipla."""
     st.header("Evolução de Desempenho")
     tipo_visao = st.radio("Analisar por:", ["Individual", "Pelotão"], horizontal=True)
     
     if tipo_visao == "Individual":
-        show_evolucao_individual_comparativa(acoes_filtradas, alunos_filtrados, config_dict, view_mode)
+        show_evolucao_individual_comparativa(acoes_filtradas, alunos_filtrados, config_dict, view_mode, chave_base)
     else:
-        show_evolucao_pelotao_comparativa(acoes_filtradas, alunos_filtrados, config_dict, view_mode)
+        show_evolucao_pelotao_comparativa(acoes_filtradas, alunos_filtrados, config_dict, view_mode, chave_base)
+
+# =============================================================================
+# CACHE DE FIGURAS
+# =============================================================================
+# Limite total (em bytes de JSON) das figuras guardadas; as menos usadas saem primeiro
+MAX_BYTES_FIGURAS = 32 * 1024 * 1024
+
+@st.cache_resource
+def _cache_figuras() -> dict:
+    return {'figuras': OrderedDict(), 'bytes': 0, 'lock': threading.Lock()}
+
+def figura_em_cache(chave, construir_figura):
+    """
+    Retorna a figura Plotly de `chave`, chamando `construir_figura()` apenas quando ela
+    ainda não está no cache. Guarda o JSON serializado da figura (LRU limitado a
+    MAX_BYTES_FIGURAS). `construir_figura` pode retornar None quando não há dados.
+    A chave deve conter a versão dos dados, os filtros, o modo de visualização e o tipo de gráfico.
+    """
+    if chave is None:
+        return construir_figura()
+    cache = _cache_figuras()
+    with cache['lock']:
+        figura_json = cache['figuras'].get(chave)
+        if figura_json is not None:
+            cache['figuras'].move_to_end(chave)
+    if figura_json is not None:
+        return pio.from_json(figura_json)
+
+    figura = construir_figura()
+    if figura is not None:
+        figura_json = figura.to_json()
+        with cache['lock']:
+            if chave not in cache['figuras']:
+                cache['figuras'][chave] = figura_json
+                cache['bytes'] += len(figura_json)
+                while cache['bytes'] > MAX_BYTES_FIGURAS and len(cache['figuras']) > 1:
+                    _, removida = cache['figuras'].popitem(last=False)
+                    cache['bytes'] -= len(removida)
+    return figura
+
+def _chave(chave_base, *partes):
+    return None if chave_base is None else chave_base + partes
 
 # =============================================================================
 # FUNÇÕES DE GRÁFICOS CORRIGIDAS
 # =============================================================================
 
-def show_pontuacao_pelotao(alunos_df, acoes_df, config_dict, view_mode):
+def show_pontuacao_pelotao(alunos_df, acoes_df, config_dict, view_mode, chave_base=None):
     titulo = "Conceito Médio por Pelotão" if view_mode == 'Conceito Final' else "Saldo Médio de Pontos por Pelotão"
     st.subheader(titulo)
 
     if acoes_df.empty or alunos_df.empty: 
         st.info("Dados de ações ou alunos insuficientes para gerar este relatório.")
         return
-    
-    # Garante que 'aluno_id' e 'id' são do mesmo tipo para o merge
-    acoes_df['aluno_id'] = acoes_df['aluno_id'].astype(str)
-    alunos_df['id'] = alunos_df['id'].astype(str)
-
-    soma_pontos_por_aluno = acoes_df.groupby('aluno_id')['pontuacao_efetiva'].sum()
-    alunos_com_pontos = pd.merge(alunos_df, soma_pontos_por_aluno.rename('pontos_acoes'), left_on='id', right_on='aluno_id', how='left')
-    alunos_com_pontos['pontos_acoes'] = alunos_com_pontos['pontos_acoes'].fillna(0)
-
-    if view_mode == 'Conceito Final':
-        alunos_com_pontos['valor_final'] = alunos_com_pontos.apply(lambda row: calcular_conceito_final(row['pontos_acoes'], float(row.get('media_academica', 0.0)), alunos_df, config_dict), axis=1)
-    else:
-        alunos_com_pontos['valor_final'] = alunos_com_pontos['pontos_acoes']
 
     # Garante que 'pelotao' existe antes de agrupar
-    if 'pelotao' not in alunos_com_pontos.columns:
+    if 'pelotao' not in alunos_df.columns:
         st.warning("Coluna 'pelotao' não encontrada nos dados dos alunos para este gráfico.")
         return
 
-    media_por_pelotao = alunos_com_pontos.groupby('pelotao')['valor_final'].mean().reset_index()
-    
-    if media_por_pelotao.empty:
+    def construir_figura():
+        soma_pontos_por_aluno = acoes_df.groupby(acoes_df['aluno_id'].astype(str))['pontuacao_efetiva'].sum()
+        alunos_com_pontos = alunos_df.assign(id=alunos_df['id'].astype(str))
+        alunos_com_pontos['pontos_acoes'] = alunos_com_pontos['id'].map(soma_pontos_por_aluno).fillna(0)
+
+        if view_mode == 'Conceito Final':
+            alunos_com_pontos['valor_final'] = calcular_conceito_final_vetorizado(alunos_com_pontos['pontos_acoes'], alunos_com_pontos.get('media_academica'), alunos_df, config_dict)
+        else:
+            alunos_com_pontos['valor_final'] = alunos_com_pontos['pontos_acoes']
+
+        media_por_pelotao = alunos_com_pontos.groupby('pelotao')['valor_final'].mean().reset_index()
+        if media_por_pelotao.empty:
+            return None
+
+        fig = px.bar(
+            media_por_pelotao, 
+            x='pelotao', 
+            y='valor_final', 
+            title=titulo, 
+            text_auto='.2f',
+            color='valor_final',  # Colore as barras com base no valor final (permite o degradê)
+            color_continuous_scale='RdYlGn' # Define a escala de cores vermelho-amarelo-verde
+        )
+        fig.update_layout(template="plotly_white")
+        return fig
+
+    fig = figura_em_cache(_chave(chave_base, "pontuacao_pelotao"), construir_figura)
+    if fig is None:
         st.info("Nenhum dado de pontuação por pelotão para exibir.")
         return
-
-    fig = px.bar(
-        media_por_pelotao, 
-        x='pelotao', 
-        y='valor_final', 
-        title=titulo, 
-        text_auto='.2f',
-        color='valor_final',  # Colore as barras com base no valor final (permite o degradê)
-        color_continuous_scale='RdYlGn' # Define a escala de cores vermelho-amarelo-verde
-    )
-    
-    fig.update_layout(template="plotly_white")
     st.plotly_chart(fig, use_container_width=True, theme=None)
 
-def show_distribuicao_acoes(acoes_df, tipos_acao_df):
+def show_distribuicao_acoes(acoes_df, tipos_acao_df, chave_base=None):
     st.subheader("Distribuição de Tipos de Ação")
     
     if tipos_acao_df.empty:
         st.info("Nenhum tipo de ação cadastrado para análise."); return
 
-    # Garante que 'nome' e 'exibir_no_grafico' existem
+    # Garante que 'nome' existe
     if 'nome' not in tipos_acao_df.columns:
         st.warning("Coluna 'nome' não encontrada na tabela de tipos de ação.")
         return
-    if 'exibir_no_grafico' not in tipos_acao_df.columns:
-        tipos_acao_df['exibir_no_grafico'] = True # Assume True se a coluna não existe
-
-    tipos_visiveis = tipos_acao_df[tipos_acao_df.get('exibir_no_grafico', True)]['nome'].tolist()
     
     if acoes_df.empty:
         st.info("Nenhuma ação para analisar."); return
@@ -149,9 +188,16 @@ def show_distribuicao_acoes(acoes_df, tipos_acao_df):
         st.warning("Coluna 'nome' não encontrada nos dados de ações.")
         return
 
-    acoes_visiveis_df = acoes_df[acoes_df['nome'].isin(tipos_visiveis)]
-    
-    if not acoes_visiveis_df.empty and 'nome' in acoes_visiveis_df.columns:
+    def construir_figura():
+        # Sem a coluna 'exibir_no_grafico', todos os tipos são exibidos
+        if 'exibir_no_grafico' in tipos_acao_df.columns:
+            tipos_visiveis = tipos_acao_df.loc[tipos_acao_df['exibir_no_grafico'].fillna(True).astype(bool), 'nome']
+        else:
+            tipos_visiveis = tipos_acao_df['nome']
+        acoes_visiveis_df = acoes_df[acoes_df['nome'].isin(tipos_visiveis)]
+        if acoes_visiveis_df.empty:
+            return None
+
         contagem_tipos = acoes_visiveis_df['nome'].value_counts().reset_index()
         contagem_tipos.columns = ['Tipo de Ação', 'Quantidade']
         
@@ -163,8 +209,11 @@ def show_distribuicao_acoes(acoes_df, tipos_acao_df):
             hole=0.4,
             color_discrete_sequence=px.colors.qualitative.Pastel # Paleta de cores para o gráfico de pizza
         )
-
         fig.update_layout(template="plotly_white")
+        return fig
+
+    fig = figura_em_cache(_chave(chave_base, "distribuicao_acoes"), construir_figura)
+    if fig is not None:
         st.plotly_chart(fig, use_container_width=True, theme=None)
     else:
         st.info("Nenhuma ação visível para analisar nos filtros selecionados.")
@@ -192,7 +241,95 @@ def show_ranking_acoes(acoes_df):
         else:
             st.dataframe(negativas, use_container_width=True)
 
-def show_evolucao_individual_comparativa(acoes_df, alunos_df, config_dict, view_mode):
+# =============================================================================
+# MOTOR DE EVOLUÇÃO (SÉRIES TEMPORAIS)
+# =============================================================================
+
+def calcular_evolucao(acoes_df: pd.DataFrame, entidade_por_aluno: pd.Series) -> pd.DataFrame:
+    """
+    Calcula a pontuação acumulada por entidade (aluno, pelotão...) e por dia numa única passada:
+    groupby([entidade, dia]).sum().groupby(level=0).cumsum().
+    `entidade_por_aluno` mapeia aluno_id (str) -> entidade; alunos fora do mapa são ignorados.
+    Retorna um DataFrame "tidy": entidade, data, pontos_dia, pontuacao_acumulada.
+    """
+    colunas = ['entidade', 'data', 'pontos_dia', 'pontuacao_acumulada']
+    if acoes_df.empty or entidade_por_aluno.empty:
+        return pd.DataFrame(columns=colunas)
+
+    entidades = acoes_df['aluno_id'].astype(str).map(entidade_por_aluno)
+    validas = entidades.notna()
+    if not validas.any():
+        return pd.DataFrame(columns=colunas)
+
+    pontos_dia = acoes_df.loc[validas, 'pontuacao_efetiva'].groupby(
+        [entidades[validas].rename('entidade'), acoes_df.loc[validas, 'data'].dt.normalize().rename('data')]
+    ).sum()
+    evolucao = pontos_dia.rename('pontos_dia').to_frame()
+    evolucao['pontuacao_acumulada'] = pontos_dia.groupby(level=0).cumsum()
+    return evolucao.reset_index()[colunas]
+
+def evolucao_individual(acoes_df, alunos_df, config_dict, view_mode, ids_alunos) -> pd.DataFrame:
+    """Evolução por aluno; no modo 'Conceito Final' converte o acumulado em conceito de forma vetorizada."""
+    alunos = alunos_df.assign(id=alunos_df['id'].astype(str)).drop_duplicates('id').set_index('id')
+    ids_alunos = [i for i in map(str, ids_alunos) if i in alunos.index]
+    evolucao = calcular_evolucao(acoes_df, pd.Series(ids_alunos, index=ids_alunos, dtype=object))
+    if evolucao.empty:
+        return evolucao
+
+    if view_mode == 'Conceito Final':
+        medias = evolucao['entidade'].map(alunos['media_academica']) if 'media_academica' in alunos.columns else None
+        evolucao['valor_final'] = calcular_conceito_final_vetorizado(evolucao['pontuacao_acumulada'], medias, alunos_df, config_dict)
+    else:
+        evolucao['valor_final'] = evolucao['pontuacao_acumulada']
+    rotulos = alunos['nome_guerra'].astype(str) + " (" + alunos['pelotao'].astype(str) + ")"
+    evolucao['aluno'] = evolucao['entidade'].map(rotulos)
+    return evolucao
+
+def conceito_medio_diario_por_pelotao(acoes_df, alunos_df, config_dict, pelotoes) -> pd.DataFrame:
+    """
+    Conceito médio exato de cada pelotão em cada dia com ações.
+
+    Monta a matriz aluno x dia dos pontos (pivot), acumula com NumPy ao longo dos dias,
+    limita o impacto de cada aluno a `impacto_max_acoes`, soma a parcela acadêmica e só
+    então tira a média por pelotão, como em `calcular_conceito_final`.
+    Alunos sem ações no período entram com impacto zero; a normalização acadêmica
+    usa todos os alunos de `alunos_df`, como no conceito individual.
+    """
+    colunas = ['entidade', 'data', 'valor_final']
+    alunos = alunos_df.assign(id=alunos_df['id'].astype(str)).drop_duplicates('id')
+    alunos = alunos[alunos['pelotao'].isin(pelotoes)]
+    acoes = acoes_df[acoes_df['aluno_id'].astype(str).isin(alunos['id'])]
+    if alunos.empty or acoes.empty:
+        return pd.DataFrame(columns=colunas)
+
+    pontos_dia = acoes.groupby([acoes['aluno_id'].astype(str), acoes['data'].dt.normalize()])['pontuacao_efetiva'].sum()
+    matriz = pontos_dia.unstack(fill_value=0.0).reindex(alunos['id'], fill_value=0.0)
+    datas = matriz.columns
+    acumulado = np.cumsum(matriz.to_numpy(dtype=float), axis=1)
+
+    linha_base = float(config_dict.get('linha_base_conceito', 8.5))
+    impacto_max_acoes = float(config_dict.get('impacto_max_acoes', 1.5))
+    # Sem a coluna, uma série de zeros mantém um valor por aluno (None daria uma série vazia)
+    medias_academicas = alunos.get('media_academica', pd.Series(0.0, index=alunos.index))
+    impacto_academico = calcular_impacto_academico_vetorizado(medias_academicas, alunos_df, config_dict).to_numpy()
+    conceitos = np.clip(linha_base + np.clip(acumulado, -impacto_max_acoes, impacto_max_acoes) + impacto_academico[:, None], 0.0, 10.0)
+
+    medias = pd.DataFrame(conceitos, columns=datas).groupby(alunos['pelotao'].to_numpy()).mean()
+    medias.index.name, medias.columns.name = 'entidade', 'data'
+    return medias.stack().rename('valor_final').reset_index()[colunas]
+
+def evolucao_pelotoes(acoes_df, alunos_df, config_dict, view_mode, pelotoes) -> pd.DataFrame:
+    """Evolução por pelotão: saldo total acumulado ou conceito médio exato por dia."""
+    alunos = alunos_df[alunos_df['pelotao'].isin(pelotoes)]
+    if view_mode == 'Conceito Final':
+        evolucao = conceito_medio_diario_por_pelotao(acoes_df, alunos_df, config_dict, pelotoes)
+    else:
+        evolucao = calcular_evolucao(acoes_df, pd.Series(alunos['pelotao'].values, index=alunos['id'].astype(str)))
+        evolucao['valor_final'] = evolucao['pontuacao_acumulada']
+    evolucao['pelotao'] = evolucao['entidade']
+    return evolucao
+
+def show_evolucao_individual_comparativa(acoes_df, alunos_df, config_dict, view_mode, chave_base=None):
     st.subheader("Comparativo de Evolução Individual")
     
     if alunos_df.empty:
@@ -203,45 +340,41 @@ def show_evolucao_individual_comparativa(acoes_df, alunos_df, config_dict, view_
         st.warning("Colunas essenciais (id, nome_guerra, pelotao) não encontradas nos dados dos alunos.")
         return
 
-    opcoes_alunos = {aluno['id']: f"{aluno.get('nome_guerra', 'N/A')} ({aluno.get('pelotao', 'N/A')})" for _, aluno in alunos_df.iterrows()}
+    ids = alunos_df['id'].astype(str)
+    opcoes_alunos = dict(zip(ids, alunos_df['nome_guerra'].fillna('N/A').astype(str) + " (" + alunos_df['pelotao'].fillna('N/A').astype(str) + ")"))
     
     if not opcoes_alunos: # Se não houver alunos após as verificações
         st.info("Nenhum aluno disponível para seleção após as verificações de dados."); return
 
-    alunos_selecionados_ids = st.multiselect("Selecione um ou mais alunos para comparar:", options=list(opcoes_alunos.keys()), format_func=opcoes_alunos.get)
+    todos_os_alunos = st.checkbox(f"Comparar todos os alunos do filtro ({len(opcoes_alunos)})", key="evolucao_todos_alunos")
+    if todos_os_alunos:
+        alunos_selecionados_ids = list(opcoes_alunos.keys())
+    else:
+        alunos_selecionados_ids = st.multiselect("Selecione um ou mais alunos para comparar:", options=list(opcoes_alunos.keys()), format_func=opcoes_alunos.get)
 
     if not alunos_selecionados_ids:
         st.info("Selecione pelo menos um aluno para ver a evolução."); return
 
-    df_plot = pd.DataFrame()
-    for aluno_id in alunos_selecionados_ids:
-        acoes_aluno = acoes_df[acoes_df['aluno_id'].astype(str) == str(aluno_id)].copy()
-        if not acoes_aluno.empty:
-            acoes_aluno.sort_values('data', inplace=True)
-            acoes_aluno['pontuacao_acumulada'] = acoes_aluno['pontuacao_efetiva'].cumsum()
-            
-            aluno_info = alunos_df[alunos_df['id'].astype(str) == str(aluno_id)].iloc[0]
-            
-            if view_mode == 'Conceito Final':
-                media_acad = float(aluno_info.get('media_academica', 0.0))
-                # Recalcula o conceito final para cada ponto acumulado
-                acoes_aluno['valor_final'] = acoes_aluno['pontuacao_acumulada'].apply(lambda x: calcular_conceito_final(x, media_acad, alunos_df, config_dict))
-            else:
-                acoes_aluno['valor_final'] = acoes_aluno['pontuacao_acumulada']
-            
-            acoes_aluno['nome_guerra'] = aluno_info['nome_guerra']
-            df_plot = pd.concat([df_plot, acoes_aluno])
-
-    if not df_plot.empty:
+    def construir_figura():
+        df_plot = evolucao_individual(acoes_df, alunos_df, config_dict, view_mode, alunos_selecionados_ids)
+        if df_plot.empty:
+            return None
         titulo = "Evolução do Conceito Final" if view_mode == 'Conceito Final' else "Evolução do Saldo de Pontos"
-        fig = px.line(df_plot, x='data', y='valor_final', color='nome_guerra', title=titulo, markers=True, labels={'valor_final': view_mode, 'nome_guerra': 'Aluno'})
-        fig.update_layout(template="plotly_white")
+        # Com muitos alunos, WebGL e sem marcadores mantêm o gráfico responsivo
+        muitas_linhas = len(alunos_selecionados_ids) > 20
+        fig = px.line(df_plot, x='data', y='valor_final', color='aluno', title=titulo, markers=not muitas_linhas,
+                      render_mode='webgl' if muitas_linhas else 'auto', labels={'valor_final': view_mode, 'aluno': 'Aluno'})
+        fig.update_layout(template="plotly_white", showlegend=not muitas_linhas)
+        return fig
+
+    fig = figura_em_cache(_chave(chave_base, "evolucao_individual", tuple(sorted(alunos_selecionados_ids))), construir_figura)
+    if fig is not None:
         st.plotly_chart(fig, use_container_width=True, theme=None)
     else:
         st.info("Nenhum dado de evolução disponível para os alunos selecionados.")
 
 
-def show_evolucao_pelotao_comparativa(acoes_df, alunos_df, config_dict, view_mode):
+def show_evolucao_pelotao_comparativa(acoes_df, alunos_df, config_dict, view_mode, chave_base=None):
     st.subheader("Comparativo de Evolução por Pelotão")
     
     if alunos_df.empty or 'pelotao' not in alunos_df.columns:
@@ -257,40 +390,17 @@ def show_evolucao_pelotao_comparativa(acoes_df, alunos_df, config_dict, view_mod
     if not pelotoes_selecionados:
         st.info("Selecione pelo menos um pelotão."); return
         
-    df_plot = pd.DataFrame()
-    for pelotao in pelotoes_selecionados:
-        alunos_do_pelotao_ids = alunos_df[alunos_df['pelotao'] == pelotao]['id'].astype(str).tolist()
-        
-        if not alunos_do_pelotao_ids: # Se não houver alunos no pelotão selecionado
-            continue # Pula para o próximo pelotão
-
-        acoes_pelotao = acoes_df[acoes_df['aluno_id'].astype(str).isin(alunos_do_pelotao_ids)].copy()
-        
-        if not acoes_pelotao.empty:
-            acoes_pelotao.sort_values('data', inplace=True)
-            # Agrupa por data e soma a pontuação efetiva para o pelotão naquele dia
-            soma_pontos_por_dia = acoes_pelotao.groupby('data')['pontuacao_efetiva'].sum().reset_index()
-            soma_pontos_por_dia['pontuacao_acumulada'] = soma_pontos_por_dia['pontuacao_efetiva'].cumsum()
-            
-            df_temp = soma_pontos_por_dia.copy()
-            
-            if view_mode == 'Conceito Final':
-                linha_base = float(config_dict.get('linha_base_conceito', 8.5))
-                # Calcula o conceito médio para o pelotão. Divide pela contagem de alunos no pelotão
-                # Isso pode ser impreciso se a quantidade de alunos no pelotão variar ao longo do tempo.
-                # Para maior precisão, seria necessário calcular o conceito final individualmente e depois a média.
-                # Por simplicidade, usando a soma acumulada dividida pelo número de alunos fixo.
-                df_temp['valor_final'] = linha_base + (df_temp['pontuacao_acumulada'] / len(alunos_do_pelotao_ids))
-            else:
-                df_temp['valor_final'] = df_temp['pontuacao_acumulada']
-            
-            df_temp['pelotao'] = pelotao
-            df_plot = pd.concat([df_plot, df_temp])
-    
-    if not df_plot.empty:
+    def construir_figura():
+        df_plot = evolucao_pelotoes(acoes_df, alunos_df, config_dict, view_mode, pelotoes_selecionados)
+        if df_plot.empty:
+            return None
         titulo = "Evolução do Conceito Médio por Pelotão" if view_mode == 'Conceito Final' else "Evolução do Saldo de Pontos Total por Pelotão"
         fig = px.line(df_plot, x='data', y='valor_final', color='pelotao', title=titulo, markers=True, labels={'valor_final': view_mode})
         fig.update_layout(template="plotly_white")
+        return fig
+
+    fig = figura_em_cache(_chave(chave_base, "evolucao_pelotao", tuple(sorted(pelotoes_selecionados))), construir_figura)
+    if fig is not None:
         st.plotly_chart(fig, use_container_width=True, theme=None)
     else:
         st.info("Nenhum dado de evolução disponível para os pelotões selecionados.")
@@ -299,44 +409,52 @@ def show_evolucao_pelotao_comparativa(acoes_df, alunos_df, config_dict, view_mod
 # =============================================================================
 # FUNÇÃO PRINCIPAL DA PÁGINA
 # =============================================================================
+TABELAS_RELATORIOS = ["Alunos", "Acoes", "Tipos_Acao", "Config"]
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def preparar_dados_relatorios(versao_dados: tuple, _snapshots: dict) -> dict:
+    """
+    Calcula a pontuação efetiva e normaliza tipos uma única vez por versão dos dados.
+    O resultado é compartilhado entre as sessões e não deve ser modificado.
+    """
+    alunos_df = _snapshots["Alunos"].df.assign(id=lambda df: df['id'].astype(str))
+    acoes_df = _snapshots["Acoes"].df.assign(aluno_id=lambda df: df['aluno_id'].astype(str))
+    tipos_acao_df = _snapshots["Tipos_Acao"].df.assign(id=lambda df: df['id'].astype(str))
+    config_df = _snapshots["Config"].df
+
+    acoes_com_pontos_df = calcular_pontuacao_efetiva(acoes_df, tipos_acao_df, config_df)
+    # Ordenada por data (datetime64, sem datas inválidas) para o filtro de período por busca binária
+    acoes_com_pontos_df = ordenar_por_data(acoes_com_pontos_df)
+
+    config_dict = pd.Series(config_df.valor.values, index=config_df.chave).to_dict() if not config_df.empty else {}
+    return {'alunos': alunos_df, 'acoes': acoes_com_pontos_df, 'tipos_acao': tipos_acao_df, 'config_dict': config_dict}
+
 def show_relatorios():
     st.title("Relatórios e Análises")
     if not check_permission('acesso_pagina_relatorios'):
         st.error("Acesso negado."); return
 
-    alunos_df = load_data("Alunos")
-    acoes_df = load_data("Acoes")
-    tipos_acao_df = load_data("Tipos_Acao")
-    config_df = load_data("Config")
+    snapshots = {tabela: load_snapshot(tabela) for tabela in TABELAS_RELATORIOS}
     
     # Verifica se os DataFrames essenciais não estão vazios
-    if alunos_df.empty:
+    if snapshots["Alunos"].df.empty:
         st.warning("Dados de alunos insuficientes para gerar relatórios. Cadastre alunos primeiro."); return
-    if acoes_df.empty:
+    if snapshots["Acoes"].df.empty:
         st.warning("Dados de ações insuficientes para gerar relatórios. Registre ações primeiro."); return
-    if tipos_acao_df.empty:
+    if snapshots["Tipos_Acao"].df.empty:
         st.warning("Dados de tipos de ação insuficientes para gerar relatórios. Cadastre tipos de ação primeiro."); return
-    if config_df.empty:
+    if snapshots["Config"].df.empty:
         st.warning("Dados de configuração insuficientes para gerar relatórios. Verifique a tabela 'Config'."); # Não retorna, pois alguns gráficos podem funcionar sem config
 
-    # Garante que as colunas de ID são strings para consistência
-    alunos_df['id'] = alunos_df['id'].astype(str)
-    acoes_df['aluno_id'] = acoes_df['aluno_id'].astype(str)
-    tipos_acao_df['id'] = tipos_acao_df['id'].astype(str)
+    versao_dados = tuple(snap.versao for snap in snapshots.values())
+    dados = preparar_dados_relatorios(versao_dados, snapshots)
+    alunos_df, tipos_acao_df = dados['alunos'], dados['tipos_acao']
+    acoes_com_pontos_df, config_dict = dados['acoes'], dados['config_dict']
 
-    acoes_com_pontos_df = calcular_pontuacao_efetiva(acoes_df, tipos_acao_df, config_df)
-    
     # Verifica se acoes_com_pontos_df está vazio após o cálculo
     if acoes_com_pontos_df.empty:
         st.warning("Nenhuma ação com pontuação efetiva calculada para gerar relatórios."); return
-
-    config_dict = pd.Series(config_df.valor.values, index=config_df.chave).to_dict() if not config_df.empty else {}
-    
-    # Converte a coluna 'data' para datetime, tratando erros
-    if 'data' in acoes_com_pontos_df.columns:
-        acoes_com_pontos_df['data'] = pd.to_datetime(acoes_com_pontos_df['data'], errors='coerce')
-        acoes_com_pontos_df.dropna(subset=['data'], inplace=True) # Remove linhas com datas inválidas
-    else:
+    if 'data' not in acoes_com_pontos_df.columns:
         st.warning("Coluna 'data' não encontrada no DataFrame de ações. Relatórios baseados em data podem não funcionar.")
         return # Retorna se a coluna de data for crítica e não existir
 
@@ -362,11 +480,11 @@ def show_relatorios():
                 start_date = c_start.date_input("Data Inicial", end_date - timedelta(days=30))
                 end_date = c_end.date_input("Data Final", end_date)
 
-    acoes_filtradas = acoes_com_pontos_df.copy()
+    acoes_filtradas = acoes_com_pontos_df
+    if start_date: # Aplica filtro de data apenas se start_date for definido
+        acoes_filtradas = fatiar_periodo(acoes_filtradas, start_date, end_date)
     if tipo_acao_filtro != "Todos":
         acoes_filtradas = acoes_filtradas[acoes_filtradas['nome'] == tipo_acao_filtro]
-    if start_date: # Aplica filtro de data apenas se start_date for definido
-        acoes_filtradas = acoes_filtradas[(acoes_filtradas['data'].dt.date >= start_date) & (acoes_filtradas['data'].dt.date <= end_date)]
 
     st.write("") 
     
@@ -381,20 +499,24 @@ def show_relatorios():
         pelotao_selecionado = "Todos os Pelotões"
         st.info("Filtro por Pelotão desabilitado: Coluna 'pelotao' não encontrada ou nenhum aluno cadastrado.")
 
-    alunos_filtrados_component_df = alunos_df.copy() # Renomeado para clareza
+    alunos_filtrados_component_df = alunos_df # Renomeado para clareza
     if pelotao_selecionado != "Todos os Pelotões":
         alunos_filtrados_component_df = alunos_df[alunos_df['pelotao'] == pelotao_selecionado]
         # Garante que os IDs dos alunos filtrados por pelotão são strings para o isin
         aluno_ids_do_pelotao = alunos_filtrados_component_df['id'].astype(str).tolist()
         acoes_filtradas = acoes_filtradas[acoes_filtradas['aluno_id'].isin(aluno_ids_do_pelotao)]
 
+    # Os DataFrames abaixo são compartilhados (cache): as abas apenas leem os dados
+    chave_base = (versao_dados, tipo_acao_filtro, str(start_date), str(end_date), pelotao_selecionado, view_mode)
+
     st.divider()
-    tab1, tab2, tab3 = st.tabs(["📊 Gráficos", "🏆 Rankings", "📈 Evolução"])
+    # Apenas a aba escolhida é calculada (st.tabs executaria as três a cada interação)
+    aba = st.radio("Aba", ["📊 Gráficos", "🏆 Rankings", "📈 Evolução"], horizontal=True, key="aba_relatorios", label_visibility="collapsed")
 
-    with tab1:
-        render_graficos_tab(acoes_filtradas, alunos_filtrados_component_df, config_dict, view_mode, tipos_acao_df)
-    with tab2:
+    if aba == "📊 Gráficos":
+        render_graficos_tab(acoes_filtradas, alunos_filtrados_component_df, config_dict, view_mode, tipos_acao_df, chave_base)
+    elif aba == "🏆 Rankings":
         render_rankings_tab(acoes_filtradas, alunos_filtrados_component_df)
-    with tab3:
-        render_evolucao_tab(acoes_filtradas, alunos_filtrados_component_df, config_dict, view_mode)
+    else:
+        render_evolucao_tab(acoes_filtradas, alunos_filtrados_component_df, config_dict, view_mode, chave_base)
 
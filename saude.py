@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import math
 from datetime import datetime, timedelta # Importa timedelta
-from database import load_data, init_supabase_client
+from database import load_data, init_supabase_client, invalidar_tabelas, carregar_intervalo
+from cache_acoes import datas_locais
 from aluno_selection_components import render_alunos_filter_and_selection # Importa o componente de seleção de alunos
+from dispensas import render_dispensas
 
 # ==============================================================================
 # FUNÇÃO AUXILIAR PARA FORMATAÇÃO SEGURA DE DATAS
@@ -21,6 +25,61 @@ def safe_strftime(date_obj, fmt='%d/%m/%y'):
     except Exception: # Captura qualquer erro que possa ocorrer durante a conversão ou formatação
         return "N/A"
 
+# ==============================================================================
+# EVENTOS DE SAÚDE (CONSULTA FILTRADA NO BANCO E STATUS DE DISPENSA)
+# ==============================================================================
+TIPOS_SAUDE_PADRAO = ["ENFERMARIA", "HOSPITAL", "NAS", "DISPENSA MÉDICA", "SAÚDE"]
+ITENS_POR_PAGINA_SAUDE = 20
+
+STATUS_SEM_DISPENSA = 'sem'
+STATUS_DISPENSA_ATIVA = 'ativa'
+STATUS_DISPENSA_VENCIDA = 'vencida'
+STATUS_DISPENSA_SEM_FIM = 'sem_fim'   # dispensado, mas sem data de fim
+
+# Opção do filtro -> status aceitos ("Sem Dispensa" inclui as vencidas e as sem data de fim, como antes)
+FILTROS_DISPENSA = {
+    "Com Dispensa Ativa": [STATUS_DISPENSA_ATIVA],
+    "Com Dispensa Vencida": [STATUS_DISPENSA_VENCIDA],
+    "Sem Dispensa": [STATUS_SEM_DISPENSA, STATUS_DISPENSA_VENCIDA, STATUS_DISPENSA_SEM_FIM],
+}
+
+def calcular_status_dispensa(eventos_df: pd.DataFrame, hoje=None) -> np.ndarray:
+    """Status da dispensa de cada evento: sem dispensa, ativa, vencida ou sem data de fim."""
+    hoje = pd.Timestamp(hoje or datetime.now().date())
+    dispensado = eventos_df['esta_dispensado'].eq(True) if 'esta_dispensado' in eventos_df.columns else pd.Series(False, index=eventos_df.index)
+    fim = pd.to_datetime(eventos_df.get('periodo_dispensa_fim'), errors='coerce')
+    return np.select(
+        [~dispensado, fim.isna(), fim < hoje],
+        [STATUS_SEM_DISPENSA, STATUS_DISPENSA_SEM_FIM, STATUS_DISPENSA_VENCIDA],
+        default=STATUS_DISPENSA_ATIVA
+    )
+
+def carregar_eventos_saude(tipos, inicio, fim) -> pd.DataFrame:
+    """
+    Eventos dos `tipos` registrados entre `inicio` e `fim` (datas). O filtro de tipo e período vai
+    para a consulta (ver database.carregar_intervalo, em cache e invalidada junto com 'Acoes');
+    aqui só se convertem as datas e se calcula 'status_dispensa', uma única vez por carga.
+    Retorna do mais recente para o mais antigo.
+    """
+    eventos = carregar_intervalo(
+        "Acoes", "data", inicio.isoformat(), f"{fim.isoformat()}T23:59:59",
+        (("tipo", tuple(sorted(tipos))),)
+    )
+    if eventos.empty:
+        return eventos
+    for coluna in ('esta_dispensado', 'periodo_dispensa_inicio', 'periodo_dispensa_fim', 'tipo_dispensa', 'descricao'):
+        if coluna not in eventos.columns:
+            eventos[coluna] = None
+    eventos['aluno_id'] = eventos['aluno_id'].astype(str)
+    eventos['data'] = datas_locais(eventos['data']).dt.date
+    eventos['status_dispensa'] = calcular_status_dispensa(eventos)
+    eventos['periodo_dispensa_inicio'] = pd.to_datetime(eventos['periodo_dispensa_inicio'], errors='coerce').dt.date
+    eventos['periodo_dispensa_fim'] = pd.to_datetime(eventos['periodo_dispensa_fim'], errors='coerce').dt.date
+    return eventos.sort_values('data', ascending=False, kind='stable')
+
+def reset_pagina_saude():
+    st.session_state.saude_pagina = 1
+
 # ==============================================================================
 # DIÁLOGO DE EDIÇÃO
 # ==============================================================================
@@ -97,7 +156,7 @@ def edit_saude_dialog(acao_id, dados_acao_atual, supabase):
             try:
                 supabase.table("Acoes").update(dados_para_atualizar).eq("id", acao_id).execute()
                 st.success("Dados de saúde atualizados com sucesso!")
-                load_data.clear() # Limpa o cache para recarregar dados atualizados
+                invalidar_tabelas("Acoes") # Limpa o cache para recarregar dados atualizados
             except Exception as e:
                 st.error(f"Erro ao salvar as alterações: {e}")
 
@@ -111,7 +170,6 @@ def show_saude():
     supabase = init_supabase_client()
     
     try:
-        acoes_df = load_data("Acoes")
         alunos_df = load_data("Alunos")
         tipos_acao_df = load_data("Tipos_Acao")
     except Exception as e:
@@ -146,9 +204,7 @@ def show_saude():
             
             with st.form("new_health_record_form"):
                 # Tipos de Ação de Saúde (filtrados para relevância)
-                # Definindo tipos_saude_padrao aqui para ser acessível
-                tipos_saude_padrao = ["ENFERMARIA", "HOSPITAL", "NAS", "DISPENSA MÉDICA", "SAÚDE"]
-                tipos_saude_disponiveis = [t for t in tipos_saude_padrao if t in tipos_acao_df['nome'].unique().tolist()]
+                tipos_saude_disponiveis = [t for t in TIPOS_SAUDE_PADRAO if t in tipos_acao_df['nome'].unique().tolist()]
                 if not tipos_saude_disponiveis:
                     st.warning("Nenhum tipo de ação de saúde padrão encontrado. Cadastre-os em 'Configurações > Tipos de Ação'.")
                     st.stop() # Para a execução do formulário se não houver tipos
@@ -206,16 +262,20 @@ def show_saude():
                     try:
                         supabase.table("Acoes").insert(new_health_record_data).execute()
                         st.success(f"Registro de saúde para {aluno_selecionado_para_registro['nome_guerra']} adicionado com sucesso!")
-                        load_data.clear() # Limpa o cache para recarregar os dados
+                        invalidar_tabelas("Acoes") # Limpa o cache para recarregar os dados
                         st.rerun() # Recarrega a página para mostrar o novo registro
                     except Exception as e:
                         st.error(f"Erro ao registrar novo evento de saúde: {e}")
         else:
             st.info("Selecione um aluno acima para habilitar o formulário de registro.")
 
-    st.divider()
     # --- Fim da Seção "Adicionar Novo Registro de Saúde" ---
 
+    with st.expander("📋 Dispensados por Data ou Período", expanded=False):
+        render_dispensas("saude")
+
+    st.divider()
+
 
     # --- Filtros de Visualização do Histórico (mantidos e aprimorados) ---
     st.subheader("Filtro de Eventos de Saúde Existentes") # Título mais claro para esta seção de filtros
@@ -223,16 +283,10 @@ def show_saude():
     # Componente de seleção de alunos para o histórico (agora opcional para mostrar todos)
     selected_alunos_for_history_filter = render_alunos_filter_and_selection(key_suffix="saude_history_filter", include_full_name_search=False)
 
-    # Lógica para exibir todos os alunos se nenhum for selecionado no filtro de histórico
+    # Sem alunos selecionados no filtro de histórico, exibe os eventos de todos
     if selected_alunos_for_history_filter.empty:
-        # Se o usuário não selecionou nenhum aluno específico no filtro de histórico,
-        # consideramos todos os alunos para a exibição dos últimos lançamentos.
-        alunos_para_filtragem_historico = alunos_df.copy() 
         st.info("Nenhum aluno selecionado para o histórico. Exibindo eventos de **todos** os alunos.")
-    else:
-        # Se o usuário selecionou alunos, filtramos por eles.
-        alunos_para_filtragem_historico = selected_alunos_for_history_filter
- 
+
 
     col_filter_saude1, col_filter_saude2 = st.columns(2)
     with col_filter_saude1:
@@ -242,22 +296,20 @@ def show_saude():
             "Status de Dispensa Médica:",
             options=dispensa_medica_options,
             key="dispensa_medica_filter",
-            index=0 # Padrão para 'Todos'
+            index=0, # Padrão para 'Todos'
+            on_change=reset_pagina_saude
         )
     
     with col_filter_saude2:
         # Filtro por Tipos de Ação (saúde) (mantido conforme original)
         todos_tipos_nomes = sorted(tipos_acao_df['nome'].unique().tolist())
         
-        # Tipos padrão de saúde para seleção inicial no multiselect
-        # Definindo tipos_saude_padrao aqui também para ser acessível
-        tipos_saude_padrao = ["ENFERMARIA", "HOSPITAL", "NAS", "DISPENSA MÉDICA", "SAÚDE"]
-        
         selected_types = st.multiselect(
             "Filtrar por Tipo de Evento:",
             options=todos_tipos_nomes,
-            default=[t for t in tipos_saude_padrao if t in todos_tipos_nomes], # Seleciona tipos de saúde relevantes por padrão
-            key="saude_event_types_filter"
+            default=[t for t in TIPOS_SAUDE_PADRAO if t in todos_tipos_nomes], # Seleciona tipos de saúde relevantes por padrão
+            key="saude_event_types_filter",
+            on_change=reset_pagina_saude
         )
     
     if not selected_types:
@@ -274,13 +326,15 @@ def show_saude():
         start_date_event = st.date_input(
             "Data de Início do Registro:",
             value=default_start_date,
-            key="saude_start_date_event"
+            key="saude_start_date_event",
+            on_change=reset_pagina_saude
         )
     with col_date2:
         end_date_event = st.date_input(
             "Data de Fim do Registro:",
             value=today,
-            key="saude_end_date_event"
+            key="saude_end_date_event",
+            on_change=reset_pagina_saude
         )
 
     if start_date_event > end_date_event:
@@ -288,65 +342,30 @@ def show_saude():
         return
 
     # --- Carregar e Filtrar Dados de Ações (de saúde) ---
-    if acoes_df is None or acoes_df.empty:
-        st.info("Não há dados de ações para exibir. Verifique a tabela 'Acoes'.")
+    # 1. Eventos de saúde do período, com tipos e datas filtrados no próprio banco
+    eventos_df = carregar_eventos_saude(selected_types, start_date_event, end_date_event)
+    if eventos_df.empty:
+        st.divider()
+        st.subheader("Histórico de Eventos de Saúde")
+        st.info("Nenhum evento de saúde encontrado para os filtros aplicados.")
         return
 
-    # 1. Filtra as ações pelos tipos selecionados
-    acoes_saude_df = acoes_df[acoes_df['tipo'].isin(selected_types)].copy()
-
-    # 2. Filtra as ações pelos alunos selecionados (ou todos os alunos se nenhum selecionado)
-    acoes_saude_df['aluno_id'] = acoes_saude_df['aluno_id'].astype(str)
-    alunos_para_filtragem_historico['id'] = alunos_para_filtragem_historico['id'].astype(str)
-
-    alunos_ids_para_filtragem = alunos_para_filtragem_historico['id'].tolist()
-    acoes_saude_df = acoes_saude_df[acoes_saude_df['aluno_id'].isin(alunos_ids_para_filtragem)]
+    # 2. Filtra pelos alunos selecionados (se houver) e pelo status de dispensa já calculado
+    if not selected_alunos_for_history_filter.empty:
+        eventos_df = eventos_df[eventos_df['aluno_id'].isin(selected_alunos_for_history_filter['id'].astype(str))]
+    if selected_dispensa != "Todos":
+        eventos_df = eventos_df[eventos_df['status_dispensa'].isin(FILTROS_DISPENSA[selected_dispensa])]
 
-    # 3. Filtra as ações pelo período de registro
-    acoes_saude_df['data'] = pd.to_datetime(acoes_saude_df['data'], errors='coerce').dt.date
-    acoes_saude_df = acoes_saude_df[
-        (acoes_saude_df['data'] >= start_date_event) &
-        (acoes_saude_df['data'] <= end_date_event)
-    ]
-    
-    # 4. Adiciona informações do aluno às ações para exibição e filtro de dispensa
+    # 3. Adiciona informações do aluno às ações para exibição
     acoes_com_nomes_df = pd.merge(
-        acoes_saude_df,
-        alunos_para_filtragem_historico[['id', 'nome_guerra', 'pelotao', 'numero_interno']],
+        eventos_df,
+        alunos_df[['id', 'nome_guerra', 'pelotao', 'numero_interno']].astype({'id': str}),
         left_on='aluno_id',
         right_on='id',
         how='left',
         suffixes=('_acao', '_aluno') # Adiciona sufixos para diferenciar colunas 'id'
     )
-    acoes_com_nomes_df['nome_guerra'].fillna('N/A (Aluno Removido)', inplace=True)
-    acoes_com_nomes_df = acoes_com_nomes_df.sort_values(by="data", ascending=False) # Ordena pelos mais recentes
-    
-    # 5. Aplica filtro de dispensa médica
-    if selected_dispensa != "Todos":
-        hoje = datetime.now().date()
-        
-        # Garante que as colunas de data da dispensa sejam datetime.date para comparações
-        acoes_com_nomes_df['periodo_dispensa_inicio'] = pd.to_datetime(acoes_com_nomes_df['periodo_dispensa_inicio'], errors='coerce').dt.date
-        acoes_com_nomes_df['periodo_dispensa_fim'] = pd.to_datetime(acoes_com_nomes_df['periodo_dispensa_fim'], errors='coerce').dt.date
-
-        if selected_dispensa == "Com Dispensa Ativa":
-            acoes_com_nomes_df = acoes_com_nomes_df[
-                (acoes_com_nomes_df['esta_dispensado'] == True) &
-                (acoes_com_nomes_df['periodo_dispensa_fim'].notna()) & 
-                (acoes_com_nomes_df['periodo_dispensa_fim'] >= hoje)
-            ]
-        elif selected_dispensa == "Com Dispensa Vencida":
-            acoes_com_nomes_df = acoes_com_nomes_df[
-                (acoes_com_nomes_df['esta_dispensado'] == True) &
-                (acoes_com_nomes_df['periodo_dispensa_fim'].notna()) & 
-                (acoes_com_nomes_df['periodo_dispensa_fim'] < hoje)
-            ]
-        elif selected_dispensa == "Sem Dispensa":
-            acoes_com_nomes_df = acoes_com_nomes_df[
-                (acoes_com_nomes_df['esta_dispensado'] == False) | # Não está dispensado
-                (acoes_com_nomes_df['periodo_dispensa_fim'].isna()) | # Ou está dispensado mas sem data de fim (irregular/indefinido)
-                (acoes_com_nomes_df['periodo_dispensa_fim'] < hoje) # Ou a dispensa já venceu
-            ]
+    acoes_com_nomes_df['nome_guerra'] = acoes_com_nomes_df['nome_guerra'].fillna('N/A (Aluno Removido)')
     
     st.divider()
     
@@ -356,8 +375,15 @@ def show_saude():
         st.info("Nenhum evento de saúde encontrado para os filtros aplicados.")
         return
 
+    # 4. Paginação: só a página atual é desenhada
+    total_paginas = math.ceil(len(acoes_com_nomes_df) / ITENS_POR_PAGINA_SAUDE)
+    st.session_state.saude_pagina = min(max(st.session_state.get('saude_pagina', 1), 1), total_paginas)
+    inicio_pagina = (st.session_state.saude_pagina - 1) * ITENS_POR_PAGINA_SAUDE
+    pagina_df = acoes_com_nomes_df.iloc[inicio_pagina:inicio_pagina + ITENS_POR_PAGINA_SAUDE]
+    st.caption(f"{len(acoes_com_nomes_df)} evento(s) encontrados.")
+
     # Exibe os eventos de saúde
-    for index, acao in acoes_com_nomes_df.iterrows():
+    for index, acao in pagina_df.iterrows():
         with st.container(border=True):
             col1, col2, col3 = st.columns([3, 2, 1])
             
@@ -370,27 +396,32 @@ def show_saude():
                     st.caption(f"Observação: {acao.get('descricao')}")
             
             with col2:
-                if acao.get('esta_dispensado'):
-                    # Usa safe_strftime para as datas de dispensa
-                    inicio_str = safe_strftime(acao.get('periodo_dispensa_inicio'), '%d/%m/%y')
-                    fim_str = safe_strftime(acao.get('periodo_dispensa_fim'), '%d/%m/%y')
-                    
-                    data_fim_obj = acao.get('periodo_dispensa_fim') # Pode ser pd.NaT ou datetime.date
-                    hoje = datetime.now().date()
-                    
-                    # Verifica o status da dispensa: Converte para date para comparar com 'hoje'
-                    if pd.notna(data_fim_obj) and pd.to_datetime(data_fim_obj).date() < hoje: 
+                status = acao['status_dispensa']
+                if status == STATUS_SEM_DISPENSA:
+                    st.success("**SEM DISPENSA**", icon="✅")
+                else:
+                    if status == STATUS_DISPENSA_VENCIDA:
                         st.warning("**DISPENSA VENCIDA**", icon="⌛")
                     else:
                         st.error("**DISPENSADO**", icon="⚕️")
-                    
+                    inicio_str = safe_strftime(acao.get('periodo_dispensa_inicio'), '%d/%m/%y')
+                    fim_str = safe_strftime(acao.get('periodo_dispensa_fim'), '%d/%m/%y')
                     st.markdown(f"**Período:** {inicio_str} a {fim_str}")
                     st.caption(f"Tipo: {acao.get('tipo_dispensa', 'Não especificado')}")
-                else:
-                    st.success("**SEM DISPENSA**", icon="✅")
             
             with col3:
                 # O ID da ação agora é 'id_acao' devido ao sufixo no merge
                 id_da_acao = acao['id_acao']
                 if st.button("✏️ Editar", key=f"edit_saude_{id_da_acao}"):
                     edit_saude_dialog(id_da_acao, acao, supabase)
+
+    if total_paginas > 1:
+        col_prev, col_page, col_next = st.columns([2, 1, 2])
+        with col_prev:
+            if st.button("⬅️ Anterior", use_container_width=True, disabled=(st.session_state.saude_pagina <= 1), key="saude_pagina_anterior"):
+                st.session_state.saude_pagina -= 1; st.rerun()
+        with col_page:
+            st.write(f"Página **{st.session_state.saude_pagina} de {total_paginas}**")
+        with col_next:
+            if st.button("Próxima ➡️", use_container_width=True, disabled=(st.session_state.saude_pagina >= total_paginas), key="saude_pagina_proxima"):
+                st.session_state.saude_pagina += 1; st.rerun()
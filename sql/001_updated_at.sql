@@ -0,0 +1,28 @@
+-- 001_updated_at.sql
+-- Adiciona a coluna "updated_at" mantida por trigger nas tabelas lidas pelos snapshots
+-- (database.load_snapshot). A consulta de versão usa count + max(updated_at), por isso
+-- cada tabela também recebe um índice descendente nessa coluna.
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    tabela text;
+begin
+    foreach tabela in array array['Alunos', 'Acoes', 'Tipos_Acao', 'Config', 'Programacao', 'Ordens_Diarias', 'Tarefas', 'pernoite']
+    loop
+        execute format('alter table public.%I add column if not exists updated_at timestamptz not null default now()', tabela);
+        execute format('drop trigger if exists trg_%s_updated_at on public.%I', lower(tabela), tabela);
+        execute format('create trigger trg_%s_updated_at before insert or update on public.%I for each row execute function public.set_updated_at()', lower(tabela), tabela);
+        execute format('create index if not exists idx_%s_updated_at on public.%I (updated_at desc)', lower(tabela), tabela);
+    end loop;
+end;
+$$;
@@ -0,0 +1,35 @@
+-- 002_participacao_evento.sql
+-- Lançamento em massa de participação ao finalizar um evento da Programação
+-- (programacao.registrar_participacao_evento). A chave única (evento_id, aluno_id)
+-- torna o lançamento idempotente: um clique duplo não cria ações repetidas.
+-- Ações lançadas manualmente continuam com evento_id nulo e não são afetadas.
+
+alter table public."Acoes" add column if not exists evento_id text;
+
+create unique index if not exists uq_acoes_evento_aluno
+    on public."Acoes" (evento_id, aluno_id);
+
+-- Insere uma ação (modelo em p_acao) para cada aluno dos pelotões informados.
+-- Retorna a quantidade de ações efetivamente criadas.
+create or replace function public.registrar_participacao_evento(
+    p_evento_id text,
+    p_pelotoes text[],
+    p_acao jsonb
+)
+returns integer
+language plpgsql
+as $$
+declare
+    inseridas integer;
+begin
+    insert into public."Acoes" (aluno_id, tipo_acao_id, tipo, descricao, data, usuario, status, evento_id)
+    select a.id, m.tipo_acao_id, m.tipo, m.descricao, m.data, m.usuario, m.status, p_evento_id
+    from public."Alunos" a
+    cross join jsonb_populate_record(null::public."Acoes", p_acao) m
+    where a.pelotao = any(p_pelotoes)
+    on conflict (evento_id, aluno_id) do nothing;
+
+    get diagnostics inseridas = row_count;
+    return inseridas;
+end;
+$$;
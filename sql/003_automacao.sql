@@ -0,0 +1,48 @@
+-- 003_automacao.sql
+-- Suporte ao agendador de rotinas automáticas (python automacao_eventos.py).
+-- "automacao_lock" garante que apenas uma instância do agendador atue por vez;
+-- "automacao_execucoes" guarda o histórico de cada execução das rotinas.
+
+create table if not exists public.automacao_lock (
+    nome text primary key,
+    dono text not null,
+    expira_em timestamptz not null
+);
+
+create table if not exists public.automacao_execucoes (
+    id bigserial primary key,
+    rotina text not null,
+    dono text,
+    iniciado_em timestamptz not null default now(),
+    finalizado_em timestamptz,
+    status text not null,
+    itens integer not null default 0,
+    mensagem text
+);
+
+create index if not exists idx_automacao_execucoes_iniciado_em
+    on public.automacao_execucoes (iniciado_em desc);
+
+-- Adquire (ou renova) o lock "p_nome" para "p_dono" por p_duracao_segundos.
+-- Retorna true se o chamador é o dono do lock após a chamada.
+create or replace function public.adquirir_lock_automacao(
+    p_nome text,
+    p_dono text,
+    p_duracao_segundos integer
+)
+returns boolean
+language plpgsql
+as $$
+declare
+    dono_atual text;
+begin
+    insert into public.automacao_lock as l (nome, dono, expira_em)
+    values (p_nome, p_dono, now() + make_interval(secs => p_duracao_segundos))
+    on conflict (nome) do update
+        set dono = excluded.dono, expira_em = excluded.expira_em
+        where l.dono = excluded.dono or l.expira_em < now()
+    returning dono into dono_atual;
+
+    return dono_atual is not null;
+end;
+$$;
@@ -0,0 +1,96 @@
+-- 004_pernoite_mensal.sql
+-- Consolidado mensal do pernoite (pernoite_mensal.py): noites por aluno e mês.
+-- É mantido de forma incremental por "salvar_pernoite", que grava as marcações do dia
+-- e soma/subtrai no mês apenas o que mudou, na mesma transação.
+-- "recalcular_pernoite_mensal" reconstrói um período a partir da tabela diária.
+
+create table if not exists public.pernoite_mensal (
+    aluno_id bigint not null,
+    mes date not null,            -- primeiro dia do mês
+    noites integer not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (aluno_id, mes)
+);
+
+create index if not exists idx_pernoite_mensal_mes
+    on public.pernoite_mensal (mes);
+
+-- Grava as marcações (p_registros: [{"aluno_id": 1, "presente": true}, ...]) do dia p_data
+-- e aplica no consolidado a diferença em relação ao que estava gravado.
+-- Retorna a quantidade de alunos cuja contagem mensal mudou.
+create or replace function public.salvar_pernoite(
+    p_data date,
+    p_registros jsonb
+)
+returns integer
+language plpgsql
+as $$
+declare
+    alterados integer;
+begin
+    -- Salvamentos do mesmo dia são serializados, para a diferença nunca ser contada duas vezes
+    perform pg_advisory_xact_lock(hashtext('pernoite:' || p_data::text));
+
+    with novos as (
+        select (r->>'aluno_id')::bigint as aluno_id, (r->>'presente')::boolean as presente
+        from jsonb_array_elements(p_registros) r
+    ),
+    comparados as (
+        select n.aluno_id, n.presente as novo,
+               coalesce((select p.presente from public.pernoite p
+                         where p.aluno_id = n.aluno_id and p.data = p_data), false) as antigo
+        from novos n
+    ),
+    gravados as (
+        insert into public.pernoite (aluno_id, data, presente)
+        select aluno_id, p_data, novo from comparados
+        on conflict (aluno_id, data) do update set presente = excluded.presente
+        returning aluno_id
+    )
+    insert into public.pernoite_mensal as m (aluno_id, mes, noites)
+    select aluno_id, date_trunc('month', p_data)::date, case when novo then 1 else -1 end
+    from comparados
+    where novo <> antigo
+    on conflict (aluno_id, mes) do update
+        set noites = m.noites + excluded.noites, updated_at = now();
+
+    get diagnostics alterados = row_count;
+    return alterados;
+end;
+$$;
+
+-- Reconstrói o consolidado dos meses entre p_inicio e p_fim a partir da tabela "pernoite".
+-- Retorna a quantidade de linhas (aluno, mês) gravadas.
+create or replace function public.recalcular_pernoite_mensal(
+    p_inicio date,
+    p_fim date
+)
+returns integer
+language plpgsql
+as $$
+declare
+    primeiro_mes date := date_trunc('month', p_inicio)::date;
+    ultimo_mes date := date_trunc('month', p_fim)::date;
+    gravadas integer;
+begin
+    -- Bloqueia gravações no pernoite até o fim da transação: um "salvar_pernoite" concorrente
+    -- espera e aplica sua diferença sobre o consolidado já reconstruído (nada contado em dobro ou perdido)
+    lock table public.pernoite in share mode;
+
+    delete from public.pernoite_mensal where mes between primeiro_mes and ultimo_mes;
+
+    insert into public.pernoite_mensal (aluno_id, mes, noites)
+    select aluno_id, date_trunc('month', data)::date, count(*)
+    from public.pernoite
+    where presente and data >= primeiro_mes and data < ultimo_mes + interval '1 month'
+    group by 1, 2;
+
+    get diagnostics gravadas = row_count;
+    return gravadas;
+end;
+$$;
+
+-- Carga inicial com todo o histórico existente
+select public.recalcular_pernoite_mensal(min(data), max(data))
+from public.pernoite
+having count(*) > 0;
@@ -0,0 +1,14 @@
+-- 005_updated_at_clock_timestamp.sql
+-- "updated_at" passa a usar clock_timestamp() (hora da gravação da linha) em vez de now()
+-- (início da transação). A busca incremental dos snapshots (database._atualizar_incrementalmente)
+-- também relê uma margem antes do último máximo, para as transações que terminam depois dele.
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
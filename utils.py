@@ -1,9 +1,13 @@
 # utils.py
 import streamlit as st
 
-def get_student_photo_url(numero_interno: str) -> str:
+def get_student_photo_url(numero_interno: str):
+    """
+    URL pública da foto do aluno no bucket 'fotos-alunos' ({numero_interno}.png).
+    Retorna None sem número interno ou sem configuração; o placeholder é servido por fotos_alunos.
+    """
     if not numero_interno or not isinstance(numero_interno, str):
-        return "https://via.placeholder.com/100?text=S/Foto"
+        return None
 
     try:
         project_id = st.secrets["supabase"]["project_id"]
@@ -14,4 +18,4 @@ def get_student_photo_url(numero_interno: str) -> str:
         return url
         
     except (KeyError, TypeError):
-        return "https://via.placeholder.com/100?text=Erro+Conf"
+        return None